@@ -0,0 +1,115 @@
+"""
+Clean Futures calculation core.
+
+Facilities data, geospatial helpers, option calculators and recommendation
+logic with no Streamlit dependency. Submodules are imported on first
+attribute access, so ``import clean_futures`` is nearly free and NumPy is
+only loaded by the features that need it.
+"""
+
+import importlib
+
+# Public name -> submodule that defines it
+_EXPORTS = {
+    # facilities
+    'load_facilities_database': 'facilities',
+    'default_facilities_database': 'facilities',
+    'freeze_facilities_database': 'facilities',
+    'get_facilities_database': 'facilities',
+    'get_derived': 'facilities',
+    # geo
+    'haversine_distance': 'geo',
+    'determine_state_county': 'geo',
+    'get_soil_type': 'geo',
+    'get_regulatory_thresholds': 'geo',
+    'find_nearest_qualified_landfill': 'geo',
+    'find_nearest_cf_facility': 'geo',
+    'travel_speed_mph': 'geo',
+    # counties
+    'get_county_raster': 'counties',
+    'lookup_state_county': 'counties',
+    'lookup_state_county_batch': 'counties',
+    # distance_matrix
+    'facility_coordinate_arrays': 'distance_matrix',
+    'haversine_distance_matrix': 'distance_matrix',
+    'iter_distance_matrix': 'distance_matrix',
+    'haversine_distance_pairs': 'distance_matrix',
+    'facility_distance_matrix': 'distance_matrix',
+    'iter_facility_distance_matrix': 'distance_matrix',
+    'facility_distance_pairs': 'distance_matrix',
+    'qualified_landfill_mask': 'distance_matrix',
+    'nearest_facilities_batch': 'distance_matrix',
+    'determine_state_county_batch': 'distance_matrix',
+    # calculators
+    'calculate_volume_cy': 'calculators',
+    'calculate_co2_emissions': 'calculators',
+    'calculate_dig_and_haul': 'calculators',
+    'calculate_onsite_remediation': 'calculators',
+    'calculate_surface_facility': 'calculators',
+    # records
+    'DigHaulResult': 'records',
+    'OnsiteResult': 'records',
+    'SurfaceResult': 'records',
+    'SiteResults': 'records',
+    # vectorized
+    'calculate_dig_and_haul_vectorized': 'vectorized',
+    'calculate_onsite_remediation_vectorized': 'vectorized',
+    'calculate_surface_facility_vectorized': 'vectorized',
+    'generate_recommendation_vectorized': 'vectorized',
+    'resolve_calculator_inputs': 'vectorized',
+    # fleet
+    'optimize_fleet': 'fleet',
+    # simulation
+    'simulate_truck_cycles': 'simulation',
+    'simulate_site': 'simulation',
+    # montecarlo
+    'monte_carlo_site': 'montecarlo',
+    # recommendation
+    'generate_recommendation': 'recommendation',
+    'rank_alternatives': 'recommendation',
+    'analyze_site': 'recommendation',
+    # candidates
+    'top_k_landfills': 'candidates',
+    'top_k_cf_facilities': 'candidates',
+    'top_k_options': 'candidates',
+    # pipeline
+    'run_pipeline': 'pipeline',
+    'pipeline_stage': 'pipeline',
+    'pipeline_results': 'pipeline',
+    'pipeline_cache_stats': 'pipeline',
+    # batch
+    'run_batch': 'batch',
+    'analyze_sites': 'batch',
+    # excel_report
+    'write_site_report': 'excel_report',
+    # parquet_output
+    'write_batch_parquet': 'parquet_output',
+    'batch_parquet_schema': 'parquet_output',
+    # portfolio
+    'evaluate_portfolio': 'portfolio',
+    # assignment
+    'assign_portfolio': 'assignment',
+    'solve_transportation': 'assignment',
+    # facility_raster
+    'get_facility_raster': 'facility_raster',
+    # roads
+    'get_road_network': 'roads',
+    'road_routes': 'roads',
+    'nearest_facilities_by_road': 'roads',
+    'convert_geojson_roads': 'roads',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,9 @@
+"""Run batch mode: python -m clean_futures sites.csv results.csv"""
+
+import sys
+
+from .batch import batch_main
+
+# Guarded so portfolio worker processes can re-import this module safely
+if __name__ == "__main__":
+    sys.exit(batch_main())
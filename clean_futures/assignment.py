@@ -0,0 +1,323 @@
+"""
+Capacity-constrained portfolio assignment for the Clean Futures calculation core.
+"""
+
+import numpy as np
+
+from .distance_matrix import facility_coordinate_arrays, facility_distance_matrix, qualified_landfill_mask
+from .facilities import get_facilities_database
+from .roads import get_road_network, road_routes
+from .vectorized import resolve_calculator_inputs
+
+# ============================================================================
+# PORTFOLIO ASSIGNMENT
+# ============================================================================
+# analyze_site sends every site to its nearest qualified landfill and nearest
+# CF facility. That is fine for one job, but forty concurrent jobs can all
+# pick the same gate. Here the sites of a portfolio are routed together as
+# a min-cost flow (a transportation problem):
+#
+#   site (supply = volume_cy) -> facility (capacity = daily_capacity_cy x horizon_days)
+#
+# The cost of sending one CY from a site to a facility is the per-CY disposal
+# (landfill) or processing (CF facility) rate, plus backfill for landfills,
+# plus trucking: trips x trip time x truck rate / volume, as in the
+# calculators. Equipment cost does not depend on where the soil goes and is
+# left out. A site may be split across facilities when that is cheaper.
+# Volume that cannot be placed anywhere is reported as unassigned.
+#
+# The solver starts from the unconstrained optimum (every site at its
+# cheapest facility). It then clears each over-capacity facility with
+# successive shortest paths on a facility-level graph. The edge j -> k costs
+# the cheapest way to move one CY of some site currently at j over to k, so
+# each path is a chain of re-routings that ends at a facility with room.
+# Only congested facilities do any work, and each path search runs over the
+# facilities rather than the full site-by-facility graph, stopping at the
+# nearest facility with room. That keeps thousands of sites against
+# hundreds of facilities to seconds.
+
+# Planning horizon the daily capacities are multiplied by
+ASSIGNMENT_HORIZON_DAYS = 30
+
+# Volumes below this are treated as zero (CY)
+ASSIGNMENT_TOLERANCE = 1e-9
+
+def _facility_columns(db, options):
+    """(option, kind, index, record) for each facility column of the cost matrix"""
+    kinds = {'dig_haul': 'landfills', 'surface': 'clean_futures_facilities'}
+    unknown = set(options) - set(kinds)
+    if unknown:
+        raise ValueError(f"Unknown assignment options: {', '.join(sorted(unknown))}")
+    return [(opt_type, kinds[opt_type], index, record)
+            for opt_type in options for index, record in enumerate(db[kinds[opt_type]])]
+
+def _facility_name(kind, record):
+    """Display name of a landfill or CF facility record"""
+    if kind == 'landfills':
+        return f"{record['company']} - {record['site_name']}"
+    return record['facility_name']
+
+def assignment_cost_matrix(analyses, db, options=('dig_haul', 'surface')):
+    """
+    Per-CY cost of sending each site's soil to each facility.
+    
+    Landfills that do not accept a site's TPH or chloride level cost inf.
+    Trucking uses road miles and drive times when a road network is
+    installed, straight-line miles otherwise.
+    
+    Returns:
+        Tuple of (costs, distances), each of shape (n_sites, n_facilities)
+        with columns in _facility_columns order
+    """
+    coords = facility_coordinate_arrays(db)
+    network = get_road_network()
+    n_sites = len(analyses)
+    site_lats = np.array([analysis['site_lat'] for analysis in analyses], dtype=float)
+    site_lons = np.array([analysis['site_lon'] for analysis in analyses], dtype=float)
+    
+    costs, distances = [], []
+    for opt_type in options:
+        kind = 'landfills' if opt_type == 'dig_haul' else 'clean_futures_facilities'
+        n_facilities = len(db[kind])
+        if network is None:
+            dist = facility_distance_matrix(site_lats, site_lons, coords, kind)
+            drive_hours = None
+        else:
+            dist, drive_hours = road_routes(site_lats, site_lons, kind, db, network)
+        if opt_type == 'dig_haul':
+            qualified = qualified_landfill_mask([analysis['tph_level'] for analysis in analyses],
+                                                [analysis['chloride_level'] for analysis in analyses], coords)
+        else:
+            qualified = np.ones((n_sites, n_facilities), dtype=bool)
+        cost = np.empty((n_sites, n_facilities))
+    
+        for i, analysis in enumerate(analyses):
+            params = resolve_calculator_inputs(analysis, None, None)[opt_type]
+            advanced = analysis['advanced_params'] or {}
+            volume_cy = analysis['volume_cy']
+            trips_per_cy = np.ceil(volume_cy / params['truck_capacity_cy']) / volume_cy if volume_cy > 0 else 0.0
+            travel_hours = dist[i] / params['avg_speed_mph'] if drive_hours is None else drive_hours[i]
+            trip_time = 2 * params['loading_time_hours'] + 0.5 + 2 * travel_hours
+    
+            if opt_type == 'dig_haul':
+                if analysis['needs_backfill'] and not analysis.get('landfill_has_backfill', False):
+                    trip_time = trip_time + analysis.get('extra_backfill_minutes', 0) / 60.0
+                rate = advanced.get('disposal_cost_cy', coords['landfill_disposal_cost'])
+                if analysis['needs_backfill']:
+                    rate = rate + params['backfill_cost_cy']
+            else:
+                rate = advanced.get('surface_processing_cost_cy', coords['cf_processing_cost'])
+    
+            row = rate + trips_per_cy * trip_time * params['truck_hourly_rate']
+            cost[i] = np.where(qualified[i], row, np.inf)
+    
+        costs.append(cost)
+        distances.append(dist)
+    
+    if not costs:
+        return np.empty((n_sites, 0)), np.empty((n_sites, 0))
+    return np.hstack(costs), np.hstack(distances)
+
+def solve_transportation(costs, supply, capacity):
+    """
+    Min-cost assignment of site supplies to capacitated facilities.
+    
+    Args:
+        costs: Per-unit cost array of shape (n_sites, n_facilities); inf
+            marks a forbidden pair
+        supply: Units to place per site
+        capacity: Units each facility can take (inf = unlimited)
+    
+    Returns:
+        Tuple of (flows, unassigned, augmentations): flows is a list of
+        {facility column: units} dictionaries per site, unassigned the
+        units per site that fit nowhere
+    """
+    costs = np.asarray(costs, dtype=float)
+    supply = np.asarray(supply, dtype=float)
+    n_sites, n_facilities = costs.shape
+    
+    # Column n_facilities is an unlimited "unassigned" sink. Its cost is above
+    # any chain of re-routings, so volume only lands there when nothing else fits.
+    finite = costs[np.isfinite(costs)]
+    max_cost = max(float(np.abs(finite).max()) if finite.size else 0.0, 1.0)
+    penalty = 2 * (n_facilities + 2) * max_cost + 1
+    C = np.hstack([costs, np.full((n_sites, 1), penalty)])
+    n_nodes = n_facilities + 1
+    residual = np.append(np.asarray(capacity, dtype=float), np.inf)
+    
+    # Unconstrained optimum: every site at its cheapest column
+    flows = [{} for _ in range(n_sites)]
+    members = [{} for _ in range(n_nodes)]
+    cheapest = np.argmin(C, axis=1)
+    for i in np.flatnonzero(supply > ASSIGNMENT_TOLERANCE):
+        j = int(cheapest[i])
+        flows[i][j] = float(supply[i])
+        members[j][i] = True
+        residual[j] -= supply[i]
+    
+    # W[j, k]: cheapest per-unit cost of moving a site's flow from j to k,
+    # and the site that achieves it
+    W = np.full((n_nodes, n_nodes), np.inf)
+    W_site = np.full((n_nodes, n_nodes), -1, dtype=np.int64)
+    
+    def rebuild_edges(j, columns):
+        """Recompute the re-routing edges from column j to the given columns"""
+        if not members[j]:
+            W[j, columns] = np.inf
+            W_site[j, columns] = -1
+            return
+        sites = np.fromiter(members[j], dtype=np.int64, count=len(members[j]))
+        moves = C[np.ix_(sites, columns)] - C[sites, j][:, None]
+        best = np.argmin(moves, axis=0)
+        W[j, columns] = moves[best, np.arange(len(columns))]
+        W_site[j, columns] = sites[best]
+        W[j, j] = np.inf
+    
+    def add_member(i, k):
+        """Site i starts sending flow to column k"""
+        moves = C[i] - C[i, k]
+        moves[k] = np.inf
+        better = moves < W[k]
+        W[k, better] = moves[better]
+        W_site[k, better] = i
+    
+    everything = np.arange(n_nodes)
+    for j in range(n_nodes):
+        rebuild_edges(j, everything)
+    
+    # Potentials keep the re-routing costs non-negative (W[j, k] + potential[j]
+    # - potential[k] >= 0), so each path search is a Dijkstra that stops at the
+    # first column with room. Every site starts at its cheapest column, so zero
+    # potentials are valid to begin with. After each search the columns on
+    # earlier shortest paths sit at reduced distance zero, so each search step
+    # settles every column at the current distance at once.
+    potential = np.zeros(n_nodes)
+    slack = 1e-9 * penalty
+    augmentations = 0
+    # Clear the over-capacity columns with shortest paths to columns with room,
+    # searching from all of them at once
+    while True:
+        sources = np.flatnonzero(residual < -ASSIGNMENT_TOLERANCE)
+        if not sources.size:
+            break
+        outgoing = W + potential[:, None]
+        dist = np.full(n_nodes, np.inf)
+        order = np.full(n_nodes, n_nodes)
+        tentative = dist.copy()
+        tentative[sources] = 0.0
+        offset = -potential
+        for step in range(n_nodes):
+            level = tentative.min()
+            nodes = np.flatnonzero(tentative <= level + slack)
+            room = nodes[residual[nodes] > ASSIGNMENT_TOLERANCE]
+            if room.size:
+                target = int(room[0])
+                break
+            dist[nodes] = level
+            order[nodes] = step
+            tentative[nodes] = offset[nodes] = np.inf
+            relaxed = outgoing[nodes[0]] if nodes.size == 1 else outgoing[nodes].min(axis=0)
+            np.minimum(tentative, relaxed + offset + level, out=tentative)
+        dist[target] = tentative[target]
+        order[target] = step
+    
+        # Walk back from the target; each hop moves one site from j to k.
+        # The predecessor comes from an earlier search step, so the walk ends.
+        hops = []
+        k = target
+        while order[k] > 0:
+            j = int(np.argmin(np.where(order < order[k], dist + potential + W[:, k], np.inf)))
+            hops.append((int(W_site[j, k]), j, k))
+            k = j
+        source = k
+        potential += np.minimum(dist, dist[target])
+        amount = min(-residual[source], residual[target], min(flows[i][j] for i, j, _ in hops))
+    
+        for i, j, k in hops:
+            flows[i][j] -= amount
+            if k not in flows[i]:
+                flows[i][k] = 0.0
+                members[k][i] = True
+                add_member(i, k)
+            flows[i][k] += amount
+            if flows[i][j] <= ASSIGNMENT_TOLERANCE:
+                del flows[i][j]
+                del members[j][i]
+                rebuild_edges(j, np.flatnonzero(W_site[j] == i))
+        residual[source] += amount
+        residual[target] -= amount
+        augmentations += 1
+    
+    unassigned = np.array([flows[i].pop(n_facilities, 0.0) for i in range(n_sites)])
+    return flows, unassigned, augmentations
+
+def assign_portfolio(analyses, db=None, horizon_days=ASSIGNMENT_HORIZON_DAYS, capacities=None,
+                     options=('dig_haul', 'surface')):
+    """
+    Assign concurrent sites to landfills and CF facilities within their capacity.
+    
+    Args:
+        analyses: Dictionaries in the same shape as st.session_state.analysis
+        db: Facilities database (defaults to the current snapshot)
+        horizon_days: Days the portfolio is hauled over; a facility can take
+            daily_capacity_cy x horizon_days in total
+        capacities: Optional facility id -> daily CY, overriding the
+            daily_capacity_cy field of the facility records. Facilities
+            with neither are unlimited.
+        options: Which destinations to use: 'dig_haul' (landfills) and/or
+            'surface' (CF facilities)
+    
+    Returns:
+        Dictionary with per-site 'sites' (allocations, unassigned_cy, cost),
+        per-facility 'facilities' (capacity_cy, assigned_cy), 'total_cost',
+        'unconstrained_cost' (everyone at their cheapest facility, ignoring
+        capacity), 'unassigned_cy' and 'augmentations'
+    """
+    if db is None:
+        db = get_facilities_database()
+    capacities = capacities or {}
+    columns = _facility_columns(db, options)
+    
+    costs, distances = assignment_cost_matrix(analyses, db, options)
+    supply = np.array([max(analysis['volume_cy'], 0) for analysis in analyses], dtype=float)
+    daily = [capacities.get(record['id'], record.get('daily_capacity_cy')) for _, _, _, record in columns]
+    capacity = np.array([np.inf if cy is None else cy * horizon_days for cy in daily], dtype=float)
+    
+    flows, unassigned, augmentations = solve_transportation(costs, supply, capacity)
+    
+    sites = []
+    assigned = np.zeros(len(columns))
+    for i, flow in enumerate(flows):
+        allocations = []
+        for j, volume_cy in sorted(flow.items(), key=lambda item: -item[1]):
+            opt_type, kind, index, record = columns[j]
+            allocations.append({
+                'option': opt_type,
+                'facility_id': record['id'],
+                'facility_name': _facility_name(kind, record),
+                'volume_cy': volume_cy,
+                'distance_miles': float(distances[i, j]),
+                'cost_per_cy': float(costs[i, j])
+            })
+            assigned[j] += volume_cy
+        sites.append({
+            'allocations': allocations,
+            'unassigned_cy': float(unassigned[i]),
+            'cost': sum((a['volume_cy'] * a['cost_per_cy'] for a in allocations), 0.0)
+        })
+    
+    cheapest = costs.min(axis=1) if costs.shape[1] else np.full(len(analyses), np.inf)
+    placeable = np.isfinite(cheapest)
+    return {
+        'sites': sites,
+        'facilities': [
+            {'option': opt_type, 'facility_id': record['id'], 'facility_name': _facility_name(kind, record),
+             'capacity_cy': float(capacity[j]), 'assigned_cy': float(assigned[j])}
+            for j, (opt_type, kind, _, record) in enumerate(columns)
+        ],
+        'total_cost': sum((site['cost'] for site in sites), 0.0),
+        'unconstrained_cost': float((supply[placeable] * cheapest[placeable]).sum()),
+        'unassigned_cy': float(unassigned.sum()),
+        'augmentations': augmentations
+    }
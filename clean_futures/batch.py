@@ -0,0 +1,414 @@
+"""
+Headless batch mode: score a CSV of sites without the Streamlit UI.
+
+    python -m clean_futures sites.csv results.csv
+"""
+
+import argparse
+import csv
+import functools
+import itertools
+import math
+import numbers
+import sys
+
+from .calculators import calculate_volume_cy
+from .distance_matrix import determine_state_county_batch, nearest_facilities_batch
+from .facilities import get_facilities_database
+from .geo import haversine_distance
+from .recommendation import analyze_site
+from .roads import get_road_network, nearest_facilities_by_road
+from .simulation import simulate_site
+
+# ============================================================================
+# BATCH MODE (HEADLESS)
+# ============================================================================
+
+# Sites read, looked up and scored together per distance-matrix pass
+BATCH_CHUNK_SIZE = 1000
+
+# Analysis fields that go into the batch facility and county lookups
+BATCH_LOOKUP_FIELDS = ('site_lat', 'site_lon', 'tph_level', 'chloride_level')
+
+# Output columns written for every site in batch mode
+BATCH_OUTPUT_COLUMNS = [
+    'site_id', 'site_lat', 'site_lon', 'state', 'county', 'volume_cy',
+    'tph_level', 'chloride_level', 'needs_backfill',
+    'dig_haul_total_cost', 'dig_haul_cost_per_cy', 'dig_haul_project_days',
+    'dig_haul_co2_tons', 'dig_haul_landfill', 'dig_haul_distance_miles',
+    'dig_haul_bottleneck',
+    'onsite_total_cost', 'onsite_cost_per_cy', 'onsite_project_days',
+    'onsite_co2_tons',
+    'surface_total_cost', 'surface_cost_per_cy', 'surface_project_days',
+    'surface_co2_tons', 'surface_facility', 'surface_distance_miles',
+    'surface_bottleneck',
+    'recommended', 'score_dig_haul', 'score_onsite', 'score_surface',
+    'error'
+]
+
+# Extra columns written when batch mode runs the truck-cycle simulation
+BATCH_SIMULATION_COLUMNS = ['dig_haul_simulated_days', 'surface_simulated_days']
+
+def _parse_bool(value, default):
+    """Parse a CSV cell as a boolean (true/false, yes/no, 1/0)"""
+    if value is None or str(value).strip() == '':
+        return default
+    text = str(value).strip().lower()
+    if text in ('true', 'yes', 'y', '1'):
+        return True
+    if text in ('false', 'no', 'n', '0'):
+        return False
+    raise ValueError(f"Invalid boolean value: {value!r}")
+
+def _parse_number(value, default, cast=float):
+    """Parse a CSV cell as a number, falling back to default when blank"""
+    if value is None or str(value).strip() == '':
+        if default is None:
+            raise ValueError("Missing required numeric value")
+        return default
+    return cast(float(value))
+
+def _require_positive(key, value):
+    """Return a parsed value, raising ValueError unless it is a finite number greater than zero"""
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"{key} must be greater than zero")
+    return value
+
+def analysis_from_row(row):
+    """
+    Build an analysis dictionary (same shape as the Simple Mode questionnaire)
+    from one batch CSV row.
+    
+    Required columns: site_lat, site_lon, and either volume_cy or
+    surface_area_sqft + depth_ft. All other columns fall back to the
+    Simple Mode defaults. Raises ValueError for unparseable values, a volume,
+    truck count or equipment capacity that is not greater than zero, and
+    negative extra backfill minutes.
+    """
+    needs_backfill = _parse_bool(row.get('needs_backfill'), True)
+    landfill_has_backfill = _parse_bool(row.get('landfill_has_backfill'), False) if needs_backfill else False
+    
+    # Same rule as the questionnaire: extra pickup time only when backfill is not at the landfill
+    if needs_backfill and not landfill_has_backfill:
+        extra_backfill_minutes = _parse_number(row.get('extra_backfill_minutes'), 30, int)
+        if extra_backfill_minutes < 0:
+            raise ValueError("extra_backfill_minutes must not be negative")
+    else:
+        extra_backfill_minutes = 0
+    
+    if row.get('volume_cy') not in (None, ''):
+        volume_cy = _parse_number(row.get('volume_cy'), None)
+    else:
+        volume_cy = calculate_volume_cy(
+            _parse_number(row.get('surface_area_sqft'), None),
+            _parse_number(row.get('depth_ft'), None)
+        )
+    _require_positive('volume_cy', volume_cy)
+    
+    groundwater_depth = (row.get('groundwater_depth') or '').strip() or None
+    
+    return {
+        'site_lat': _parse_number(row.get('site_lat'), None),
+        'site_lon': _parse_number(row.get('site_lon'), None),
+        'groundwater_depth': groundwater_depth,
+        'tph_level': _parse_number(row.get('tph_level'), 0, int),
+        'chloride_level': _parse_number(row.get('chloride_level'), 0, int),
+        'volume_cy': volume_cy,
+        'needs_backfill': needs_backfill,
+        'landfill_has_backfill': landfill_has_backfill,
+        'extra_backfill_minutes': extra_backfill_minutes,
+        'num_trucks': _require_positive('num_trucks', _parse_number(row.get('num_trucks'), 3, int)),
+        'equipment_capacity_per_day': _require_positive(
+            'equipment_capacity_per_day', _parse_number(row.get('equipment_capacity_per_day'), 300)
+        ),
+        'priorities': {
+            'cost': (row.get('cost_priority') or 'medium').strip().lower(),
+            'speed': (row.get('speed_priority') or 'medium').strip().lower(),
+            'esg': (row.get('esg_priority') or 'medium').strip().lower()
+        },
+        'advanced_params': None,
+        'soil_permeability': (row.get('soil_permeability') or 'medium').strip().lower()
+    }
+
+def batch_result_row(site_id, analysis, results, state, county):
+    """Flatten one site's analysis results into a batch output row"""
+    out = {
+        'site_id': site_id,
+        'site_lat': analysis['site_lat'],
+        'site_lon': analysis['site_lon'],
+        'state': state,
+        'county': county,
+        'volume_cy': analysis['volume_cy'],
+        'tph_level': analysis['tph_level'],
+        'chloride_level': analysis['chloride_level'],
+        'needs_backfill': analysis['needs_backfill'],
+        'recommended': results['recommended'],
+    }
+    
+    for opt_type in ('dig_haul', 'onsite', 'surface'):
+        opt = results[opt_type]
+        if opt:
+            out[f'{opt_type}_total_cost'] = opt['total_cost']
+            out[f'{opt_type}_cost_per_cy'] = opt['cost_per_cy']
+            out[f'{opt_type}_project_days'] = opt['project_days']
+            out[f'{opt_type}_co2_tons'] = opt['co2_tons']
+        out[f'score_{opt_type}'] = results['scores'].get(opt_type)
+    
+    if results['dig_haul']:
+        out['dig_haul_landfill'] = results['dig_haul']['landfill_name']
+        out['dig_haul_distance_miles'] = results['dig_haul']['distance_miles']
+        out['dig_haul_bottleneck'] = results['dig_haul']['bottleneck']
+    if results['surface']:
+        out['surface_facility'] = results['surface']['facility_name']
+        out['surface_distance_miles'] = results['surface']['distance_miles']
+        out['surface_bottleneck'] = results['surface']['bottleneck']
+    
+    return out
+
+def _lookup_field_error(analysis):
+    """Why an analysis cannot go into a batch lookup, or None when it can"""
+    for key in BATCH_LOOKUP_FIELDS:
+        value = analysis.get(key)
+        if isinstance(value, bool) or not isinstance(value, numbers.Real) or not math.isfinite(value):
+            return f"{key} must be a finite number"
+    return None
+
+def _locate_sites(analyses, db, network):
+    """Nearest facilities and state/county for a list of analyses in one pass"""
+    lats = [a['site_lat'] for a in analyses]
+    lons = [a['site_lon'] for a in analyses]
+    tph_levels = [a['tph_level'] for a in analyses]
+    chloride_levels = [a['chloride_level'] for a in analyses]
+    if network is None:
+        nearest = nearest_facilities_batch(lats, lons, tph_levels, chloride_levels, db)
+    else:
+        nearest = nearest_facilities_by_road(lats, lons, tph_levels, chloride_levels, db, network)
+    states, counties = determine_state_county_batch(lats, lons, db)
+    return nearest, states, counties
+
+def _locate_each(analyses, db, network):
+    """
+    Locate every analysis, keeping one site's failure from failing the rest.
+    
+    Returns:
+        One entry per analysis: (nearest, states, counties, index into
+        them), or the error message when that site could not be located
+    """
+    located = [_lookup_field_error(a) for a in analyses]
+    valid = [i for i, error in enumerate(located) if error is None]
+    if not valid:
+        return located
+    try:
+        lookup = _locate_sites([analyses[i] for i in valid], db, network)
+        for j, i in enumerate(valid):
+            located[i] = lookup + (j,)
+    except (ValueError, TypeError, IndexError):
+        # Something the field check missed; look the sites up one at a time
+        for i in valid:
+            try:
+                located[i] = _locate_sites([analyses[i]], db, network) + (0,)
+            except (ValueError, TypeError, IndexError) as e:
+                located[i] = str(e)
+    return located
+
+def analyze_sites(analyses, db, simulate=False):
+    """
+    Run analyze_site for a list of analysis dictionaries.
+    
+    Facility and county lookups for the whole list are done in one
+    distance-matrix pass (or one road-network lookup when a road graph is
+    installed). One entry is returned per analysis, in order:
+    a dict with 'results', 'state' and 'county', or with 'error' set when
+    that site could not be scored. With simulate, each entry also holds
+    the simulate_site result under 'simulation'.
+    """
+    if not analyses:
+        return []
+    
+    network = get_road_network()
+    located = _locate_each(analyses, db, network)
+    
+    scored = []
+    for analysis, site_location in zip(analyses, located):
+        if isinstance(site_location, str):
+            scored.append({'results': None, 'state': None, 'county': None, 'error': site_location})
+            continue
+        nearest, states, counties, i = site_location
+        
+        # Exact scalar distance to the chosen facility keeps numbers identical to the UI
+        nearest_landfill = None
+        if nearest['landfill_index'][i] >= 0:
+            lf = db['landfills'][nearest['landfill_index'][i]]
+            if network is None:
+                nearest_landfill = {
+                    'landfill': lf,
+                    'distance_miles': haversine_distance(analysis['site_lat'], analysis['site_lon'],
+                                                         lf['latitude'], lf['longitude'])
+                }
+            else:
+                nearest_landfill = {'landfill': lf, 'distance_miles': float(nearest['landfill_distance'][i]),
+                                    'drive_hours': float(nearest['landfill_hours'][i])}
+        nearest_facility = None
+        if nearest['cf_index'][i] >= 0:
+            cf = db['clean_futures_facilities'][nearest['cf_index'][i]]
+            if network is None:
+                nearest_facility = {
+                    'facility': cf,
+                    'distance_miles': haversine_distance(analysis['site_lat'], analysis['site_lon'],
+                                                         cf['latitude'], cf['longitude'])
+                }
+            else:
+                nearest_facility = {'facility': cf, 'distance_miles': float(nearest['cf_distance'][i]),
+                                    'drive_hours': float(nearest['cf_hours'][i])}
+        
+        try:
+            results = analyze_site(analysis, db, nearest_landfill, nearest_facility)
+            site = {'results': results, 'state': states[i], 'county': counties[i], 'error': None}
+            if simulate:
+                site['simulation'] = simulate_site(analysis, results)
+            scored.append(site)
+        except (ValueError, TypeError, ZeroDivisionError) as e:
+            scored.append({'results': None, 'state': states[i], 'county': counties[i], 'error': str(e)})
+    
+    return scored
+
+def _parse_batch_chunk(chunk):
+    """Parse one chunk of (line_num, row) pairs into (line_num, site_id, analysis, error) entries"""
+    parsed = []
+    for line_num, row in chunk:
+        site_id = row.get('site_id') or str(line_num - 1)
+        try:
+            parsed.append((line_num, site_id, analysis_from_row(row), None))
+        except (ValueError, TypeError) as e:
+            parsed.append((line_num, site_id, None, str(e)))
+    return parsed
+
+def write_scored_chunk(parsed, scored, write_row, build_row=batch_result_row):
+    """Write result rows for a parsed chunk in input order; returns the number of errors"""
+    scored = iter(scored)
+    errors = 0
+    for line_num, site_id, analysis, error in parsed:
+        if analysis is not None:
+            site = next(scored)
+            error = site['error']
+        if error is None:
+            row = build_row(site_id, analysis, site['results'], site['state'], site['county'])
+            for opt_type, sim in site.get('simulation', {}).items():
+                if sim:
+                    row[f'{opt_type}_simulated_days'] = sim['project_days']
+            write_row(row)
+        else:
+            write_row({'site_id': site_id, 'error': f"line {line_num}: {error}"})
+            errors += 1
+    return errors
+
+def iter_scored_batch(reader, db, chunk_size=BATCH_CHUNK_SIZE, workers=1, simulate=False):
+    """
+    Parse and score rows from a csv.DictReader chunk by chunk.
+    
+    Returns:
+        Iterator of (parsed, scored) per chunk: parsed holds (line_num,
+        site_id, analysis, error) entries and scored the analyze_sites
+        entries for the rows that parsed, both in input order
+    """
+    rows = enumerate(reader, start=2)
+    chunks = iter(lambda: list(itertools.islice(rows, chunk_size)), [])
+    tagged_chunks = (
+        (parsed, [analysis for _, _, analysis, _ in parsed if analysis is not None])
+        for parsed in map(_parse_batch_chunk, chunks)
+    )
+    
+    if workers == 1:
+        return ((parsed, analyze_sites(analyses, db, simulate)) for parsed, analyses in tagged_chunks)
+    
+    from .portfolio import iter_scored_chunks
+    return iter_scored_chunks(tagged_chunks, db, workers, simulate)
+
+def run_batch(input_file, output_file, db=None, chunk_size=BATCH_CHUNK_SIZE, workers=1, simulate=False,
+              excel=False):
+    """
+    Score every site in a CSV stream and write one result row per site.
+    
+    Rows are read and written in chunks of chunk_size, so memory use does
+    not grow with the size of the input file. Facility distances for each
+    chunk come from the distance-matrix engine. A row that cannot be parsed
+    is written with its 'error' column filled in instead of stopping the run.
+    With workers > 1 (or 0 for one per CPU core) chunks are scored in a
+    process pool; output rows stay in input order. With simulate, the
+    truck-cycle simulation's day counts are added as extra columns.
+    
+    With excel, output_file is a path or binary file and an .xlsx workbook
+    is streamed to it instead of CSV (one Sites row per site, plus Summary
+    and Regulatory Thresholds sheets).
+    
+    Returns:
+        Tuple of (rows processed, rows with errors)
+    """
+    if db is None:
+        db = get_facilities_database()
+    
+    reader = csv.DictReader(input_file)
+    columns = BATCH_OUTPUT_COLUMNS + BATCH_SIMULATION_COLUMNS if simulate else BATCH_OUTPUT_COLUMNS
+    if excel:
+        from .excel_report import open_batch_workbook, write_batch_row
+        book = open_batch_workbook(columns)
+        write_row = functools.partial(write_batch_row, book)
+    else:
+        writer = csv.DictWriter(output_file, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        write_row = writer.writerow
+    
+    scored_chunks = iter_scored_batch(reader, db, chunk_size, workers, simulate)
+    
+    processed = 0
+    errors = 0
+    for parsed, scored in scored_chunks:
+        errors += write_scored_chunk(parsed, scored, write_row)
+        processed += len(parsed)
+    
+    if excel:
+        from .excel_report import close_batch_workbook
+        close_batch_workbook(book, output_file, processed, errors, simulate, getattr(input_file, 'name', None))
+    
+    return processed, errors
+
+def batch_main(argv=None):
+    """Command-line entry point for headless batch scoring"""
+    parser = argparse.ArgumentParser(
+        prog="python -m clean_futures",
+        description="Score a CSV of spill sites without the Streamlit UI. "
+                    "Use 'streamlit run clean_futures_recommendation_tool.py' for the interactive app."
+    )
+    parser.add_argument('input', help="Input CSV of sites ('-' for stdin)")
+    parser.add_argument('output', help="Output CSV of results ('-' for stdout); "
+                                       "a name ending in .xlsx writes an Excel workbook and one ending "
+                                       "in .parquet a Parquet dataset directory")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes for portfolio evaluation (0 = one per CPU core)")
+    parser.add_argument('--simulate', action='store_true',
+                        help="Add day counts from the truck-cycle simulation to the output")
+    args = parser.parse_args(argv)
+    
+    output = args.output.lower()
+    in_f = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    try:
+        if output.endswith('.parquet'):
+            from .parquet_output import write_batch_parquet
+            processed, errors = write_batch_parquet(in_f, args.output, workers=args.workers, simulate=args.simulate)
+        else:
+            excel = output.endswith('.xlsx')
+            if excel:
+                out_f = open(args.output, 'wb')
+            else:
+                out_f = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+            try:
+                processed, errors = run_batch(in_f, out_f, workers=args.workers, simulate=args.simulate, excel=excel)
+            finally:
+                if out_f is not sys.stdout:
+                    out_f.close()
+    finally:
+        if in_f is not sys.stdin:
+            in_f.close()
+    
+    print(f"Scored {processed} sites ({errors} errors)", file=sys.stderr)
+    return 1 if errors else 0
@@ -0,0 +1,394 @@
+"""
+Option calculators for the Clean Futures calculation core.
+
+Compares three remediation approaches:
+1. Dig & Haul to Landfill
+2. Clean Futures Onsite Remediation
+3. Clean Futures Surface Facility Treatment
+"""
+
+import math
+
+from .geo import find_nearest_cf_facility, find_nearest_qualified_landfill, travel_speed_mph
+from .records import DigHaulResult, OnsiteResult, SurfaceResult
+
+# ============================================================================
+# CALCULATION FUNCTIONS
+# ============================================================================
+
+def calculate_volume_cy(surface_area_sqft, depth_ft):
+    """Calculate volume in cubic yards from surface area and depth"""
+    cubic_feet = surface_area_sqft * depth_ft
+    cubic_yards = cubic_feet / 27
+    return cubic_yards
+
+def calculate_co2_emissions(fuel_gallons):
+    """Calculate CO2 emissions from fuel consumption"""
+    # Diesel produces approximately 22.38 lbs CO2 per gallon
+    co2_lbs = fuel_gallons * 22.38
+    co2_tons = co2_lbs / 2000
+    return co2_lbs, co2_tons
+
+def calculate_dig_and_haul(volume_cy, site_lat, site_lon, needs_backfill, 
+                          tph_level, chloride_level, db, 
+                          num_trucks=3, equipment_capacity_per_day=300,
+                          landfill_has_backfill=False, extra_backfill_minutes=0,
+                          advanced_params=None, nearest_landfill=None):
+    """
+    Calculate costs and metrics for Dig & Haul option.
+    
+    Implements bottleneck analysis:
+    - Truck capacity/day = (trips per truck per day) × num_trucks × truck_capacity_cy
+    - Equipment capacity/day = from input (simple) or calculated (advanced)
+    - Actual daily capacity = MIN(truck capacity, equipment capacity)
+    
+    Backfill logic:
+    - If landfill has backfill: no extra time needed
+    - If landfill does NOT have backfill: add extra_backfill_minutes to each trip
+    - Extra travel time affects: trip duration, project timeline, trucking cost, CO2
+    
+    This math aligns with Advanced Mode where users can specify detailed equipment.
+    
+    nearest_landfill may be passed in when it was already looked up (e.g. by
+    nearest_facilities_batch); otherwise it is found here.
+    """
+    
+    # Find nearest qualified landfill
+    nearest_lf = nearest_landfill
+    if nearest_lf is None:
+        nearest_lf = find_nearest_qualified_landfill(site_lat, site_lon, tph_level, 
+                                                      chloride_level, needs_backfill, db)
+    
+    if not nearest_lf:
+        return None
+    
+    landfill = nearest_lf['landfill']
+    distance_miles = nearest_lf['distance_miles']
+    
+    # Use advanced parameters or defaults
+    if advanced_params:
+        truck_capacity_cy = advanced_params.get('truck_capacity_cy', 18)
+        num_trucks = advanced_params.get('num_trucks', num_trucks)
+        truck_hourly_rate = advanced_params.get('truck_hourly_rate', 85)
+        excavator_rate = advanced_params.get('excavator_rate', 150)
+        loader_rate = advanced_params.get('loader_rate', 125)
+        work_hours_per_day = advanced_params.get('work_hours_per_day', 10)
+        disposal_cost = advanced_params.get('disposal_cost_cy', landfill['disposal_cost_cy'])
+        backfill_cost = advanced_params.get('backfill_cost_cy', 10)
+        # Advanced mode: calculate equipment capacity from detailed specs
+        excavator_capacity_cy_hr = advanced_params.get('excavator_capacity_cy_hr', 40)
+        loader_capacity_cy_hr = advanced_params.get('loader_capacity_cy_hr', 35)
+        num_excavators = advanced_params.get('num_excavators', 1)
+        num_loaders = advanced_params.get('num_loaders', 1)
+        equipment_capacity_per_day = min(
+            excavator_capacity_cy_hr * num_excavators,
+            loader_capacity_cy_hr * num_loaders
+        ) * work_hours_per_day
+    else:
+        # Simple mode defaults
+        truck_capacity_cy = 18
+        truck_hourly_rate = 85
+        excavator_rate = 150
+        loader_rate = 125
+        work_hours_per_day = 10
+        disposal_cost = landfill['disposal_cost_cy']
+        backfill_cost = 10 if needs_backfill else 0  # Always $10/CY in simple mode
+        # equipment_capacity_per_day comes from function parameter (user selection)
+    
+    # Trip time calculation
+    avg_speed_mph = travel_speed_mph(nearest_lf)
+    travel_time_hours = distance_miles / avg_speed_mph
+    loading_time = 0.25  # 15 min to load truck at site
+    unloading_time = 0.5  # 30 min at landfill (drop off + pick up backfill if available)
+    
+    # Base trip time (assuming backfill at landfill)
+    base_trip_time = loading_time + travel_time_hours + unloading_time + travel_time_hours + loading_time
+    
+    # Extra time if backfill NOT at landfill
+    if needs_backfill and not landfill_has_backfill:
+        extra_backfill_hours = extra_backfill_minutes / 60.0
+    else:
+        extra_backfill_hours = 0
+    
+    # Total trip time includes extra backfill sourcing time
+    trip_time = base_trip_time + extra_backfill_hours
+    
+    # BOTTLENECK ANALYSIS
+    # Calculate truck capacity per day
+    trips_per_truck_per_day = work_hours_per_day / trip_time
+    truck_capacity_per_day = trips_per_truck_per_day * num_trucks * truck_capacity_cy
+    
+    # Determine bottleneck
+    if truck_capacity_per_day <= equipment_capacity_per_day:
+        bottleneck = "Trucking"
+        actual_daily_capacity = truck_capacity_per_day
+    else:
+        bottleneck = "Loading Equipment"
+        actual_daily_capacity = equipment_capacity_per_day
+    
+    # Calculate duration based on bottleneck
+    project_days = math.ceil(volume_cy / actual_daily_capacity)
+    project_hours = project_days * work_hours_per_day
+    
+    # Number of trips (for cost calculation)
+    num_trips = math.ceil(volume_cy / truck_capacity_cy)
+    
+    # COSTS
+    # Equipment runs for project duration
+    equipment_cost = (excavator_rate + loader_rate) * project_hours
+    
+    # Trucking cost based on actual trips needed (includes extra backfill time)
+    total_truck_hours = num_trips * trip_time
+    trucking_cost = total_truck_hours * truck_hourly_rate
+    
+    # Disposal and backfill
+    disposal_total = volume_cy * disposal_cost
+    backfill_total = volume_cy * backfill_cost if needs_backfill else 0
+    
+    total_cost = equipment_cost + trucking_cost + disposal_total + backfill_total
+    cost_per_cy = total_cost / volume_cy
+    
+    # CO2 calculations
+    excavator_fuel_gph = 6
+    loader_fuel_gph = 5
+    truck_fuel_gph = 4
+    
+    # Base fuel consumption
+    base_truck_hours = num_trips * base_trip_time
+    base_truck_fuel = truck_fuel_gph * base_truck_hours
+    
+    # Extra fuel from backfill sourcing trips
+    extra_backfill_truck_hours = num_trips * extra_backfill_hours
+    extra_backfill_fuel = truck_fuel_gph * extra_backfill_truck_hours
+    
+    total_fuel = (excavator_fuel_gph * project_hours + 
+                  loader_fuel_gph * project_hours +
+                  base_truck_fuel +
+                  extra_backfill_fuel)
+    
+    co2_lbs, co2_tons = calculate_co2_emissions(total_fuel)
+    
+    # Also calculate CO2 breakdown for display
+    _, extra_backfill_co2_tons = calculate_co2_emissions(extra_backfill_fuel)
+    
+    return DigHaulResult(
+        option_name='Dig & Haul to Landfill',
+        total_cost=total_cost,
+        cost_per_cy=cost_per_cy,
+        project_days=project_days,
+        landfill_name=f"{landfill['company']} - {landfill['site_name']}",
+        distance_miles=distance_miles,
+        avg_speed_mph=avg_speed_mph,
+        co2_tons=co2_tons,
+        equipment_cost=equipment_cost,
+        trucking_cost=trucking_cost,
+        disposal_cost=disposal_total,
+        backfill_cost=backfill_total,
+        includes_backfill=needs_backfill,
+        backfill_available_at_landfill=landfill_has_backfill,
+        # Bottleneck info
+        bottleneck=bottleneck,
+        truck_capacity_per_day=truck_capacity_per_day,
+        equipment_capacity_per_day=equipment_capacity_per_day,
+        actual_daily_capacity=actual_daily_capacity,
+        num_trucks=num_trucks,
+        num_trips=num_trips,
+        trip_time_hours=trip_time,
+        base_trip_time_hours=base_trip_time,
+        # Extra backfill info
+        extra_backfill_minutes=extra_backfill_minutes if needs_backfill and not landfill_has_backfill else 0,
+        extra_backfill_co2_tons=extra_backfill_co2_tons
+    )
+
+def calculate_onsite_remediation(volume_cy, site_lat, site_lon, soil_permeability='medium',
+                                tph_level=0, chloride_level=0, advanced_params=None):
+    """Calculate costs and metrics for Onsite Remediation option"""
+    
+    # Simple mode: flat $30/CY rate
+    # Advanced mode: will use detailed calculation with mobilization, amendments, etc.
+    if advanced_params:
+        processing_cost_cy = advanced_params.get('onsite_processing_cost_cy', 30)
+        # Advanced mode could add mobilization, amendments, etc. here
+        total_processing_cost = volume_cy * processing_cost_cy
+        mobilization_cost = advanced_params.get('mobilization_cost', 0)
+        amendment_cost = advanced_params.get('amendment_cost', 0)
+        total_cost = total_processing_cost + mobilization_cost + amendment_cost
+    else:
+        # Simple mode: flat $30/CY all-in rate
+        processing_cost_cy = 30
+        total_processing_cost = volume_cy * processing_cost_cy
+        mobilization_cost = 0  # Included in flat rate
+        amendment_cost = 0  # Included in flat rate
+        total_cost = total_processing_cost
+    
+    # Treatment duration estimation based on soil permeability
+    base_treatment_days = 45
+    if soil_permeability == 'high':
+        treatment_days = base_treatment_days * 0.7  # Faster treatment
+    elif soil_permeability == 'low':
+        treatment_days = base_treatment_days * 1.5  # Slower treatment
+    else:
+        treatment_days = base_treatment_days
+    
+    # Adjust for contamination levels
+    if tph_level > 3000:
+        treatment_days *= 1.2
+    if chloride_level > 7000:
+        treatment_days *= 1.2
+    
+    treatment_days = int(treatment_days)
+    
+    cost_per_cy = total_cost / volume_cy
+    
+    # CO2 estimation (much lower than dig & haul)
+    # Onsite equipment and limited trucking
+    estimated_fuel_gallons = volume_cy * 0.1  # Much less fuel than hauling
+    co2_lbs, co2_tons = calculate_co2_emissions(estimated_fuel_gallons)
+    
+    return OnsiteResult(
+        option_name='Clean Futures Onsite Remediation',
+        total_cost=total_cost,
+        cost_per_cy=cost_per_cy,
+        project_days=treatment_days,
+        processing_cost=total_processing_cost,
+        mobilization_cost=mobilization_cost,
+        amendment_cost=amendment_cost,
+        co2_tons=co2_tons,
+        includes_backfill=True,
+        soil_returned_clean=True,
+        permeability_factor=soil_permeability,
+        rate_per_cy=processing_cost_cy
+    )
+
+def calculate_surface_facility(volume_cy, site_lat, site_lon, needs_backfill,
+                               tph_level, chloride_level, db, 
+                               num_trucks=3, equipment_capacity_per_day=300,
+                               advanced_params=None, nearest_facility=None):
+    """
+    Calculate costs and metrics for Surface Facility option.
+    
+    KEY CONCEPT: Operators drop off contaminated soil and pick up clean backfill
+    (from previously treated stockpile) on the SAME TRIP. Treatment happens after
+    the operator leaves and doesn't affect their timeline.
+    
+    This makes Surface Facility timeline = just the hauling days (same as Dig & Haul).
+    
+    Competitive advantages over landfill:
+    - No disposal liability (soil is treated, not buried)
+    - Backfill included (pick up clean soil same trip)
+    - Faster/more convenient than sourcing separate backfill
+    - Environmentally friendly alternative
+    
+    nearest_facility may be passed in when it was already looked up (e.g. by
+    nearest_facilities_batch); otherwise it is found here.
+    """
+    
+    # Find nearest CF facility
+    nearest_cf = nearest_facility
+    if nearest_cf is None:
+        nearest_cf = find_nearest_cf_facility(site_lat, site_lon, db)
+    
+    if not nearest_cf:
+        return None
+    
+    facility = nearest_cf['facility']
+    distance_miles = nearest_cf['distance_miles']
+    
+    # Transportation parameters
+    if advanced_params:
+        truck_capacity_cy = advanced_params.get('truck_capacity_cy', 18)
+        num_trucks = advanced_params.get('num_trucks', num_trucks)
+        truck_hourly_rate = advanced_params.get('truck_hourly_rate', 85)
+        processing_cost_cy = advanced_params.get('surface_processing_cost_cy', 25)
+        work_hours_per_day = advanced_params.get('work_hours_per_day', 10)
+        # Advanced mode equipment calculation
+        excavator_capacity_cy_hr = advanced_params.get('excavator_capacity_cy_hr', 40)
+        loader_capacity_cy_hr = advanced_params.get('loader_capacity_cy_hr', 35)
+        num_excavators = advanced_params.get('num_excavators', 1)
+        num_loaders = advanced_params.get('num_loaders', 1)
+        equipment_capacity_per_day = min(
+            excavator_capacity_cy_hr * num_excavators,
+            loader_capacity_cy_hr * num_loaders
+        ) * work_hours_per_day
+    else:
+        truck_capacity_cy = 18
+        truck_hourly_rate = 85
+        processing_cost_cy = facility['processing_cost_cy']
+        work_hours_per_day = 10
+        # equipment_capacity_per_day comes from function parameter
+    
+    # Trip calculations
+    avg_speed_mph = travel_speed_mph(nearest_cf)
+    travel_time_hours = distance_miles / avg_speed_mph
+    loading_time = 0.25  # Load contaminated soil at site
+    unloading_time = 0.5  # Drop off contaminated, pick up clean backfill at facility
+    
+    # Round trip time (drop off dirty, pick up clean - all in one trip)
+    trip_time = loading_time + travel_time_hours + unloading_time + travel_time_hours + loading_time
+    
+    # BOTTLENECK ANALYSIS
+    # Calculate truck capacity per day
+    trips_per_truck_per_day = work_hours_per_day / trip_time
+    truck_capacity_per_day = trips_per_truck_per_day * num_trucks * truck_capacity_cy
+    
+    # Determine bottleneck
+    if truck_capacity_per_day <= equipment_capacity_per_day:
+        bottleneck = "Trucking"
+        actual_daily_capacity = truck_capacity_per_day
+    else:
+        bottleneck = "Loading Equipment"
+        actual_daily_capacity = equipment_capacity_per_day
+    
+    # Calculate hauling duration - THIS IS THE TOTAL PROJECT TIME
+    # (No waiting for treatment - operator picks up clean backfill same trip)
+    project_days = math.ceil(volume_cy / actual_daily_capacity)
+    
+    # Number of trips
+    num_trips = math.ceil(volume_cy / truck_capacity_cy)
+    total_truck_hours = num_trips * trip_time
+    
+    # COSTS
+    trucking_cost = total_truck_hours * truck_hourly_rate
+    processing_cost = volume_cy * processing_cost_cy
+    
+    # Equipment cost for loading (excavator + loader during project)
+    excavator_rate = 150
+    loader_rate = 125
+    equipment_hours = project_days * work_hours_per_day
+    equipment_cost = (excavator_rate + loader_rate) * equipment_hours
+    
+    total_cost = trucking_cost + processing_cost + equipment_cost
+    cost_per_cy = total_cost / volume_cy
+    
+    # CO2 (trucking + loading equipment)
+    truck_fuel_gph = 4
+    excavator_fuel_gph = 6
+    loader_fuel_gph = 5
+    total_fuel = (truck_fuel_gph * total_truck_hours + 
+                  excavator_fuel_gph * equipment_hours +
+                  loader_fuel_gph * equipment_hours)
+    co2_lbs, co2_tons = calculate_co2_emissions(total_fuel)
+    
+    return SurfaceResult(
+        option_name='Clean Futures Surface Facility',
+        total_cost=total_cost,
+        cost_per_cy=cost_per_cy,
+        project_days=project_days,  # Just haul days - no treatment wait!
+        facility_name=facility['facility_name'],
+        distance_miles=distance_miles,
+        avg_speed_mph=avg_speed_mph,
+        trucking_cost=trucking_cost,
+        processing_cost=processing_cost,
+        equipment_cost=equipment_cost,
+        co2_tons=co2_tons,
+        includes_backfill=True,
+        soil_returned_clean=True,
+        # Bottleneck info
+        bottleneck=bottleneck,
+        truck_capacity_per_day=truck_capacity_per_day,
+        equipment_capacity_per_day=equipment_capacity_per_day,
+        actual_daily_capacity=actual_daily_capacity,
+        num_trucks=num_trucks,
+        num_trips=num_trips,
+        trip_time_hours=trip_time
+    )
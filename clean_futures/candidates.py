@@ -0,0 +1,250 @@
+"""
+Top-k facility candidates for the Clean Futures calculation core.
+"""
+
+import numpy as np
+
+from .calculators import calculate_dig_and_haul, calculate_surface_facility
+from .distance_matrix import facility_coordinate_arrays, facility_distance_matrix, qualified_landfill_mask
+from .facilities import get_derived
+from .geo import STRAIGHT_LINE_SPEED_MPH, find_nearest_qualified_landfill, haversine_distance
+from .vectorized import (calculate_dig_and_haul_vectorized, calculate_surface_facility_vectorized,
+                         resolve_calculator_inputs)
+
+# ============================================================================
+# TOP-K CANDIDATES
+# ============================================================================
+# The option calculators cost only the nearest landfill and CF facility, but
+# a farther landfill with backfill on site or a lower disposal rate can be
+# cheaper once trucking is included. Here every qualified facility is a
+# candidate and the k cheapest are returned per option.
+#
+# Total cost never decreases as the drive gets longer, so evaluating the
+# vectorized calculator at the shortest possible drive time (straight-line
+# miles at the fastest speed any route can average) gives a lower bound on
+# each candidate's cost in one pass. Candidates are then fully costed in
+# order of that bound, stopping once the next bound cannot beat the k-th
+# cheapest found so far. Without a road network the bound is within a
+# rounding margin of the exact cost, so little beyond the winners is costed.
+#
+# The landfill the Dig & Haul option uses (the nearest qualified one) is
+# costed with exactly the main calculator's inputs, so its row matches the
+# Dig & Haul result. The analysis' landfill_has_backfill answer describes
+# that landfill only; every other candidate uses its own backfill_available
+# flag. When the answer was yes, no pickup time was asked for, so
+# alternatives without backfill use the questionnaire's default pickup time.
+
+# Candidates returned per option by default
+TOP_K_CANDIDATES = 3
+
+# Extra minutes per trip to pick up backfill elsewhere (the questionnaire default)
+BACKFILL_PICKUP_MINUTES = 30
+
+# Headroom on the bound speed for float32 route tables and distance rounding
+_BOUND_SPEED_SLACK = 1.01
+
+def _bound_speed_mph(db, network):
+    """Fastest average speed any route can reach (straight-line speed without a road network)"""
+    if network is None:
+        return STRAIGHT_LINE_SPEED_MPH * _BOUND_SPEED_SLACK
+    
+    from .roads import ROAD_ACCESS_SPEED_MPH
+    
+    def build():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speeds = network['miles'] / network['hours']
+        fastest = float(np.max(speeds[np.isfinite(speeds)], initial=0.0))
+        return max(fastest, ROAD_ACCESS_SPEED_MPH, STRAIGHT_LINE_SPEED_MPH) * _BOUND_SPEED_SLACK
+    
+    return get_derived(db, ('bound_speed', network['fingerprint']), build)
+
+def _route_lookup(lat, lon, kind, db, network):
+    """
+    Function from facility position to a find_nearest_*-style route dictionary.
+    
+    Road routes for the site are looked up once, on the first call.
+    """
+    records = db[kind]
+    key = 'landfill' if kind == 'landfills' else 'facility'
+    if network is None:
+        return lambda position: {
+            key: records[position],
+            'distance_miles': haversine_distance(lat, lon, records[position]['latitude'],
+                                                 records[position]['longitude'])
+        }
+    
+    from .roads import road_routes
+    
+    routes = {}
+    
+    def lookup(position):
+        if not routes:
+            miles, hours = road_routes([lat], [lon], kind, db, network)
+            routes.update(miles=miles[0], hours=hours[0])
+        return {key: records[position], 'distance_miles': float(routes['miles'][position]),
+                'drive_hours': float(routes['hours'][position])}
+    
+    return lookup
+
+def _landfill_backfill(landfill, analysis, chosen):
+    """
+    Backfill inputs for costing one landfill candidate.
+    
+    Returns:
+        Tuple of (landfill_has_backfill, extra_backfill_minutes): the
+        analysis' own answers for the chosen landfill, and the record's
+        backfill_available flag for any other
+    """
+    has_backfill = analysis.get('landfill_has_backfill', False)
+    minutes = analysis.get('extra_backfill_minutes', 0)
+    if chosen:
+        return has_backfill, minutes
+    if has_backfill:
+        minutes = BACKFILL_PICKUP_MINUTES
+    return bool(landfill.get('backfill_available', has_backfill)), minutes
+
+def _cheapest(bounds, positions, cost, k):
+    """
+    Fully cost candidates in order of their lower bound until none can make the top k.
+    
+    Args:
+        bounds: Lower bound on each candidate's total cost
+        positions: Record position of each candidate
+        cost: Function (position) -> calculator result
+        k: Number of results to keep
+    
+    Returns:
+        Up to k calculator results, cheapest first
+    """
+    best = []
+    for i in np.lexsort((positions, bounds)).tolist():
+        # A bound equal to the k-th cost can still win on the distance tie-break
+        if len(best) >= k and bounds[i] > best[-1]['total_cost']:
+            break
+        best.append(cost(int(positions[i])))
+        best.sort(key=lambda result: (result['total_cost'], result['distance_miles']))
+        del best[k:]
+    return best
+
+def top_k_landfills(analysis, db, k=TOP_K_CANDIDATES, nearest_landfill=None):
+    """
+    The k cheapest Dig & Haul options over every landfill that accepts the site's contamination.
+    
+    Args:
+        analysis: Dictionary in the same shape as st.session_state.analysis
+        db: Facilities database
+        k: Number of options to return
+        nearest_landfill: The find_nearest_qualified_landfill result the
+            Dig & Haul option uses, when already looked up
+    
+    Returns:
+        List of calculate_dig_and_haul results, cheapest first (empty when
+        no landfill qualifies)
+    """
+    from .roads import get_road_network
+    
+    coords = facility_coordinate_arrays(db)
+    lat, lon = analysis['site_lat'], analysis['site_lon']
+    positions = np.flatnonzero(qualified_landfill_mask([analysis['tph_level']], [analysis['chloride_level']],
+                                                       coords)[0])
+    if k <= 0 or not len(positions):
+        return []
+    
+    if nearest_landfill is None:
+        nearest_landfill = find_nearest_qualified_landfill(lat, lon, analysis['tph_level'],
+                                                           analysis['chloride_level'], analysis['needs_backfill'], db)
+    chosen = -1
+    if nearest_landfill is not None:
+        chosen = next((p for p, lf in enumerate(db['landfills']) if lf == nearest_landfill['landfill']), -1)
+    backfill = {position: _landfill_backfill(db['landfills'][position], analysis, position == chosen)
+                for position in positions.tolist()}
+    
+    network = get_road_network()
+    straight = facility_distance_matrix([lat], [lon], coords, 'landfills', positions)[0]
+    
+    params = resolve_calculator_inputs(analysis, None, None)['dig_haul']
+    advanced = analysis['advanced_params']
+    if advanced and 'disposal_cost_cy' in advanced:
+        params['disposal_cost_cy'] = advanced['disposal_cost_cy']
+    else:
+        params['disposal_cost_cy'] = coords['landfill_disposal_cost'][positions]
+    params['avg_speed_mph'] = _bound_speed_mph(db, network)
+    bounds = calculate_dig_and_haul_vectorized(
+        analysis['volume_cy'], straight, analysis['needs_backfill'],
+        landfill_has_backfill=np.array([backfill[position][0] for position in positions.tolist()]),
+        extra_backfill_minutes=np.array([backfill[position][1] for position in positions.tolist()]),
+        **params
+    )['total_cost']
+    
+    route = _route_lookup(lat, lon, 'landfills', db, network)
+    
+    def cost(position):
+        has_backfill, minutes = backfill[position]
+        return calculate_dig_and_haul(
+            analysis['volume_cy'], lat, lon, analysis['needs_backfill'],
+            analysis['tph_level'], analysis['chloride_level'], db,
+            num_trucks=analysis.get('num_trucks', 3),
+            equipment_capacity_per_day=analysis.get('equipment_capacity_per_day', 300),
+            landfill_has_backfill=has_backfill,
+            extra_backfill_minutes=minutes,
+            advanced_params=advanced,
+            nearest_landfill=nearest_landfill if position == chosen else route(position)
+        )
+    
+    return _cheapest(bounds, positions, cost, k)
+
+def top_k_cf_facilities(analysis, db, k=TOP_K_CANDIDATES):
+    """
+    The k cheapest Surface Facility options over every Clean Futures facility.
+    
+    Args:
+        analysis: Dictionary in the same shape as st.session_state.analysis
+        db: Facilities database
+        k: Number of options to return
+    
+    Returns:
+        List of calculate_surface_facility results, cheapest first
+    """
+    from .roads import get_road_network
+    
+    coords = facility_coordinate_arrays(db)
+    lat, lon = analysis['site_lat'], analysis['site_lon']
+    positions = np.arange(len(db['clean_futures_facilities']))
+    if k <= 0 or not len(positions):
+        return []
+    
+    network = get_road_network()
+    straight = facility_distance_matrix([lat], [lon], coords, 'clean_futures_facilities')[0]
+    
+    params = resolve_calculator_inputs(analysis, None, None)['surface']
+    if not analysis['advanced_params']:
+        params['processing_cost_cy'] = coords['cf_processing_cost']
+    params['avg_speed_mph'] = _bound_speed_mph(db, network)
+    bounds = calculate_surface_facility_vectorized(analysis['volume_cy'], straight, **params)['total_cost']
+    
+    route = _route_lookup(lat, lon, 'clean_futures_facilities', db, network)
+    
+    def cost(position):
+        return calculate_surface_facility(
+            analysis['volume_cy'], lat, lon, analysis['needs_backfill'],
+            analysis['tph_level'], analysis['chloride_level'], db,
+            num_trucks=analysis.get('num_trucks', 3),
+            equipment_capacity_per_day=analysis.get('equipment_capacity_per_day', 300),
+            advanced_params=analysis['advanced_params'],
+            nearest_facility=route(position)
+        )
+    
+    return _cheapest(bounds, positions, cost, k)
+
+def top_k_options(analysis, db, k=TOP_K_CANDIDATES, nearest_landfill=None):
+    """
+    The k cheapest facility choices for each trucking option.
+    
+    Returns:
+        Dictionary with 'dig_haul' and 'surface' lists of calculator results,
+        cheapest first
+    """
+    return {
+        'dig_haul': top_k_landfills(analysis, db, k, nearest_landfill),
+        'surface': top_k_cf_facilities(analysis, db, k)
+    }
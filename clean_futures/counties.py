@@ -0,0 +1,142 @@
+"""
+County lookup raster for the Clean Futures calculation core.
+"""
+
+import functools
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from .facilities import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# COUNTY LOOKUP RASTER
+# ============================================================================
+# State and county come from a lookup grid over the basin box the
+# questionnaires accept (lat 30-35, lon -105 to -100). The grid is
+# rasterized once per process from the county boundaries shipped in
+# permian_counties.geojson (U.S. Census Bureau outlines). Each cell holds
+# the code of the county containing its center, so a lookup is one array
+# index. Cells are 0.005° (~0.3 mi); only points that close to a county line
+# can land in the neighbouring county.
+
+COUNTY_BOUNDARIES_FILENAME = "permian_counties.geojson"
+COUNTY_RASTER_LAT_RANGE = (30.0, 35.0)
+COUNTY_RASTER_LON_RANGE = (-105.0, -100.0)
+COUNTY_RASTER_CELL_DEG = 0.005
+
+def _outer_rings(geometry):
+    """Return the outer rings of a GeoJSON Polygon or MultiPolygon"""
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates'][0]]
+    return [polygon[0] for polygon in geometry['coordinates']]
+
+def build_county_raster(path=None):
+    """
+    Rasterize county boundaries into a state/county lookup grid.
+    
+    Returns:
+        Dictionary with the 'grid' of county codes (0 = no county) and the
+        'names' list of (state, county) tuples indexed by code, or None if
+        the boundary file is not available
+    """
+    path = Path(path) if path else DATA_DIR / COUNTY_BOUNDARIES_FILENAME
+    if not path.exists():
+        logger.warning("County boundary file %s not found; using nearest-landfill counties", path.name)
+        return None
+    
+    with open(path, encoding='utf-8') as f:
+        features = json.load(f)['features']
+    
+    lat_min, lat_max = COUNTY_RASTER_LAT_RANGE
+    lon_min, lon_max = COUNTY_RASTER_LON_RANGE
+    cell = COUNTY_RASTER_CELL_DEG
+    n_rows = int(round((lat_max - lat_min) / cell))
+    n_cols = int(round((lon_max - lon_min) / cell))
+    row_lats = lat_min + (np.arange(n_rows) + 0.5) * cell
+    col_lons = lon_min + (np.arange(n_cols) + 0.5) * cell
+    
+    grid = np.zeros((n_rows, n_cols), dtype=np.uint16)
+    names = [None]
+    
+    for feature in features:
+        names.append((feature['properties']['state'], feature['properties']['county']))
+        code = len(names) - 1
+        
+        for ring in _outer_rings(feature['geometry']):
+            ring = np.asarray(ring, dtype=float)
+            x0, y0 = ring[:-1, 0], ring[:-1, 1]
+            x1, y1 = ring[1:, 0], ring[1:, 1]
+            
+            # Scanline fill: rows whose center latitude lies within the ring
+            first = np.searchsorted(row_lats, y0.min().item() if len(y0) else lat_max)
+            last = np.searchsorted(row_lats, y0.max().item() if len(y0) else lat_min, side='right')
+            if first >= last:
+                continue
+            lats = row_lats[first:last, None]
+            crosses = (y0 <= lats) != (y1 <= lats)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cross = x0 + (lats - y0) * (x1 - x0) / (y1 - y0)
+            
+            for offset in range(last - first):
+                xs = np.sort(x_cross[offset][crosses[offset]])
+                starts = np.searchsorted(col_lons, xs[0::2])
+                stops = np.searchsorted(col_lons, xs[1::2])
+                for start, stop in zip(starts, stops):
+                    grid[first + offset, start:stop] = code
+    
+    grid.setflags(write=False)
+    return {'grid': grid, 'names': names}
+
+@functools.lru_cache(maxsize=None)
+def get_county_raster():
+    """Return the process-wide county lookup raster (built on first call)"""
+    return build_county_raster()
+
+def _raster_cells(lats, lons, grid):
+    """Return (rows, cols, inside) raster cell indices for coordinate arrays"""
+    lat_min, lat_max = COUNTY_RASTER_LAT_RANGE
+    lon_min, lon_max = COUNTY_RASTER_LON_RANGE
+    n_rows, n_cols = grid.shape
+    inside = (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+    rows = np.clip(((lats - lat_min) / COUNTY_RASTER_CELL_DEG).astype(np.int64), 0, n_rows - 1)
+    cols = np.clip(((lons - lon_min) / COUNTY_RASTER_CELL_DEG).astype(np.int64), 0, n_cols - 1)
+    return rows, cols, inside
+
+def lookup_state_county(lat, lon, raster):
+    """Return (state, county) from the raster, or None if the point is not covered"""
+    if raster is None:
+        return None
+    lat_min, lat_max = COUNTY_RASTER_LAT_RANGE
+    lon_min, lon_max = COUNTY_RASTER_LON_RANGE
+    if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
+        return None
+    
+    n_rows, n_cols = raster['grid'].shape
+    row = min(int((lat - lat_min) / COUNTY_RASTER_CELL_DEG), n_rows - 1)
+    col = min(int((lon - lon_min) / COUNTY_RASTER_CELL_DEG), n_cols - 1)
+    return raster['names'][raster['grid'][row, col]]
+
+def lookup_state_county_batch(lats, lons, raster):
+    """
+    Vectorized raster lookup for many points.
+    
+    Returns:
+        Tuple of (states, counties) object arrays; None where not covered
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    states = np.full(len(lats), None, dtype=object)
+    counties = np.full(len(lats), None, dtype=object)
+    if raster is None:
+        return states, counties
+    
+    rows, cols, inside = _raster_cells(lats, lons, raster['grid'])
+    codes = np.where(inside, raster['grid'][rows, cols], 0)
+    state_names = np.array([None] + [name[0] for name in raster['names'][1:]], dtype=object)
+    county_names = np.array([None] + [name[1] for name in raster['names'][1:]], dtype=object)
+    return state_names[codes], county_names[codes]
@@ -0,0 +1,259 @@
+"""
+Site-by-facility distance matrix engine for the Clean Futures calculation core.
+"""
+
+import numpy as np
+
+from .counties import get_county_raster, lookup_state_county_batch
+from .facilities import FACILITY_ARRAY_DTYPES, FACILITY_ARRAY_FIELDS, FACILITY_ARRAY_PREFIXES, get_derived
+from .geo import determine_state_county
+
+# ============================================================================
+# DISTANCE MATRIX ENGINE
+# ============================================================================
+# Computes site-by-facility distances for many sites in one NumPy broadcast
+# instead of calling haversine_distance in a Python loop. Large inputs are
+# processed in row chunks so memory stays bounded (a 65,536-site chunk against
+# 18 facilities is ~9 MB of float64 temporaries).
+#
+# Facility data comes from the facility table: one contiguous, typed,
+# read-only column per field (facility_coordinate_arrays), built once per
+# snapshot. Besides the raw fields it holds each facility's latitude and
+# longitude in radians and cos(latitude), so the facility_distance_*
+# functions only convert the site side and the distance, qualification and
+# vectorized costing code never walks the facility records. The records stay
+# the source of truth and are used for names and display.
+
+DISTANCE_MATRIX_CHUNK = 65536
+
+def build_facility_coordinate_arrays(db):
+    """
+    Build the facility table: read-only NumPy columns of coordinates, acceptance limits and rates.
+    
+    Besides the FACILITY_ARRAY_FIELDS columns, each record list gets
+    '<prefix>_lat_rad', '<prefix>_lon_rad' and '<prefix>_cos_lat' columns
+    (prefix from FACILITY_ARRAY_PREFIXES) for the distance functions.
+    """
+    arrays = {
+        name: np.array([record[field] for record in db[kind]], dtype=FACILITY_ARRAY_DTYPES.get(name, float))
+        for name, (kind, field) in FACILITY_ARRAY_FIELDS.items()
+    }
+    for prefix in FACILITY_ARRAY_PREFIXES.values():
+        arrays[f'{prefix}_lat_rad'] = np.radians(arrays[f'{prefix}_lat'])
+        arrays[f'{prefix}_lon_rad'] = np.radians(arrays[f'{prefix}_lon'])
+        arrays[f'{prefix}_cos_lat'] = np.cos(arrays[f'{prefix}_lat_rad'])
+    for array in arrays.values():
+        array.setflags(write=False)
+    return arrays
+
+def facility_coordinate_arrays(db):
+    """Return the facility table (landfill and CF facility columns as NumPy arrays), built once per db"""
+    return get_derived(db, 'coordinate_arrays', lambda: build_facility_coordinate_arrays(db))
+
+def haversine_distance_matrix(site_lats, site_lons, facility_lats, facility_lons):
+    """
+    Calculate distances in miles from every site to every facility.
+    
+    Same formula as haversine_distance, evaluated as one broadcast.
+    Results agree with the scalar function to floating-point rounding.
+    
+    Returns:
+        Array of shape (n_sites, n_facilities)
+    """
+    R = 3959  # Earth's radius in miles
+    
+    site_lats = np.asarray(site_lats, dtype=float)[:, None]
+    site_lons = np.asarray(site_lons, dtype=float)[:, None]
+    facility_lats = np.asarray(facility_lats, dtype=float)[None, :]
+    facility_lons = np.asarray(facility_lons, dtype=float)[None, :]
+    
+    delta_lat = np.radians(facility_lats - site_lats)
+    delta_lon = np.radians(facility_lons - site_lons)
+    
+    a = (np.sin(delta_lat / 2) ** 2 +
+         np.cos(np.radians(site_lats)) * np.cos(np.radians(facility_lats)) * np.sin(delta_lon / 2) ** 2)
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    
+    return R * c
+
+def haversine_distance_pairs(lats1, lons1, lats2, lons2):
+    """Element-wise haversine miles between matching entries of coordinate arrays"""
+    R = 3959  # Earth's radius in miles
+    
+    delta_lat = np.radians(lats2 - lats1)
+    delta_lon = np.radians(lons2 - lons1)
+    
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(np.radians(lats1)) * np.cos(np.radians(lats2)) * np.sin(delta_lon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    
+    return R * c
+
+def iter_distance_matrix(site_lats, site_lons, facility_lats, facility_lons,
+                         chunk_size=DISTANCE_MATRIX_CHUNK):
+    """
+    Yield (start, stop, distances) blocks of the site-by-facility matrix.
+    
+    Only one block of chunk_size rows is held in memory at a time.
+    """
+    site_lats = np.asarray(site_lats, dtype=float)
+    site_lons = np.asarray(site_lons, dtype=float)
+    
+    for start in range(0, len(site_lats), chunk_size):
+        stop = min(start + chunk_size, len(site_lats))
+        yield start, stop, haversine_distance_matrix(
+            site_lats[start:stop], site_lons[start:stop], facility_lats, facility_lons
+        )
+
+def _haversine_radians(lat1, lon1, cos_lat1, lat2, lon2, cos_lat2):
+    """Haversine miles from radian coordinates and latitude cosines (broadcasts like the arrays)"""
+    R = 3959  # Earth's radius in miles
+    
+    a = np.sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * cos_lat2 * np.sin((lon2 - lon1) / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    
+    return R * c
+
+def _site_radians(site_lats, site_lons):
+    """(lat_rad, lon_rad, cos_lat) arrays for site coordinates in degrees"""
+    lat_rad = np.radians(np.asarray(site_lats, dtype=float))
+    return lat_rad, np.radians(np.asarray(site_lons, dtype=float)), np.cos(lat_rad)
+
+def _facility_radians(coords, kind, positions=None):
+    """(lat_rad, lon_rad, cos_lat) columns of the facility table for one record list"""
+    prefix = FACILITY_ARRAY_PREFIXES[kind]
+    columns = (coords[f'{prefix}_lat_rad'], coords[f'{prefix}_lon_rad'], coords[f'{prefix}_cos_lat'])
+    if positions is None:
+        return columns
+    return tuple(column[positions] for column in columns)
+
+def facility_distance_matrix(site_lats, site_lons, coords, kind, positions=None):
+    """
+    Distances in miles from every site to every facility of one kind.
+    
+    Agrees with haversine_distance_matrix on the facilities' coordinates to
+    floating-point rounding, but reads the precomputed radian and cos(lat)
+    columns of the facility table, so only the site side is converted.
+    
+    Args:
+        coords: facility_coordinate_arrays result
+        kind: 'landfills' or 'clean_futures_facilities'
+        positions: Optional record positions to restrict the columns to
+    
+    Returns:
+        Array of shape (n_sites, n_facilities)
+    """
+    site = _site_radians(site_lats, site_lons)
+    facility = _facility_radians(coords, kind, positions)
+    return _haversine_radians(*(column[:, None] for column in site), *(column[None, :] for column in facility))
+
+def iter_facility_distance_matrix(site_lats, site_lons, coords, kind, positions=None,
+                                  chunk_size=DISTANCE_MATRIX_CHUNK):
+    """Yield (start, stop, distances) blocks of facility_distance_matrix, chunk_size rows at a time"""
+    site = _site_radians(site_lats, site_lons)
+    facility = tuple(column[None, :] for column in _facility_radians(coords, kind, positions))
+    
+    for start in range(0, len(site[0]), chunk_size):
+        stop = min(start + chunk_size, len(site[0]))
+        yield start, stop, _haversine_radians(*(column[start:stop, None] for column in site), *facility)
+
+def facility_distance_pairs(site_lats, site_lons, coords, kind, positions):
+    """Element-wise haversine miles from each site to the facility at the matching position"""
+    return _haversine_radians(*_site_radians(site_lats, site_lons), *_facility_radians(coords, kind, positions))
+
+def qualified_landfill_mask(tph_levels, chloride_levels, coords):
+    """
+    Which landfills accept each site's contamination levels.
+    
+    Same acceptance rules as find_nearest_qualified_landfill (a level of 0
+    or below is not tested).
+    
+    Returns:
+        Boolean array of shape (n_sites, n_landfills)
+    """
+    tph = np.asarray(tph_levels, dtype=float)[:, None]
+    chloride = np.asarray(chloride_levels, dtype=float)[:, None]
+    return (((tph <= 0) | (tph <= coords['landfill_tph_max'])) &
+            ((chloride <= 0) | (chloride <= coords['landfill_chloride_max'])))
+
+def nearest_facilities_batch(site_lats, site_lons, tph_levels, chloride_levels, db,
+                             chunk_size=DISTANCE_MATRIX_CHUNK):
+    """
+    Find the nearest qualified landfill and nearest CF facility for many sites.
+    
+    Applies the same acceptance rules as find_nearest_qualified_landfill.
+    
+    Returns:
+        Dictionary of arrays: 'landfill_index' (-1 when no landfill qualifies),
+        'landfill_distance', 'cf_index' and 'cf_distance'
+    """
+    coords = facility_coordinate_arrays(db)
+    site_lats = np.asarray(site_lats, dtype=float)
+    site_lons = np.asarray(site_lons, dtype=float)
+    tph_levels = np.asarray(tph_levels, dtype=float)
+    chloride_levels = np.asarray(chloride_levels, dtype=float)
+    n_sites = len(site_lats)
+    
+    landfill_index = np.full(n_sites, -1, dtype=np.int64)
+    landfill_distance = np.full(n_sites, np.nan)
+    cf_index = np.full(n_sites, -1, dtype=np.int64)
+    cf_distance = np.full(n_sites, np.nan)
+    
+    # Sites in the basin box mostly resolve from the nearest-facility raster;
+    # only the rest need a row of the distance matrix
+    from .facility_raster import get_facility_raster, raster_nearest_batch
+    raster = get_facility_raster(db)
+    
+    if len(coords['landfill_lat']):
+        landfill_index, landfill_distance = raster_nearest_batch(raster, db, site_lats, site_lons,
+                                                                 tph_levels, chloride_levels)
+        rest = np.flatnonzero(landfill_index < 0)
+        for start, stop, dist in iter_facility_distance_matrix(site_lats[rest], site_lons[rest], coords, 'landfills',
+                                                               chunk_size=chunk_size):
+            rows = rest[start:stop]
+            qualified = qualified_landfill_mask(tph_levels[rows], chloride_levels[rows], coords)
+            dist = np.where(qualified, dist, np.inf)
+            best = np.argmin(dist, axis=1)
+            best_dist = dist[np.arange(stop - start), best]
+            found = np.isfinite(best_dist)
+            landfill_index[rows] = np.where(found, best, -1)
+            landfill_distance[rows] = np.where(found, best_dist, np.nan)
+    
+    if len(coords['cf_lat']):
+        cf_index, cf_distance = raster_nearest_batch(raster, db, site_lats, site_lons)
+        rest = np.flatnonzero(cf_index < 0)
+        for start, stop, dist in iter_facility_distance_matrix(site_lats[rest], site_lons[rest], coords,
+                                                               'clean_futures_facilities', chunk_size=chunk_size):
+            best = np.argmin(dist, axis=1)
+            cf_index[rest[start:stop]] = best
+            cf_distance[rest[start:stop]] = dist[np.arange(stop - start), best]
+    
+    return {
+        'landfill_index': landfill_index,
+        'landfill_distance': landfill_distance,
+        'cf_index': cf_index,
+        'cf_distance': cf_distance
+    }
+
+def determine_state_county_batch(site_lats, site_lons, db, chunk_size=DISTANCE_MATRIX_CHUNK):
+    """Vectorized determine_state_county for many sites"""
+    site_lats = np.asarray(site_lats, dtype=float)
+    site_lons = np.asarray(site_lons, dtype=float)
+    states, counties = lookup_state_county_batch(site_lats, site_lons, get_county_raster())
+    
+    # Sites outside the raster fall back to the nearest-landfill county
+    missing = np.flatnonzero(counties == None)  # noqa: E711 - elementwise on object array
+    if not len(missing):
+        return states, counties
+    
+    states[missing] = np.where(site_lons[missing] > -103.0, "Texas", "New Mexico")
+    if not db['landfills']:
+        counties[missing] = [determine_state_county(site_lats[i], site_lons[i], db)[1] for i in missing]
+        return states, counties
+    
+    coords = facility_coordinate_arrays(db)
+    county_names = np.array([lf['county'] for lf in db['landfills']], dtype=object)
+    for start, stop, dist in iter_facility_distance_matrix(site_lats[missing], site_lons[missing], coords, 'landfills',
+                                                           chunk_size=chunk_size):
+        counties[missing[start:stop]] = county_names[np.argmin(dist, axis=1)]
+    
+    return states, counties
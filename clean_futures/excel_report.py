@@ -0,0 +1,215 @@
+"""
+Excel reports for the Clean Futures calculation core.
+"""
+
+from datetime import datetime
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from .geo import get_regulatory_thresholds
+
+# ============================================================================
+# EXCEL REPORTS
+# ============================================================================
+# Workbooks are written with openpyxl's write-only mode: rows stream to
+# temporary files as they are appended and are zipped up on save, so memory
+# stays flat however many sites a batch workbook holds. Write-only sheets
+# cannot be revisited, so every sheet is written top to bottom in one go
+# (sheets can still be appended to in any order).
+
+EXCEL_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Default column width (characters) for report sheets
+EXCEL_COLUMN_WIDTH = 18
+
+# Inputs sheet: (label, analysis field)
+_INPUT_FIELDS = (
+    ('Site Latitude', 'site_lat'),
+    ('Site Longitude', 'site_lon'),
+    ('Volume (CY)', 'volume_cy'),
+    ('TPH Level (mg/kg)', 'tph_level'),
+    ('Chloride Level (mg/kg)', 'chloride_level'),
+    ('Groundwater Depth', 'groundwater_depth'),
+    ('Needs Backfill', 'needs_backfill'),
+    ('Landfill Has Backfill', 'landfill_has_backfill'),
+    ('Extra Backfill Minutes', 'extra_backfill_minutes'),
+    ('Trucks', 'num_trucks'),
+    ('Equipment Capacity (CY/day)', 'equipment_capacity_per_day'),
+    ('Soil Permeability', 'soil_permeability')
+)
+
+# Analysis fields write_site_report reads
+SITE_REPORT_FIELDS = tuple(field for _, field in _INPUT_FIELDS) + ('priorities', 'advanced_params')
+
+# Options sheet: (header, result key); blank where an option has no such item
+_OPTION_COLUMNS = (
+    ('Total Cost ($)', 'total_cost'),
+    ('Cost per CY ($)', 'cost_per_cy'),
+    ('Project Days', 'project_days'),
+    ('CO2 (tons)', 'co2_tons'),
+    ('Equipment Cost ($)', 'equipment_cost'),
+    ('Trucking Cost ($)', 'trucking_cost'),
+    ('Disposal Cost ($)', 'disposal_cost'),
+    ('Backfill Cost ($)', 'backfill_cost'),
+    ('Processing Cost ($)', 'processing_cost'),
+    ('Mobilization Cost ($)', 'mobilization_cost'),
+    ('Amendment Cost ($)', 'amendment_cost'),
+    ('Distance (miles)', 'distance_miles'),
+    ('Average Speed (mph)', 'avg_speed_mph'),
+    ('Includes Backfill', 'includes_backfill')
+)
+
+# Bottleneck sheet columns for the trucking options
+_BOTTLENECK_COLUMNS = (
+    ('Bottleneck', 'bottleneck'),
+    ('Trucks', 'num_trucks'),
+    ('Trips', 'num_trips'),
+    ('Trip Time (hours)', 'trip_time_hours'),
+    ('Base Trip Time (hours)', 'base_trip_time_hours'),
+    ('Truck Capacity (CY/day)', 'truck_capacity_per_day'),
+    ('Equipment Capacity (CY/day)', 'equipment_capacity_per_day'),
+    ('Actual Daily Capacity (CY/day)', 'actual_daily_capacity'),
+    ('Extra Backfill Minutes', 'extra_backfill_minutes'),
+    ('Extra Backfill CO2 (tons)', 'extra_backfill_co2_tons')
+)
+
+# (state, groundwater depth category) pairs listed in batch workbooks
+_THRESHOLD_CASES = (
+    ('Texas', None),
+    ('New Mexico', '50_or_less'),
+    ('New Mexico', '51_to_100'),
+    ('New Mexico', 'over_100')
+)
+
+def _sheet(workbook, title, headers, width=EXCEL_COLUMN_WIDTH):
+    """Add a write-only sheet with a bold, frozen header row"""
+    sheet = workbook.create_sheet(title)
+    for i in range(len(headers)):
+        sheet.column_dimensions[get_column_letter(i + 1)].width = width
+    sheet.freeze_panes = 'A2'
+    cells = []
+    for header in headers:
+        cell = WriteOnlyCell(sheet, value=header)
+        cell.font = Font(bold=True)
+        cells.append(cell)
+    sheet.append(cells)
+    return sheet
+
+# Words of threshold keys shown in capitals or replaced in labels
+_THRESHOLD_LABEL_WORDS = {'tph': 'TPH', 'btex': 'BTEX', 'gro': 'GRO', 'dro': 'DRO', 'mgkg': '(mg/kg)'}
+
+def _threshold_label(key):
+    """Readable label for a get_regulatory_thresholds key (e.g. 'TPH threshold (mg/kg)')"""
+    words = [_THRESHOLD_LABEL_WORDS.get(word, word) for word in key.split('_')]
+    return ' '.join([words[0][:1].upper() + words[0][1:]] + words[1:])
+
+def _threshold_rows(thresholds):
+    """(label, value) rows for a get_regulatory_thresholds result"""
+    return [(_threshold_label(key), value) for key, value in thresholds.items()]
+
+# ============================================================================
+# SITE REPORT
+# ============================================================================
+
+def write_site_report(output, analysis, results, state, county, soil_type, thresholds):
+    """
+    Write the Excel report for one analyzed site.
+    
+    Sheets: Inputs, Options (one row per option with its cost breakdown),
+    Bottleneck (trucking options) and Regulatory Thresholds.
+    
+    Args:
+        output: File path or binary file object
+        analysis: Dictionary in the same shape as st.session_state.analysis
+        results: analyze_site result
+        state, county, soil_type: Location details
+        thresholds: get_regulatory_thresholds result
+    """
+    workbook = Workbook(write_only=True)
+    
+    inputs = _sheet(workbook, 'Inputs', ('Input', 'Value'), width=32)
+    rows = [('State', state), ('County', county), ('Soil Type', soil_type)]
+    rows += [(label, analysis.get(field)) for label, field in _INPUT_FIELDS]
+    rows += [(f"{priority.capitalize()} Priority", level) for priority, level in analysis['priorities'].items()]
+    rows += [(f"Advanced: {key}", value) for key, value in (analysis['advanced_params'] or {}).items()]
+    for row in rows:
+        inputs.append(row)
+    
+    options = _sheet(workbook, 'Options', ('Option', 'Facility', 'Recommended', 'Score') +
+                     tuple(header for header, _ in _OPTION_COLUMNS))
+    bottleneck = _sheet(workbook, 'Bottleneck', ('Option',) + tuple(header for header, _ in _BOTTLENECK_COLUMNS))
+    for opt_type in ('dig_haul', 'onsite', 'surface'):
+        opt = results[opt_type]
+        if not opt:
+            continue
+        facility = opt.get('landfill_name') or opt.get('facility_name') or 'Your site'
+        options.append([opt['option_name'], facility, opt_type == results['recommended'],
+                        results['scores'].get(opt_type)] + [opt.get(key) for _, key in _OPTION_COLUMNS])
+        if 'bottleneck' in opt:
+            bottleneck.append([opt['option_name']] + [opt.get(key) for _, key in _BOTTLENECK_COLUMNS])
+    
+    regulatory = _sheet(workbook, 'Regulatory Thresholds', ('Threshold', 'Value'), width=40)
+    for row in _threshold_rows(thresholds):
+        regulatory.append(row)
+    
+    workbook.save(output)
+
+# ============================================================================
+# BATCH WORKBOOK
+# ============================================================================
+
+def open_batch_workbook(columns):
+    """
+    Start a streaming batch workbook.
+    
+    Sites are added with write_batch_row as they are scored and the file is
+    written by close_batch_workbook.
+    
+    Returns:
+        Dictionary holding the workbook and its sheets
+    """
+    workbook = Workbook(write_only=True)
+    # Created first so it is the first tab; filled in when the run ends
+    summary = workbook.create_sheet('Summary')
+    summary.column_dimensions['A'].width = 28
+    summary.column_dimensions['B'].width = 40
+    return {
+        'workbook': workbook,
+        'summary': summary,
+        'sites': _sheet(workbook, 'Sites', columns),
+        'columns': list(columns)
+    }
+
+def write_batch_row(book, row):
+    """Append one batch output row (a dict keyed by column) to the Sites sheet"""
+    book['sites'].append([row.get(column) for column in book['columns']])
+
+def close_batch_workbook(book, output, processed, errors, simulate=False, source=None):
+    """
+    Finish a batch workbook: the Summary and Regulatory Thresholds sheets, then save.
+    
+    Args:
+        book: open_batch_workbook result
+        output: File path or binary file object
+        processed, errors: Row counts from the run
+        simulate: Whether the truck-cycle simulation columns were written
+        source: Name of the input file, if known
+    """
+    for row in (('Input File', source or ''),
+                ('Sites Processed', processed),
+                ('Sites With Errors', errors),
+                ('Truck Cycle Simulation', 'Yes' if simulate else 'No'),
+                ('Generated', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))):
+        book['summary'].append(row)
+    
+    cases = [get_regulatory_thresholds(state, depth) for state, depth in _THRESHOLD_CASES]
+    keys = list(dict.fromkeys(key for thresholds in cases for key in thresholds))
+    regulatory = _sheet(book['workbook'], 'Regulatory Thresholds',
+                        ('State',) + tuple(label for label, _ in _threshold_rows(dict.fromkeys(keys))))
+    for (state, _), thresholds in zip(_THRESHOLD_CASES, cases):
+        regulatory.append([state] + [thresholds.get(key) for key in keys])
+    
+    book['workbook'].save(output)
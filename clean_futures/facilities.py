@@ -0,0 +1,566 @@
+"""
+Facilities database for the Clean Futures calculation core.
+
+Loads the editable facilities file, serves it as a shared read-only
+snapshot with hot reload, and caches structures derived from it.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# FACILITIES DATABASE
+# ============================================================================
+
+# Data files ship next to the Streamlit app, one level above this package
+DATA_DIR = Path(__file__).resolve().parent.parent
+
+# Editable facilities file; CLEAN_FUTURES_FACILITIES_DB overrides the location
+FACILITIES_DB_FILENAME = "permian_facilities_db.json"
+
+# Fields every record must have for lookups and costing to work
+REQUIRED_FACILITY_FIELDS = {
+    'landfills': ('id', 'company', 'site_name', 'county', 'latitude', 'longitude',
+                  'tph_max_mgkg', 'chloride_max_mgkg', 'disposal_cost_cy', 'backfill_available',
+                  'backfill_cost_cy'),
+    'clean_futures_facilities': ('id', 'facility_name', 'latitude', 'longitude', 'processing_cost_cy',
+                                 'backfill_cost_cy')
+}
+
+def facilities_db_path():
+    """Return the path of the editable facilities database file"""
+    override = os.environ.get('CLEAN_FUTURES_FACILITIES_DB')
+    if override:
+        return Path(override)
+    return DATA_DIR / FACILITIES_DB_FILENAME
+
+def facilities_cache_tag():
+    """Short digest of the facilities file path, so each file keeps its own cache files"""
+    source = str(facilities_db_path().resolve())
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]
+
+def load_facilities_database(path=None):
+    """
+    Load the facilities database from the JSON file.
+    
+    Falls back to the embedded defaults when the file does not exist, so the
+    app still deploys without it. Raises ValueError if the file is malformed.
+    """
+    path = Path(path) if path else facilities_db_path()
+    if not path.exists():
+        return default_facilities_database()
+    
+    with open(path, encoding='utf-8') as f:
+        try:
+            db = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path.name}: invalid JSON ({e})") from e
+    
+    for kind, fields in REQUIRED_FACILITY_FIELDS.items():
+        if not isinstance(db.get(kind), list):
+            raise ValueError(f"{path.name}: missing '{kind}' list")
+        for record in db[kind]:
+            missing = [field for field in fields if field not in record]
+            if missing:
+                raise ValueError(f"{path.name}: {record.get('id', '?')} is missing {', '.join(missing)}")
+    
+    return db
+
+def default_facilities_database():
+    """Return the facilities database (embedded in code for reliable deployment)"""
+    return {
+        "landfills": [
+            {
+                "id": "LF001",
+                "company": "MILESTONE",
+                "site_name": "UPTON",
+                "county": "GLASSCOCK",
+                "latitude": 31.499316,
+                "longitude": -101.931524,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": True,
+                "backfill_cost_cy": 10
+            },
+            {
+                "id": "LF002",
+                "company": "MILESTONE",
+                "site_name": "STANTON LANDFILL",
+                "county": "HOWARD",
+                "latitude": 31.981708,
+                "longitude": -101.771822,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": False,
+                "backfill_cost_cy": 0
+            },
+            {
+                "id": "LF003",
+                "company": "R360",
+                "site_name": "WISHBONE",
+                "county": "HOWARD",
+                "latitude": 32.201328,
+                "longitude": -101.737306,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": True,
+                "backfill_cost_cy": 10
+            },
+            {
+                "id": "LF004",
+                "company": "REPUBLIC",
+                "site_name": "SOUTH ODESSA",
+                "county": "MIDLAND",
+                "latitude": 31.77227,
+                "longitude": -102.542218,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": False,
+                "backfill_cost_cy": 0
+            },
+            {
+                "id": "LF005",
+                "company": "US ECOLOGY",
+                "site_name": "REAGAN",
+                "county": "GLASSCOCK",
+                "latitude": 31.418575,
+                "longitude": -101.691314,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": True,
+                "backfill_cost_cy": 10
+            },
+            {
+                "id": "LF006",
+                "company": "WM",
+                "site_name": "BIG LAKE",
+                "county": "GLASSCOCK",
+                "latitude": 31.344978,
+                "longitude": -101.502558,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": False,
+                "backfill_cost_cy": 0
+            },
+            {
+                "id": "LF007",
+                "company": "WM",
+                "site_name": "HOWARD",
+                "county": "HOWARD",
+                "latitude": 32.175082,
+                "longitude": -101.665695,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": False,
+                "backfill_cost_cy": 0
+            },
+            {
+                "id": "LF008",
+                "company": "MILESTONE",
+                "site_name": "ORLA EWF",
+                "county": "LOVING",
+                "latitude": 31.865379,
+                "longitude": -103.847547,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": True,
+                "backfill_cost_cy": 10
+            },
+            {
+                "id": "LF009",
+                "company": "R360",
+                "site_name": "RED BLUFF",
+                "county": "CULBERSON",
+                "latitude": 31.9861,
+                "longitude": -104.021569,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": False,
+                "backfill_cost_cy": 0
+            },
+            {
+                "id": "LF010",
+                "company": "WM",
+                "site_name": "ORLA LANDFILL",
+                "county": "LOVING",
+                "latitude": 31.824627,
+                "longitude": -103.910185,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": False,
+                "backfill_cost_cy": 0
+            },
+            {
+                "id": "LF011",
+                "company": "WM",
+                "site_name": "DEEP SIX",
+                "county": "REEVES",
+                "latitude": 31.286899,
+                "longitude": -103.392814,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": False,
+                "backfill_cost_cy": 0
+            },
+            {
+                "id": "LF012",
+                "company": "REPUBLIC",
+                "site_name": "REEVES",
+                "county": "REEVES",
+                "latitude": 31.654254,
+                "longitude": -103.637612,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": True,
+                "backfill_cost_cy": 10
+            },
+            {
+                "id": "LF013",
+                "company": "DESERT ENVIRONMENTAL",
+                "site_name": "DRF MENTONE",
+                "county": "LOVING",
+                "latitude": 31.960808,
+                "longitude": -103.75866,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": True,
+                "backfill_cost_cy": 10
+            },
+            {
+                "id": "LF014",
+                "company": "US ECOLOGY",
+                "site_name": "PECOS",
+                "county": "REEVES",
+                "latitude": 31.320076,
+                "longitude": -103.621133,
+                "accepts_tph": True,
+                "tph_max_mgkg": 5000,
+                "accepts_chloride": True,
+                "chloride_max_mgkg": 10000,
+                "disposal_cost_cy": 25,
+                "backfill_available": False,
+                "backfill_cost_cy": 0
+            }
+        ],
+        "clean_futures_facilities": [
+            {
+                "id": "CF001",
+                "facility_name": "Clean Futures Facility 1",
+                "region": "Delaware Basin",
+                "latitude": 31.9195,
+                "longitude": -103.6285,
+                "processing_cost_cy": 25,
+                "includes_backfill": True,
+                "backfill_cost_cy": 0,
+                "typical_turnaround_days": 30,
+                "notes": "Treated soil returned to site"
+            },
+            {
+                "id": "CF002",
+                "facility_name": "Clean Futures Facility 2",
+                "region": "Midland Basin",
+                "latitude": 32.1022,
+                "longitude": -102.4654,
+                "processing_cost_cy": 25,
+                "includes_backfill": True,
+                "backfill_cost_cy": 0,
+                "typical_turnaround_days": 30,
+                "notes": "Treated soil returned to site"
+            },
+            {
+                "id": "CF003",
+                "facility_name": "Clean Futures Facility 3",
+                "region": "Central Basin",
+                "latitude": 31.3458,
+                "longitude": -101.7301,
+                "processing_cost_cy": 25,
+                "includes_backfill": True,
+                "backfill_cost_cy": 0,
+                "typical_turnaround_days": 30,
+                "notes": "Treated soil returned to site"
+            },
+            {
+                "id": "CF004",
+                "facility_name": "Clean Futures Facility 4",
+                "region": "Eastern Basin",
+                "latitude": 32.3109,
+                "longitude": -101.8421,
+                "processing_cost_cy": 25,
+                "includes_backfill": True,
+                "backfill_cost_cy": 0,
+                "typical_turnaround_days": 30,
+                "notes": "Treated soil returned to site"
+            }
+        ]
+    }
+
+# ============================================================================
+# SHARED FACILITIES SNAPSHOT
+# ============================================================================
+# The facilities database is built once per process and shared by every
+# session as a read-only snapshot. Structures derived from it (spatial and
+# acceptance indexes, coordinate arrays) are built on first use and stored
+# alongside the snapshot, so all sessions share them too.
+#
+# The facilities file is watched by mtime. When it changes, the next caller
+# loads it and swaps in a new snapshot; derived structures whose inputs did
+# not change are carried over. Other sessions keep using the current snapshot
+# while the reload runs, so nobody waits on it.
+#
+# Each derived structure is built under its own lock, so a slow build (the
+# road trees) never holds up the first use of another structure. Plain dict
+# databases are not modified; their derived structures live in a small side
+# cache keyed by the dict's identity. Hashing the contents on every lookup
+# would cost more than most lookups, so a plain dict must not be changed in
+# place once it has been used: pass a new dict (or a new frozen snapshot)
+# after editing records, or its derived structures will be stale.
+
+# Guards the build-lock table and the plain-dict side cache
+_DERIVED_LOCK = threading.RLock()
+
+# (id of a derived cache, key) -> lock held while that structure is built
+_BUILD_LOCKS = {}
+
+# id(plain dict db) -> (db, derived cache), most recent last
+_PLAIN_DERIVED = OrderedDict()
+
+# Plain dict databases whose derived structures are kept
+PLAIN_DERIVED_CACHE_SIZE = 4
+
+# Acceptance limits stored per spatial index (checked as facility[key] >= required)
+SPATIAL_INDEX_LIMIT_KEYS = {
+    'landfills': ('tph_max_mgkg', 'chloride_max_mgkg'),
+    'clean_futures_facilities': ()
+}
+
+# Numeric columns of the facility arrays: array name -> (record list, record field)
+FACILITY_ARRAY_FIELDS = {
+    'landfill_lat': ('landfills', 'latitude'),
+    'landfill_lon': ('landfills', 'longitude'),
+    'landfill_tph_max': ('landfills', 'tph_max_mgkg'),
+    'landfill_chloride_max': ('landfills', 'chloride_max_mgkg'),
+    'landfill_disposal_cost': ('landfills', 'disposal_cost_cy'),
+    'landfill_backfill_cost': ('landfills', 'backfill_cost_cy'),
+    'landfill_backfill_available': ('landfills', 'backfill_available'),
+    'cf_lat': ('clean_futures_facilities', 'latitude'),
+    'cf_lon': ('clean_futures_facilities', 'longitude'),
+    'cf_processing_cost': ('clean_futures_facilities', 'processing_cost_cy'),
+    'cf_backfill_cost': ('clean_futures_facilities', 'backfill_cost_cy')
+}
+
+# Facility array columns stored with a dtype other than float64
+FACILITY_ARRAY_DTYPES = {'landfill_backfill_available': bool}
+
+# Column name prefix of each record list in the facility arrays
+FACILITY_ARRAY_PREFIXES = {'landfills': 'landfill', 'clean_futures_facilities': 'cf'}
+
+# Process-wide holder for the current snapshot and the mtime it was loaded at
+_STORE = {'current': (None, None), 'reload_lock': threading.Lock()}
+
+def freeze_facilities_database(db):
+    """
+    Return a read-only snapshot of a facilities database.
+    
+    Records become read-only mappings and record lists become tuples, so a
+    snapshot can be shared safely between sessions and threads.
+    """
+    return MappingProxyType({
+        'landfills': tuple(MappingProxyType(dict(lf)) for lf in db['landfills']),
+        'clean_futures_facilities': tuple(MappingProxyType(dict(cf)) for cf in db['clean_futures_facilities']),
+        '_derived': {}
+    })
+
+def _facility_geometry(records, limit_keys=()):
+    """Coordinates and acceptance limits of a record list (what indexes depend on)"""
+    return tuple((r['latitude'], r['longitude']) + tuple(r[k] for k in limit_keys) for r in records)
+
+def _carry_over_derived(key, value, old, new):
+    """
+    Reuse a derived structure from the old snapshot in the new one.
+    
+    Returns the structure to store in the new snapshot, or None when it has
+    to be rebuilt.
+    """
+    if isinstance(key, tuple) and key[0] == 'spatial_index':
+        kind = key[1]
+        limit_keys = SPATIAL_INDEX_LIMIT_KEYS[kind]
+        if _facility_geometry(old[kind], limit_keys) == _facility_geometry(new[kind], limit_keys):
+            # Same tree shape; only point it at the new records (e.g. a rate changed)
+            return dict(value, facilities=new[kind])
+        return None
+    
+    if key == 'coordinate_arrays':
+        same = all(
+            [r[field] for r in old[kind]] == [r[field] for r in new[kind]]
+            for kind, field in FACILITY_ARRAY_FIELDS.values()
+        )
+        return value if same else None
+    
+    if key == 'acceptance_index':
+        limit_keys = SPATIAL_INDEX_LIMIT_KEYS['landfills']
+        if _facility_geometry(old['landfills'], limit_keys) != _facility_geometry(new['landfills'], limit_keys):
+            return None
+        # Same classes and trees; rebind each class to the new records
+        classes = {
+            class_key: dict(class_index, facilities=[new['landfills'][i] for i in class_index['positions']])
+            for class_key, class_index in list(value['classes'].items())
+        }
+        return dict(value, landfills=new['landfills'], classes=classes)
+    
+    if isinstance(key, tuple) and key[0] == 'road_trees':
+        # Trees depend only on where the facilities are
+        same = all(_facility_geometry(old[kind]) == _facility_geometry(new[kind])
+                   for kind in ('landfills', 'clean_futures_facilities'))
+        return value if same else None
+    
+    # Anything else is only reused when no facility record changed at all
+    same = (old['landfills'] == new['landfills'] and
+            old['clean_futures_facilities'] == new['clean_futures_facilities'])
+    return value if same else None
+
+def rebuild_facilities_snapshot(old, db):
+    """Freeze db into a new snapshot, carrying over unaffected derived structures"""
+    new = freeze_facilities_database(db)
+    if old is not None:
+        with _DERIVED_LOCK:
+            derived = dict(old['_derived'])
+        for key, value in derived.items():
+            carried = _carry_over_derived(key, value, old, new)
+            if carried is not None:
+                new['_derived'][key] = carried
+    return new
+
+def _file_mtime(path):
+    """Return a file's modification time, or None if it does not exist"""
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+def get_facilities_database():
+    """
+    Return the process-wide facilities snapshot.
+    
+    Reloads the facilities file when its mtime changes. The new snapshot is
+    published with a single assignment, so callers see either the old or
+    the new one, never a mix. A file that fails to load is logged and the
+    previous snapshot stays in service.
+    """
+    store = _STORE
+    path = facilities_db_path()
+    mtime = _file_mtime(path)
+    snapshot, loaded_mtime = store['current']
+    if snapshot is not None and mtime == loaded_mtime:
+        return snapshot
+    
+    # Only one caller reloads; the others keep serving the current snapshot
+    if not store['reload_lock'].acquire(blocking=snapshot is None):
+        return snapshot
+    try:
+        snapshot, loaded_mtime = store['current']
+        if snapshot is not None and mtime == loaded_mtime:
+            return snapshot
+        try:
+            db = load_facilities_database(path)
+        except (OSError, ValueError) as e:
+            if snapshot is None:
+                raise
+            logger.warning("Keeping previous facilities data; reload failed: %s", e)
+            store['current'] = (snapshot, mtime)
+            return snapshot
+        snapshot = rebuild_facilities_snapshot(snapshot, db)
+        store['current'] = (snapshot, mtime)
+        return snapshot
+    finally:
+        store['reload_lock'].release()
+
+def _derived_cache(db):
+    """The derived-structure cache of a snapshot, or the side cache of a plain dict"""
+    derived = db.get('_derived')
+    if derived is not None:
+        return derived
+    with _DERIVED_LOCK:
+        # The entry holds db itself, so its id cannot be reused while cached
+        entry = _PLAIN_DERIVED.get(id(db))
+        if entry is None or entry[0] is not db:
+            entry = _PLAIN_DERIVED[id(db)] = (db, {})
+            while len(_PLAIN_DERIVED) > PLAIN_DERIVED_CACHE_SIZE:
+                _PLAIN_DERIVED.popitem(last=False)
+        else:
+            _PLAIN_DERIVED.move_to_end(id(db))
+        return entry[1]
+
+def get_derived(db, key, build):
+    """
+    Return a structure derived from db, building it once on first use.
+    
+    Concurrent first callers for the same key wait for one build; builds of
+    other keys go ahead in parallel. Structures are cached per db object, so
+    a plain dict db must not be modified after its first use (see above).
+    """
+    derived = _derived_cache(db)
+    value = derived.get(key)
+    if value is not None:
+        return value
+    
+    lock_key = (id(derived), key)
+    with _DERIVED_LOCK:
+        lock = _BUILD_LOCKS.setdefault(lock_key, threading.Lock())
+    try:
+        with lock:
+            value = derived.get(key)
+            if value is None:
+                value = build()
+                derived[key] = value
+    finally:
+        with _DERIVED_LOCK:
+            if _BUILD_LOCKS.get(lock_key) is lock:
+                del _BUILD_LOCKS[lock_key]
+    return value
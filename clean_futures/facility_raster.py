@@ -0,0 +1,290 @@
+"""
+Precomputed nearest-facility raster for the Clean Futures calculation core.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from .counties import COUNTY_RASTER_LAT_RANGE, COUNTY_RASTER_LON_RANGE
+from .distance_matrix import (facility_coordinate_arrays, facility_distance_pairs, haversine_distance_pairs,
+                              iter_facility_distance_matrix)
+from .facilities import DATA_DIR, SPATIAL_INDEX_LIMIT_KEYS, facilities_cache_tag, get_derived
+from .geo import acceptance_class, get_acceptance_index, haversine_distance
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# NEAREST-FACILITY RASTER
+# ============================================================================
+# Nearly every quote falls in the basin box the questionnaires accept, so the
+# nearest-facility answer is precomputed on a grid over that box: one layer
+# per distinct set of qualifying landfills (acceptance class) plus one for
+# CF facilities. Each cell holds up to two candidates, one of which is the
+# nearest facility for every point in the cell. A lookup is a cell index and
+# an exact haversine_distance recheck against the candidates.
+#
+# Within a cell no point is further than the cell radius r from the center.
+# If the runner-up at the center is more than 2r further than the nearest,
+# the nearest wins everywhere in the cell and is stored alone. Otherwise, if
+# the third facility is more than 2r further than the nearest, one of the
+# first two wins and both are stored. Cells where three or more facilities
+# meet hold -1 and fall back to the spatial index, so results are identical
+# to a full search (ties included).
+#
+# The raster is written as a memory-mapped .npy next to the app, named by a
+# digest of the facilities file path and of the facility positions and
+# acceptance limits. A facilities file change that moves a facility or
+# changes a limit produces a new digest, so the raster is rebuilt on first
+# use with the new data. Worker pools build it in the parent first, so the
+# workers only map the finished file.
+
+FACILITY_RASTER_CELL_DEG = 0.01
+FACILITY_RASTER_PREFIX = "permian_facility_raster"
+
+# Permissions of the cached raster file
+FACILITY_RASTER_FILE_MODE = 0o644
+
+# Cell value for "no candidate; use the spatial index"
+FACILITY_RASTER_UNRESOLVED = -1
+
+def _raster_layers(db):
+    """
+    Map every acceptance class to a raster layer.
+    
+    Returns:
+        Tuple of (class_layers, layer_positions): class key -> layer for
+        classes with qualifying landfills, and the landfill positions of each
+        landfill layer. The CF facility layer comes after the landfill layers.
+    """
+    acceptance_index = get_acceptance_index(db)
+    landfills = db['landfills']
+    class_layers, layer_positions, seen = {}, [], {}
+    for tph_class, tph_limit in enumerate(acceptance_index['tph_limits']):
+        for chloride_class, chloride_limit in enumerate(acceptance_index['chloride_limits']):
+            positions = tuple(i for i, lf in enumerate(landfills)
+                              if lf['tph_max_mgkg'] >= tph_limit and lf['chloride_max_mgkg'] >= chloride_limit)
+            if not positions:
+                continue
+            if positions not in seen:
+                seen[positions] = len(layer_positions)
+                layer_positions.append(positions)
+            class_layers[(tph_class, chloride_class)] = seen[positions]
+    return class_layers, layer_positions
+
+def _grid_shape():
+    """Rows and columns of the raster over the basin box"""
+    lat_min, lat_max = COUNTY_RASTER_LAT_RANGE
+    lon_min, lon_max = COUNTY_RASTER_LON_RANGE
+    return (int(round((lat_max - lat_min) / FACILITY_RASTER_CELL_DEG)),
+            int(round((lon_max - lon_min) / FACILITY_RASTER_CELL_DEG)))
+
+def _nearest_per_cell(center_lats, center_lons, cell_radius, coords, kind, positions=None):
+    """
+    Candidate pair per cell center (see the section notes).
+    
+    Returns:
+        int16 array of shape (n_cells, 2): (nearest, -1) when one facility is
+        nearest throughout the cell, (nearest, runner-up) when one of those
+        two is, and (-1, -1) otherwise
+    """
+    candidates = np.full((len(center_lats), 2), FACILITY_RASTER_UNRESOLVED, dtype=np.int16)
+    for start, stop, dist in iter_facility_distance_matrix(center_lats, center_lons, coords, kind, positions):
+        if not dist.shape[1]:
+            break
+        order = np.argsort(dist, axis=1, kind='stable')[:, :3]
+        ranked = np.take_along_axis(dist, order, axis=1)
+        reach = 2 * cell_radius[start:stop]
+        block = candidates[start:stop]
+        if dist.shape[1] == 1:
+            block[:, 0] = order[:, 0]
+            continue
+        single = ranked[:, 1] - ranked[:, 0] > reach
+        pair = ~single if dist.shape[1] == 2 else ~single & (ranked[:, 2] - ranked[:, 0] > reach)
+        block[single | pair, 0] = order[single | pair, 0]
+        block[pair, 1] = order[pair, 1]
+    return candidates
+
+def build_facility_raster(db):
+    """
+    Compute the nearest-facility raster for db.
+    
+    Returns:
+        int16 array of shape (n_layers, n_rows, n_cols, 2) holding candidate
+        landfill or CF facility positions (-1 where absent)
+    """
+    coords = facility_coordinate_arrays(db)
+    _, layer_positions = _raster_layers(db)
+    n_rows, n_cols = _grid_shape()
+    lat_min, lon_min = COUNTY_RASTER_LAT_RANGE[0], COUNTY_RASTER_LON_RANGE[0]
+    cell = FACILITY_RASTER_CELL_DEG
+    
+    row_lats = lat_min + (np.arange(n_rows) + 0.5) * cell
+    col_lons = lon_min + (np.arange(n_cols) + 0.5) * cell
+    center_lats = np.repeat(row_lats, n_cols)
+    center_lons = np.tile(col_lons, n_rows)
+    # Furthest any point of a cell can be from its center (the corners nearer the equator)
+    corner = haversine_distance_pairs(row_lats, col_lons[0], row_lats - cell / 2, col_lons[0] + cell / 2)
+    cell_radius = np.repeat(corner * 1.001, n_cols)
+    
+    raster = np.empty((len(layer_positions) + 1, n_rows, n_cols, 2), dtype=np.int16)
+    for layer, positions in enumerate(layer_positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        candidates = _nearest_per_cell(center_lats, center_lons, cell_radius, coords, 'landfills', positions)
+        present = candidates >= 0
+        candidates[present] = positions[candidates[present]]
+        raster[layer] = candidates.reshape(n_rows, n_cols, 2)
+    raster[-1] = _nearest_per_cell(center_lats, center_lons, cell_radius, coords,
+                                   'clean_futures_facilities').reshape(n_rows, n_cols, 2)
+    return raster
+
+def _raster_cache_path(db):
+    """Raster file for these facility positions and limits, under the current facilities file"""
+    key = repr((FACILITY_RASTER_CELL_DEG, COUNTY_RASTER_LAT_RANGE, COUNTY_RASTER_LON_RANGE, [
+        [(r['latitude'], r['longitude']) + tuple(r[k] for k in SPATIAL_INDEX_LIMIT_KEYS[kind]) for r in db[kind]]
+        for kind in ('landfills', 'clean_futures_facilities')
+    ]))
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return DATA_DIR / f"{FACILITY_RASTER_PREFIX}-{facilities_cache_tag()}-{digest}.npy"
+
+def _load_or_build_raster(db):
+    """Memory-map the cached raster, or build it and write the cache"""
+    class_layers, layer_positions = _raster_layers(db)
+    cache = _raster_cache_path(db)
+    try:
+        # Plain ndarray view of the mapping; indexing a np.memmap is slower
+        grid = np.asarray(np.load(cache, mmap_mode='r'))
+        if grid.dtype == np.int16 and grid.shape == (len(layer_positions) + 1,) + _grid_shape() + (2,):
+            return {'grid': grid, 'class_layers': class_layers}
+    except (OSError, ValueError):
+        pass
+    
+    logger.info("Building nearest-facility raster %s", cache.name)
+    grid = build_facility_raster(db)
+    grid.setflags(write=False)
+    # Each builder writes its own temp file, so concurrent builds never share one
+    partial = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=cache.parent, prefix=f"{cache.stem}-", suffix='.tmp',
+                                         delete=False) as f:
+            partial = f.name
+            np.save(f, grid)
+        # NamedTemporaryFile creates the file 0600; other users' processes map the cache too
+        os.chmod(partial, FACILITY_RASTER_FILE_MODE)
+        os.replace(partial, cache)
+    except OSError as e:
+        logger.warning("Nearest-facility raster could not be cached (%s); keeping it in memory", e)
+        if partial is not None:
+            try:
+                os.unlink(partial)
+            except OSError:
+                pass
+        return {'grid': grid, 'class_layers': class_layers}
+    
+    # Rasters for earlier data of this facilities file are no longer needed;
+    # other facilities files (CLEAN_FUTURES_FACILITIES_DB) keep theirs
+    for stale in cache.parent.glob(f"{FACILITY_RASTER_PREFIX}-{facilities_cache_tag()}-*.npy"):
+        if stale != cache:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+    return {'grid': grid, 'class_layers': class_layers}
+
+def get_facility_raster(db):
+    """Return the nearest-facility raster for db, built or loaded once per snapshot"""
+    return get_derived(db, 'facility_raster', lambda: _load_or_build_raster(db))
+
+def _cell(lat, lon):
+    """(row, col) of a point, or None outside the basin box"""
+    lat_min, lat_max = COUNTY_RASTER_LAT_RANGE
+    lon_min, lon_max = COUNTY_RASTER_LON_RANGE
+    if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
+        return None
+    n_rows, n_cols = _grid_shape()
+    return (min(int((lat - lat_min) / FACILITY_RASTER_CELL_DEG), n_rows - 1),
+            min(int((lon - lon_min) / FACILITY_RASTER_CELL_DEG), n_cols - 1))
+
+def _recheck(raster, layer, cell, records, lat, lon):
+    """Exact distance check of a cell's candidates; (position, miles) or (-1, None)"""
+    if cell is None:
+        return FACILITY_RASTER_UNRESOLVED, None
+    first, second = raster['grid'][layer, cell[0], cell[1]].tolist()
+    if first < 0:
+        return FACILITY_RASTER_UNRESOLVED, None
+    best = (haversine_distance(lat, lon, records[first]['latitude'], records[first]['longitude']), first)
+    if second >= 0:
+        # Equal distances go to the facility listed first, as in the full search
+        best = min(best, (haversine_distance(lat, lon, records[second]['latitude'], records[second]['longitude']),
+                          second))
+    return best[1], best[0]
+
+def raster_nearest_landfill(raster, db, lat, lon, tph_level, chloride_level):
+    """
+    Nearest qualified landfill from the raster.
+    
+    Returns:
+        Tuple of (landfill position, distance_miles), or (-1, None) when the
+        raster cannot tell and the spatial index has to be searched
+    """
+    layer = raster['class_layers'].get(acceptance_class(get_acceptance_index(db), tph_level, chloride_level))
+    if layer is None:
+        return FACILITY_RASTER_UNRESOLVED, None
+    return _recheck(raster, layer, _cell(lat, lon), db['landfills'], lat, lon)
+
+def raster_nearest_cf_facility(raster, db, lat, lon):
+    """Nearest CF facility from the raster, as for raster_nearest_landfill"""
+    return _recheck(raster, -1, _cell(lat, lon), db['clean_futures_facilities'], lat, lon)
+
+def raster_nearest_batch(raster, db, lats, lons, tph_levels=None, chloride_levels=None):
+    """
+    Vectorized raster lookup for many sites.
+    
+    With contamination levels, looks up the nearest qualified landfill;
+    without, the nearest CF facility.
+    
+    Returns:
+        Tuple of (positions, distances): int64 facility positions (-1 where
+        the raster cannot tell) and haversine miles (nan there)
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    lat_min, lat_max = COUNTY_RASTER_LAT_RANGE
+    lon_min, lon_max = COUNTY_RASTER_LON_RANGE
+    n_rows, n_cols = _grid_shape()
+    inside = (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+    rows = np.clip(((lats - lat_min) / FACILITY_RASTER_CELL_DEG).astype(np.int64), 0, n_rows - 1)
+    cols = np.clip(((lons - lon_min) / FACILITY_RASTER_CELL_DEG).astype(np.int64), 0, n_cols - 1)
+    
+    coords = facility_coordinate_arrays(db)
+    if tph_levels is None:
+        layers = np.full(len(lats), raster['grid'].shape[0] - 1)
+        kind = 'clean_futures_facilities'
+    else:
+        acceptance_index = get_acceptance_index(db)
+        layers = np.array([
+            raster['class_layers'].get(acceptance_class(acceptance_index, tph, chloride), -1)
+            for tph, chloride in zip(tph_levels, chloride_levels)
+        ], dtype=np.int64)
+        inside &= layers >= 0
+        kind = 'landfills'
+    
+    candidates = raster['grid'][np.where(inside, layers, 0), rows, cols].astype(np.int64)
+    candidates[~inside] = FACILITY_RASTER_UNRESOLVED
+    positions = candidates[:, 0].copy()
+    distances = np.full(len(lats), np.nan)
+    
+    found = np.flatnonzero(positions >= 0)
+    distances[found] = facility_distance_pairs(lats[found], lons[found], coords, kind, positions[found])
+    paired = found[candidates[found, 1] >= 0]
+    second = candidates[paired, 1]
+    second_distances = facility_distance_pairs(lats[paired], lons[paired], coords, kind, second)
+    # Equal distances go to the facility listed first, as in the full search
+    closer = ((second_distances < distances[paired]) |
+              ((second_distances == distances[paired]) & (second < positions[paired])))
+    positions[paired[closer]] = second[closer]
+    distances[paired[closer]] = second_distances[closer]
+    return positions, distances
@@ -0,0 +1,181 @@
+"""
+Fleet-size and equipment optimizer for the Clean Futures calculation core.
+"""
+
+import numpy as np
+
+from .facilities import get_facilities_database
+from .geo import find_nearest_cf_facility, find_nearest_qualified_landfill, travel_speed_mph
+from .vectorized import (calculate_dig_and_haul_vectorized, calculate_surface_facility_vectorized,
+                         resolve_calculator_inputs)
+
+# ============================================================================
+# FLEET OPTIMIZER
+# ============================================================================
+# The bottleneck analysis answers "how long and how much" for one fleet.
+# Here every combination of truck count, excavator count/size and loader
+# count/size is evaluated in one vectorized call per option, then the
+# cheapest configuration that finishes by the deadline is picked and the
+# cost-versus-days frontier is traced.
+#
+# Unlike the single-fleet calculators, which charge one excavator and one
+# loader however many are specified, equipment cost here scales with the
+# number of machines (count x hourly rate), otherwise adding machines would
+# always look free. A 1-excavator/1-loader configuration matches
+# calculate_dig_and_haul / calculate_surface_facility exactly.
+
+# Largest truck count swept by default
+FLEET_MAX_TRUCKS = 20
+
+# Largest excavator and loader counts swept by default
+FLEET_MAX_EXCAVATORS = 3
+FLEET_MAX_LOADERS = 3
+
+# Machine size classes: (capacity CY/hr, hourly rate $). The middle classes are
+# the Advanced Mode defaults; replace these with your own quotes as needed.
+FLEET_EXCAVATOR_CLASSES = ((30, 125), (40, 150), (55, 190))
+FLEET_LOADER_CLASSES = ((25, 105), (35, 125), (45, 150))
+
+def _fleet_grid(max_trucks, max_excavators, max_loaders, excavator_classes, loader_classes):
+    """Flattened arrays describing every fleet configuration in the sweep"""
+    excavator_classes = np.asarray(excavator_classes, dtype=float).reshape(-1, 2)
+    loader_classes = np.asarray(loader_classes, dtype=float).reshape(-1, 2)
+    trucks, excavators, excavator_class, loaders, loader_class = (
+        axis.ravel() for axis in np.meshgrid(
+            np.arange(1, max_trucks + 1), np.arange(1, max_excavators + 1), np.arange(len(excavator_classes)),
+            np.arange(1, max_loaders + 1), np.arange(len(loader_classes)), indexing='ij'
+        )
+    )
+    return {
+        'num_trucks': trucks,
+        'num_excavators': excavators,
+        'excavator_capacity_cy_hr': excavator_classes[excavator_class, 0],
+        'excavator_rate': excavator_classes[excavator_class, 1],
+        'num_loaders': loaders,
+        'loader_capacity_cy_hr': loader_classes[loader_class, 0],
+        'loader_rate': loader_classes[loader_class, 1]
+    }
+
+def _configuration(grid, option, i):
+    """One configuration of the sweep as a plain dictionary"""
+    config = {key: values[i].item() for key, values in grid.items()}
+    for key in ('num_trucks', 'num_excavators', 'num_loaders'):
+        config[key] = int(config[key])
+    config.update({
+        'equipment_capacity_per_day': float(option['equipment_capacity_per_day'][i]),
+        'total_cost': float(option['total_cost'][i]),
+        'cost_per_cy': float(option['cost_per_cy'][i]),
+        'project_days': int(option['project_days'][i]),
+        'co2_tons': float(option['co2_tons'][i]),
+        'bottleneck': str(option['bottleneck'][i])
+    })
+    return config
+
+def _cost_days_frontier(grid, option, order):
+    """
+    Cheapest configuration for each achievable project length.
+    
+    Only points that are cheaper than every faster point are kept, so the
+    curve shows what each extra day of schedule is worth.
+    """
+    days = option['project_days'][order]
+    cost = option['total_cost'][order]
+    # order is sorted by (days, cost, fleet size), so each day's first row is its cheapest
+    first = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    faster_best = np.minimum.accumulate(cost[first])
+    keep = first[np.r_[True, cost[first][1:] < faster_best[:-1]]]
+    return [_configuration(grid, option, order[i]) for i in keep]
+
+def _optimize_option(grid, option, deadline_days):
+    """Best configuration and cost-versus-days curve for one option's sweep"""
+    fleet_size = grid['num_trucks'] + grid['num_excavators'] + grid['num_loaders']
+    # Cheapest first; ties go to the faster, then the smaller fleet
+    order = np.lexsort((fleet_size, option['project_days'], option['total_cost']))
+    if deadline_days is None:
+        feasible = order
+    else:
+        feasible = order[option['project_days'][order] <= deadline_days]
+    
+    by_days = np.lexsort((fleet_size, option['total_cost'], option['project_days']))
+    return {
+        'best': _configuration(grid, option, feasible[0]) if len(feasible) else None,
+        'fastest_days': int(option['project_days'].min()),
+        'curve': _cost_days_frontier(grid, option, by_days)
+    }
+
+def optimize_fleet(analysis, deadline_days=None, max_trucks=FLEET_MAX_TRUCKS,
+                   max_excavators=FLEET_MAX_EXCAVATORS, max_loaders=FLEET_MAX_LOADERS,
+                   excavator_classes=FLEET_EXCAVATOR_CLASSES, loader_classes=FLEET_LOADER_CLASSES,
+                   db=None):
+    """
+    Find the cheapest truck and equipment configuration that meets a deadline.
+    
+    Sweeps trucks 1..max_trucks, 1..max_excavators excavators and
+    1..max_loaders loaders of each size class for the Dig & Haul and Surface
+    Facility options. Other inputs (truck size and rate, work hours,
+    disposal and processing rates) come from the analysis as in
+    analyze_site.
+    
+    Args:
+        analysis: Dictionary in the same shape as st.session_state.analysis
+        deadline_days: Target completion in project days (None = cheapest overall)
+        excavator_classes, loader_classes: (capacity CY/hr, hourly rate) per size class
+        db: Facilities database (defaults to the current snapshot)
+    
+    Returns:
+        Dictionary with 'dig_haul' and 'surface' entries (None when the option
+        is unavailable), each holding 'best' (None when no configuration meets
+        the deadline), 'fastest_days' and 'curve', plus 'deadline_days' and
+        'configurations' (number evaluated per option)
+    """
+    if db is None:
+        db = get_facilities_database()
+    
+    site_lat, site_lon = analysis['site_lat'], analysis['site_lon']
+    nearest_lf = find_nearest_qualified_landfill(site_lat, site_lon, analysis['tph_level'],
+                                                 analysis['chloride_level'], analysis['needs_backfill'], db)
+    nearest_cf = find_nearest_cf_facility(site_lat, site_lon, db)
+    points = resolve_calculator_inputs(analysis,
+                                       nearest_lf['landfill'] if nearest_lf else None,
+                                       nearest_cf['facility'] if nearest_cf else None)
+    points['dig_haul']['avg_speed_mph'] = travel_speed_mph(nearest_lf)
+    points['surface']['avg_speed_mph'] = travel_speed_mph(nearest_cf)
+    
+    grid = _fleet_grid(max_trucks, max_excavators, max_loaders, excavator_classes, loader_classes)
+    work_hours = {opt_type: points[opt_type]['work_hours_per_day'] for opt_type in ('dig_haul', 'surface')}
+    
+    def equipment(opt_type):
+        """Daily equipment capacity and machine-count-scaled rates for the sweep"""
+        capacity = np.minimum(grid['excavator_capacity_cy_hr'] * grid['num_excavators'],
+                              grid['loader_capacity_cy_hr'] * grid['num_loaders']) * work_hours[opt_type]
+        return {
+            'equipment_capacity_per_day': capacity,
+            'excavator_rate': grid['excavator_rate'] * grid['num_excavators'],
+            'loader_rate': grid['loader_rate'] * grid['num_loaders']
+        }
+    
+    results = {'dig_haul': None, 'surface': None, 'deadline_days': deadline_days,
+               'configurations': len(grid['num_trucks'])}
+    
+    if nearest_lf:
+        params = dict(points['dig_haul'], **equipment('dig_haul'), num_trucks=grid['num_trucks'])
+        option = calculate_dig_and_haul_vectorized(
+            analysis['volume_cy'], nearest_lf['distance_miles'], analysis['needs_backfill'],
+            landfill_has_backfill=analysis.get('landfill_has_backfill', False),
+            extra_backfill_minutes=analysis.get('extra_backfill_minutes', 0),
+            **params
+        )
+        results['dig_haul'] = dict(_optimize_option(grid, option, deadline_days),
+                                   landfill_name=f"{nearest_lf['landfill']['company']} - {nearest_lf['landfill']['site_name']}",
+                                   distance_miles=nearest_lf['distance_miles'])
+    
+    if nearest_cf:
+        params = dict(points['surface'], **equipment('surface'), num_trucks=grid['num_trucks'])
+        option = calculate_surface_facility_vectorized(
+            analysis['volume_cy'], nearest_cf['distance_miles'], **params
+        )
+        results['surface'] = dict(_optimize_option(grid, option, deadline_days),
+                                  facility_name=nearest_cf['facility']['facility_name'],
+                                  distance_miles=nearest_cf['distance_miles'])
+    
+    return results
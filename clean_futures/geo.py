@@ -0,0 +1,419 @@
+"""
+Geospatial helpers for the Clean Futures calculation core.
+
+Distances, location lookups, regulatory thresholds and the nearest
+qualified facility searches (spatial and acceptance-threshold indexes).
+"""
+
+import bisect
+import math
+
+from .facilities import SPATIAL_INDEX_LIMIT_KEYS, get_derived
+
+# ============================================================================
+# HELPER FUNCTIONS - DISTANCE AND GEOSPATIAL
+# ============================================================================
+
+# Average truck speed over straight-line distance when no road network is installed
+STRAIGHT_LINE_SPEED_MPH = 45
+
+def determine_state_county(lat, lon, db):
+    """Determine state and county from GPS coordinates"""
+    # County boundary raster covers the basin box the questionnaires accept
+    from .counties import get_county_raster, lookup_state_county
+    
+    located = lookup_state_county(lat, lon, get_county_raster())
+    if located:
+        return located
+    
+    # Outside the raster: Texas/New Mexico boundary is roughly at -103° longitude
+    state = "Texas" if lon > -103.0 else "New Mexico"
+    
+    # Find nearest county from the landfill database
+    county_distances = {}
+    
+    for lf in db['landfills']:
+        county = lf['county']
+        # Calculate distance to this landfill (use as proxy for county)
+        distance = haversine_distance(lat, lon, lf['latitude'], lf['longitude'])
+        
+        # Keep the closest distance for each county
+        if county not in county_distances or distance < county_distances[county]:
+            county_distances[county] = distance
+    
+    if county_distances:
+        # Return the county with the closest landfill
+        nearest_county = min(county_distances, key=county_distances.get)
+        return state, nearest_county
+    
+    # Fallback: try to estimate based on coordinates
+    if state == "Texas":
+        # Rough Texas Permian Basin county estimates
+        if lon > -101.5:
+            return state, "HOWARD"
+        elif lon > -102.5:
+            return state, "MIDLAND"
+        else:
+            return state, "REEVES"
+    else:
+        # New Mexico side
+        return state, "LEA"
+
+def get_soil_type(lat, lon, state):
+    """Estimate soil type based on location in Permian Basin"""
+    # Simplified soil classification for Permian Basin
+    # In production, this would query USDA Web Soil Survey or similar database
+    
+    # Eastern Permian (more clay-rich)
+    if lon > -102.0:
+        return "Clay Loam / Silty Clay"
+    # Central Permian (mixed)
+    elif lon > -103.5:
+        return "Sandy Clay Loam / Caliche"
+    # Western Permian (more sandy)
+    else:
+        return "Sandy Loam / Desert Soils"
+
+def get_regulatory_thresholds(state, groundwater_depth_category=None):
+    """
+    Get soil regulatory thresholds for TPH and Chlorides.
+    
+    Args:
+        state: "Texas" or "New Mexico"
+        groundwater_depth_category: For New Mexico only - one of:
+            - "50_or_less" (groundwater at 50 feet or less)
+            - "51_to_100" (groundwater at 51-100 feet)  
+            - "over_100" (groundwater at >100 feet)
+    
+    Returns:
+        Dictionary with threshold values and regulatory information
+    """
+    # Texas TCEQ Protective Concentration Levels (PCLs)
+    # New Mexico NMED Soil Screening Levels (SSLs)
+    
+    if state == "Texas":
+        return {
+            'tph_threshold_mgkg': 10000,
+            'tph_residential_mgkg': 10000,
+            'tph_industrial_mgkg': 10000,
+            'chloride_threshold_mgkg': 3000,
+            'chloride_soil_mgkg': '3,000 mg/kg (guidance)',
+            'benzene_threshold_mgkg': 0.026,
+            'regulatory_agency': 'TCEQ (Texas Commission on Environmental Quality)',
+            'regulation_type': 'Guidance',
+            'groundwater_depth_display': 'N/A (Texas)',
+            'notes': 'Texas uses risk-based guidance levels; site-specific cleanup levels may vary'
+        }
+    else:  # New Mexico - thresholds depend on groundwater depth
+        if groundwater_depth_category == "50_or_less":
+            return {
+                'tph_threshold_mgkg': 100,
+                'tph_residential_mgkg': 100,
+                'tph_industrial_mgkg': 100,
+                'chloride_threshold_mgkg': 600,
+                'chloride_soil_mgkg': '600 mg/kg',
+                'benzene_threshold_mgkg': 10,
+                'btex_threshold_mgkg': 50,
+                'regulatory_agency': 'NMED (New Mexico Environment Department)',
+                'regulation_type': 'Regulation',
+                'groundwater_depth_display': '≤50 feet',
+                'notes': 'Strictest thresholds apply when groundwater is shallow (≤50 ft)'
+            }
+        elif groundwater_depth_category == "51_to_100":
+            return {
+                'tph_threshold_mgkg': 2500,
+                'tph_residential_mgkg': 2500,
+                'tph_industrial_mgkg': 2500,
+                'chloride_threshold_mgkg': 10000,
+                'chloride_soil_mgkg': '10,000 mg/kg',
+                'benzene_threshold_mgkg': 10,
+                'btex_threshold_mgkg': 50,
+                'gro_dro_threshold_mgkg': 1000,
+                'regulatory_agency': 'NMED (New Mexico Environment Department)',
+                'regulation_type': 'Regulation',
+                'groundwater_depth_display': '51-100 feet',
+                'notes': 'Moderate thresholds apply for mid-depth groundwater (51-100 ft)'
+            }
+        else:  # over_100 or default
+            return {
+                'tph_threshold_mgkg': 2500,
+                'tph_residential_mgkg': 2500,
+                'tph_industrial_mgkg': 2500,
+                'chloride_threshold_mgkg': 20000,
+                'chloride_soil_mgkg': '20,000 mg/kg',
+                'benzene_threshold_mgkg': 10,
+                'btex_threshold_mgkg': 50,
+                'gro_dro_threshold_mgkg': 1000,
+                'regulatory_agency': 'NMED (New Mexico Environment Department)',
+                'regulation_type': 'Regulation',
+                'groundwater_depth_display': '>100 feet',
+                'notes': 'Less restrictive thresholds apply when groundwater is deep (>100 ft)'
+            }
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance between two GPS coordinates in miles"""
+    R = 3959  # Earth's radius in miles
+    
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+    
+    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    
+    return R * c
+
+def find_nearest_qualified_landfill(lat, lon, tph_level, chloride_level, needs_backfill, db):
+    """
+    Find the nearest landfill that accepts the contamination levels.
+    
+    With a road network installed, "nearest" is the quickest drive and the
+    result also carries 'drive_hours'; distance_miles is then road miles.
+    """
+    # Road graph is optional and only loaded when the file is installed
+    from .roads import get_road_network, nearest_by_road
+    
+    network = get_road_network()
+    if network is not None:
+        landfill, distance, hours = nearest_by_road(lat, lon, 'landfills', db, network, tph_level, chloride_level)
+        if landfill is None:
+            return None
+        return {'landfill': landfill, 'distance_miles': distance, 'drive_hours': hours}
+    
+    # Most basin sites resolve from the precomputed nearest-facility raster
+    from .facility_raster import get_facility_raster, raster_nearest_landfill
+    
+    position, distance = raster_nearest_landfill(get_facility_raster(db), db, lat, lon, tph_level, chloride_level)
+    if position >= 0:
+        return {
+            'landfill': db['landfills'][position],
+            'distance_miles': distance
+        }
+    
+    # Qualification is a bisection into the acceptance index; every landfill
+    # in the returned class already accepts these levels
+    class_index = qualified_landfill_index(get_acceptance_index(db), tph_level, chloride_level)
+    landfill, distance = query_spatial_index(class_index, lat, lon)
+    
+    if landfill is None:
+        return None
+    
+    # Include all qualified landfills - we'll note backfill availability separately
+    return {
+        'landfill': landfill,
+        'distance_miles': distance
+    }
+
+def find_nearest_cf_facility(lat, lon, db):
+    """Find the nearest Clean Futures facility (quickest by road when a road network is installed)"""
+    from .roads import get_road_network, nearest_by_road
+    
+    network = get_road_network()
+    if network is not None:
+        facility, distance, hours = nearest_by_road(lat, lon, 'clean_futures_facilities', db, network)
+        if facility is None:
+            return None
+        return {'facility': facility, 'distance_miles': distance, 'drive_hours': hours}
+    
+    from .facility_raster import get_facility_raster, raster_nearest_cf_facility
+    
+    position, distance = raster_nearest_cf_facility(get_facility_raster(db), db, lat, lon)
+    if position >= 0:
+        return {
+            'facility': db['clean_futures_facilities'][position],
+            'distance_miles': distance
+        }
+    
+    facility, distance = query_spatial_index(get_spatial_index(db, 'clean_futures_facilities'), lat, lon)
+    
+    if facility is None:
+        return None
+    
+    return {
+        'facility': facility,
+        'distance_miles': distance
+    }
+
+def travel_speed_mph(nearest):
+    """
+    Average truck speed for a find_nearest_* result.
+    
+    Road-routed results imply their own speed (road miles / drive hours), so
+    distance_miles / speed reproduces the routed drive time.
+    """
+    hours = nearest.get('drive_hours') if nearest else None
+    if not hours:
+        return STRAIGHT_LINE_SPEED_MPH
+    return nearest['distance_miles'] / hours
+
+# ============================================================================
+# SPATIAL INDEX
+# ============================================================================
+# KD-tree over facility positions as 3D unit vectors. Straight-line (chord)
+# distance on the unit sphere grows with great-circle distance, so the tree
+# finds the same nearest facility as a full haversine scan. Each node stores
+# the maximum acceptance limits in its subtree, so branches where no facility
+# can accept the contamination are skipped during the search.
+
+SPATIAL_INDEX_LEAF_SIZE = 8
+
+def _unit_vector(lat, lon):
+    """Convert GPS coordinates to a 3D unit vector"""
+    lat_rad = math.radians(lat)
+    lon_rad = math.radians(lon)
+    cos_lat = math.cos(lat_rad)
+    return (cos_lat * math.cos(lon_rad), cos_lat * math.sin(lon_rad), math.sin(lat_rad))
+
+def _chord_to_miles(chord):
+    """Convert a unit-sphere chord length to great-circle miles"""
+    return 3959 * 2 * math.asin(min(1.0, chord / 2))
+
+def build_spatial_index(facilities, limit_keys=()):
+    """
+    Build a KD-tree index over a list of facility records.
+    
+    Args:
+        facilities: List of facility dicts with 'latitude' and 'longitude'
+        limit_keys: Acceptance-limit fields to filter on during queries
+    
+    Returns:
+        Dictionary holding the tree and the per-facility points and limits
+    """
+    points = [_unit_vector(f['latitude'], f['longitude']) for f in facilities]
+    limits = [tuple(f[key] for key in limit_keys) for f in facilities]
+    
+    def build(indices):
+        node_limits = tuple(max(limits[i][k] for i in indices) for k in range(len(limit_keys)))
+        if len(indices) <= SPATIAL_INDEX_LEAF_SIZE:
+            return {'items': indices, 'limits': node_limits}
+        
+        # Split on the axis with the widest spread
+        axis = max(range(3), key=lambda a: max(points[i][a] for i in indices) -
+                                           min(points[i][a] for i in indices))
+        indices = sorted(indices, key=lambda i: points[i][axis])
+        mid = len(indices) // 2
+        return {
+            'axis': axis,
+            'split': points[indices[mid]][axis],
+            'left': build(indices[:mid]),
+            'right': build(indices[mid:]),
+            'limits': node_limits
+        }
+    
+    return {
+        'facilities': facilities,
+        'points': points,
+        'limits': limits,
+        'root': build(list(range(len(facilities)))) if facilities else None
+    }
+
+def get_spatial_index(db, kind):
+    """Return the spatial index for db[kind], building it on first use"""
+    return get_derived(db, ('spatial_index', kind),
+                       lambda: build_spatial_index(db[kind], SPATIAL_INDEX_LIMIT_KEYS[kind]))
+
+def query_spatial_index(index, lat, lon, min_limits=None):
+    """
+    Find the nearest facility whose acceptance limits meet min_limits.
+    
+    Distances are exact haversine_distance values, and ties go to the
+    facility listed first, matching a full scan sorted by distance.
+    
+    Returns:
+        Tuple of (facility, distance_miles), or (None, None) if none qualify
+    """
+    if index['root'] is None:
+        return None, None
+    
+    query = _unit_vector(lat, lon)
+    facilities = index['facilities']
+    best = [math.inf, -1]  # [distance_miles, facility index]
+    
+    def accepts(limits):
+        return min_limits is None or all(have >= need for have, need in zip(limits, min_limits))
+    
+    def search(node):
+        if not accepts(node['limits']):
+            return
+        
+        if 'items' in node:
+            for i in node['items']:
+                if not accepts(index['limits'][i]):
+                    continue
+                f = facilities[i]
+                distance = haversine_distance(lat, lon, f['latitude'], f['longitude'])
+                if (distance, i) < (best[0], best[1]):
+                    best[0], best[1] = distance, i
+            return
+        
+        diff = query[node['axis']] - node['split']
+        near, far = (node['left'], node['right']) if diff < 0 else (node['right'], node['left'])
+        search(near)
+        # Far side can only hold a closer facility if the splitting plane is within reach
+        if _chord_to_miles(abs(diff)) - 1e-9 <= best[0]:
+            search(far)
+    
+    search(index['root'])
+    
+    if best[1] < 0:
+        return None, None
+    return facilities[best[1]], best[0]
+
+# ============================================================================
+# ACCEPTANCE-THRESHOLD INDEX
+# ============================================================================
+# Landfills are grouped into acceptance classes by where a site's TPH and
+# chloride levels fall among the sorted distinct tph_max_mgkg and
+# chloride_max_mgkg limits. Every site landing in the same (TPH, chloride)
+# cell qualifies for exactly the same landfills, so the qualified subset is
+# found by two bisections. The spatial index for each class is built the
+# first time that class is queried and then reused.
+
+def build_acceptance_index(landfills):
+    """Build the acceptance-threshold index over a list of landfills"""
+    return {
+        'landfills': landfills,
+        'tph_limits': sorted({lf['tph_max_mgkg'] for lf in landfills}),
+        'chloride_limits': sorted({lf['chloride_max_mgkg'] for lf in landfills}),
+        'classes': {}
+    }
+
+def get_acceptance_index(db):
+    """Return the acceptance-threshold index for db, building it on first use"""
+    return get_derived(db, 'acceptance_index', lambda: build_acceptance_index(db['landfills']))
+
+def acceptance_class(acceptance_index, tph_level, chloride_level):
+    """
+    Return the (tph, chloride) class key for a pair of contamination levels.
+    
+    A level of 0 means the contaminant is not present and any limit accepts it.
+    """
+    tph_class = bisect.bisect_left(acceptance_index['tph_limits'], tph_level) if tph_level > 0 else 0
+    chloride_class = (bisect.bisect_left(acceptance_index['chloride_limits'], chloride_level)
+                      if chloride_level > 0 else 0)
+    return tph_class, chloride_class
+
+def qualified_landfill_index(acceptance_index, tph_level, chloride_level):
+    """Return the cached spatial index over landfills that accept these levels"""
+    key = acceptance_class(acceptance_index, tph_level, chloride_level)
+    class_index = acceptance_index['classes'].get(key)
+    
+    if class_index is None:
+        tph_class, chloride_class = key
+        tph_limits = acceptance_index['tph_limits']
+        chloride_limits = acceptance_index['chloride_limits']
+        landfills = acceptance_index['landfills']
+        if tph_class >= len(tph_limits) or chloride_class >= len(chloride_limits):
+            positions = []
+        else:
+            positions = [
+                i for i, lf in enumerate(landfills)
+                if lf['tph_max_mgkg'] >= tph_limits[tph_class]
+                and lf['chloride_max_mgkg'] >= chloride_limits[chloride_class]
+            ]
+        class_index = build_spatial_index([landfills[i] for i in positions])
+        class_index['positions'] = positions
+        acceptance_index['classes'][key] = class_index
+    
+    return class_index
@@ -0,0 +1,211 @@
+"""
+Monte Carlo uncertainty analysis for the Clean Futures calculation core.
+"""
+
+import numpy as np
+
+from .facilities import get_facilities_database
+from .geo import find_nearest_cf_facility, find_nearest_qualified_landfill, travel_speed_mph
+from .recommendation import analyze_site
+from .vectorized import (calculate_dig_and_haul_vectorized, calculate_onsite_remediation_vectorized,
+                         calculate_surface_facility_vectorized, generate_recommendation_vectorized,
+                         resolve_calculator_inputs)
+
+# ============================================================================
+# MONTE CARLO UNCERTAINTY
+# ============================================================================
+# The calculators take point values for speeds, loading time, rates,
+# treatment time and volume. Here those inputs are drawn from distributions
+# and every draw is evaluated at once with the vectorized calculators, so
+# 10k-100k draws per site cost a few array passes and no Python loop per
+# draw. Each input has its own random stream derived from the seed, so a
+# given seed reproduces the same draws for an input no matter which other
+# inputs are made uncertain.
+#
+# A distribution is a number (fixed value) or a dict:
+#   {'dist': 'fixed', 'value': v}
+#   {'dist': 'uniform', 'low': a, 'high': b}
+#   {'dist': 'triangular', 'low': a, 'mode': m, 'high': b}
+#   {'dist': 'normal', 'mean': mu, 'sd': s, 'min': floor}     (floor optional)
+#   {'dist': 'lognormal', 'median': m, 'sigma': s}
+# With 'relative': True the draws multiply the input's point value (the
+# Simple/Advanced Mode value for that site) instead of replacing it.
+
+MONTE_CARLO_DRAWS = 10000
+
+# Uncertain inputs, in the fixed order used to derive each input's random stream
+MONTE_CARLO_INPUTS = (
+    'volume_cy', 'avg_speed_mph', 'loading_time_hours', 'truck_hourly_rate',
+    'excavator_rate', 'loader_rate', 'disposal_cost_cy', 'backfill_cost_cy',
+    'onsite_processing_cost_cy', 'surface_processing_cost_cy', 'base_treatment_days'
+)
+
+# Spread used when no distributions are given (relative to each site's point values)
+DEFAULT_MONTE_CARLO_DISTRIBUTIONS = {
+    'volume_cy': {'dist': 'triangular', 'low': 0.85, 'mode': 1.0, 'high': 1.3, 'relative': True},
+    'avg_speed_mph': {'dist': 'triangular', 'low': 0.75, 'mode': 1.0, 'high': 1.1, 'relative': True},
+    'loading_time_hours': {'dist': 'triangular', 'low': 0.8, 'mode': 1.0, 'high': 1.6, 'relative': True},
+    'truck_hourly_rate': {'dist': 'uniform', 'low': 0.9, 'high': 1.15, 'relative': True},
+    'excavator_rate': {'dist': 'uniform', 'low': 0.9, 'high': 1.1, 'relative': True},
+    'loader_rate': {'dist': 'uniform', 'low': 0.9, 'high': 1.1, 'relative': True},
+    'base_treatment_days': {'dist': 'triangular', 'low': 0.8, 'mode': 1.0, 'high': 1.4, 'relative': True}
+}
+
+# Percentiles reported for each option metric
+MONTE_CARLO_PERCENTILES = (10, 50, 90)
+
+# Option metrics summarized over the draws
+MONTE_CARLO_METRICS = ('total_cost', 'project_days', 'co2_tons')
+
+def sample_distribution(spec, size, rng):
+    """Draw size values from one distribution spec (see the section notes)"""
+    if not isinstance(spec, dict):
+        return np.full(size, float(spec))
+    
+    dist = spec.get('dist')
+    if dist == 'fixed':
+        return np.full(size, float(spec['value']))
+    if dist == 'uniform':
+        return rng.uniform(spec['low'], spec['high'], size)
+    if dist == 'triangular':
+        if spec['low'] == spec['high']:
+            return np.full(size, float(spec['low']))
+        return rng.triangular(spec['low'], spec['mode'], spec['high'], size)
+    if dist == 'normal':
+        values = rng.normal(spec['mean'], spec['sd'], size)
+        if 'min' in spec:
+            values = np.maximum(values, spec['min'])
+        return values
+    if dist == 'lognormal':
+        return rng.lognormal(np.log(spec['median']), spec['sigma'], size)
+    raise ValueError(f"Unknown distribution: {dist!r}")
+
+def _summarize(values, draws):
+    """Percentiles and mean of one metric over the draws"""
+    values = np.broadcast_to(np.asarray(values, dtype=float), (draws,))
+    summary = {f'p{p}': float(v) for p, v in zip(MONTE_CARLO_PERCENTILES,
+                                                  np.percentile(values, MONTE_CARLO_PERCENTILES))}
+    summary['mean'] = float(values.mean())
+    return summary
+
+def monte_carlo_site(analysis, distributions=None, draws=MONTE_CARLO_DRAWS, seed=None, db=None):
+    """
+    Run a Monte Carlo uncertainty analysis for one site.
+    
+    Args:
+        analysis: Dictionary in the same shape as st.session_state.analysis
+        distributions: Input name -> distribution spec, for names in
+            MONTE_CARLO_INPUTS (defaults to DEFAULT_MONTE_CARLO_DISTRIBUTIONS).
+            Inputs not listed keep their point values.
+        draws: Number of draws, all evaluated in one vectorized pass
+        seed: Integer seed; None picks a fresh one (returned as 'seed')
+        db: Facilities database (defaults to the current snapshot)
+    
+    Returns:
+        Dictionary with 'draws', 'seed', per-option P10/P50/P90/mean of
+        total_cost, project_days and co2_tons under 'options', the share of
+        draws in which each option is recommended under
+        'recommendation_probability', and the point-value analyze_site
+        result under 'baseline'
+    """
+    if db is None:
+        db = get_facilities_database()
+    if distributions is None:
+        distributions = DEFAULT_MONTE_CARLO_DISTRIBUTIONS
+    unknown = set(distributions) - set(MONTE_CARLO_INPUTS)
+    if unknown:
+        raise ValueError(f"Unknown Monte Carlo inputs: {', '.join(sorted(unknown))}")
+    
+    site_lat, site_lon = analysis['site_lat'], analysis['site_lon']
+    nearest_lf = find_nearest_qualified_landfill(site_lat, site_lon, analysis['tph_level'],
+                                                 analysis['chloride_level'], analysis['needs_backfill'], db)
+    nearest_cf = find_nearest_cf_facility(site_lat, site_lon, db)
+    baseline = analyze_site(analysis, db, nearest_lf, nearest_cf)
+    points = resolve_calculator_inputs(analysis,
+                           nearest_lf['landfill'] if nearest_lf else None,
+                           nearest_cf['facility'] if nearest_cf else None)
+    # Road-routed sites have their own point speed
+    points['dig_haul']['avg_speed_mph'] = travel_speed_mph(nearest_lf)
+    points['surface']['avg_speed_mph'] = travel_speed_mph(nearest_cf)
+    
+    seed_seq = np.random.SeedSequence(seed)
+    streams = dict(zip(MONTE_CARLO_INPUTS, seed_seq.spawn(len(MONTE_CARLO_INPUTS))))
+    raw = {name: sample_distribution(spec, draws, np.random.default_rng(streams[name]))
+           for name, spec in distributions.items()}
+    
+    def value(name, point):
+        """Draws for one input, scaled by the point value when the spec is relative"""
+        if name not in raw:
+            return point
+        spec = distributions[name]
+        return raw[name] * point if isinstance(spec, dict) and spec.get('relative') else raw[name]
+    
+    volume_cy = value('volume_cy', analysis['volume_cy'])
+    
+    dig_haul = None
+    if nearest_lf:
+        params = points['dig_haul']
+        dig_haul = calculate_dig_and_haul_vectorized(
+            volume_cy, nearest_lf['distance_miles'], analysis['needs_backfill'],
+            num_trucks=params['num_trucks'],
+            equipment_capacity_per_day=params['equipment_capacity_per_day'],
+            landfill_has_backfill=analysis.get('landfill_has_backfill', False),
+            extra_backfill_minutes=analysis.get('extra_backfill_minutes', 0),
+            truck_capacity_cy=params['truck_capacity_cy'],
+            truck_hourly_rate=value('truck_hourly_rate', params['truck_hourly_rate']),
+            excavator_rate=value('excavator_rate', params['excavator_rate']),
+            loader_rate=value('loader_rate', params['loader_rate']),
+            work_hours_per_day=params['work_hours_per_day'],
+            disposal_cost_cy=value('disposal_cost_cy', params['disposal_cost_cy']),
+            backfill_cost_cy=value('backfill_cost_cy', params['backfill_cost_cy']),
+            avg_speed_mph=value('avg_speed_mph', params['avg_speed_mph']),
+            loading_time_hours=value('loading_time_hours', params['loading_time_hours'])
+        )
+    
+    params = points['onsite']
+    onsite = calculate_onsite_remediation_vectorized(
+        volume_cy, analysis.get('soil_permeability', 'medium'),
+        analysis['tph_level'], analysis['chloride_level'],
+        processing_cost_cy=value('onsite_processing_cost_cy', params['processing_cost_cy']),
+        mobilization_cost=params['mobilization_cost'],
+        amendment_cost=params['amendment_cost'],
+        base_treatment_days=value('base_treatment_days', params['base_treatment_days'])
+    )
+    
+    surface = None
+    if nearest_cf:
+        params = points['surface']
+        surface = calculate_surface_facility_vectorized(
+            volume_cy, nearest_cf['distance_miles'],
+            num_trucks=params['num_trucks'],
+            equipment_capacity_per_day=params['equipment_capacity_per_day'],
+            truck_capacity_cy=params['truck_capacity_cy'],
+            truck_hourly_rate=value('truck_hourly_rate', params['truck_hourly_rate']),
+            processing_cost_cy=value('surface_processing_cost_cy', params['processing_cost_cy']),
+            excavator_rate=value('excavator_rate', params['excavator_rate']),
+            loader_rate=value('loader_rate', params['loader_rate']),
+            work_hours_per_day=params['work_hours_per_day'],
+            avg_speed_mph=value('avg_speed_mph', params['avg_speed_mph']),
+            loading_time_hours=value('loading_time_hours', params['loading_time_hours'])
+        )
+    
+    options = {'dig_haul': dig_haul, 'onsite': onsite, 'surface': surface}
+    summary = {
+        opt_type: ({metric: _summarize(opt[metric], draws) for metric in MONTE_CARLO_METRICS} if opt else None)
+        for opt_type, opt in options.items()
+    }
+    
+    probability = {}
+    recommendation = generate_recommendation_vectorized(dig_haul, onsite, surface, analysis['priorities'])
+    if recommendation is not None:
+        recommended = np.broadcast_to(recommendation[0], (draws,))
+        probability = {opt_type: float(np.count_nonzero(recommended == opt_type)) / draws
+                       for opt_type, opt in options.items() if opt}
+    
+    return {
+        'draws': draws,
+        'seed': seed_seq.entropy,
+        'options': summary,
+        'recommendation_probability': probability,
+        'baseline': baseline
+    }
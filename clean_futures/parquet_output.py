@@ -0,0 +1,254 @@
+"""
+Parquet output for batch and portfolio results (requires pyarrow).
+"""
+
+import csv
+import os
+from collections import OrderedDict
+from urllib.parse import quote
+
+from .batch import BATCH_CHUNK_SIZE, iter_scored_batch, write_scored_chunk
+from .facilities import get_facilities_database
+
+# ============================================================================
+# PARQUET OUTPUT
+# ============================================================================
+# Batch results as a typed Parquet dataset for warehouse loads. Every key the
+# calculators return gets its own column with a fixed type, so the schema is
+# the same whichever options a run happens to produce (missing options are
+# nulls). Files are partitioned Hive-style by state and county
+# (state=Texas/county=UPTON/part-0.parquet), readable as one dataset by
+# pyarrow, pandas, DuckDB, Spark and the like.
+#
+# Each scored chunk becomes an Arrow table whose rows are split into
+# per-partition buffers. A partition's buffer is appended to its open file as
+# one row group once it holds PARQUET_ROW_GROUP_ROWS rows, and every buffer is
+# written when the run ends. Both the buffered rows and the number of open
+# files are capped, so memory stays flat however many sites (and counties) a
+# run covers; only past the row cap are row groups written smaller.
+#
+# pyarrow is optional: it is only imported when Parquet output is requested.
+
+# Bump when columns are renamed, retyped or removed (adding columns is compatible)
+PARQUET_SCHEMA_VERSION = "1"
+
+# Rows per row group: a partition's rows are buffered until it has this many
+# (or the run ends) and then written as one row group
+PARQUET_ROW_GROUP_ROWS = 65536
+
+# Rows buffered over all partitions (about 560 bytes each in Arrow); past
+# this the partition with the most rows is written early as a smaller group
+PARQUET_MAX_BUFFERED_ROWS = 4 * PARQUET_ROW_GROUP_ROWS
+
+# Buffered slices per partition before they are merged into one table
+PARQUET_BUFFER_PIECES = 8
+
+# Partition files kept open at once; the least recently written is closed
+# and the partition continues in a new part-N file
+PARQUET_MAX_OPEN_FILES = 256
+
+# Columns the dataset is partitioned by (stored in the directory names)
+PARQUET_PARTITION_COLUMNS = ('state', 'county')
+
+# Directory value for rows without a state or county (Hive's convention)
+_NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+# Logical column types: 'string', 'float', 'int' or 'bool'
+_SITE_COLUMNS = (
+    ('site_id', 'string'), ('site_lat', 'float'), ('site_lon', 'float'),
+    ('state', 'string'), ('county', 'string'), ('volume_cy', 'float'),
+    ('tph_level', 'int'), ('chloride_level', 'int'), ('needs_backfill', 'bool'),
+    ('landfill_has_backfill', 'bool'), ('num_trucks_input', 'int'),
+    ('equipment_capacity_input', 'float'), ('soil_permeability', 'string'),
+    ('groundwater_depth', 'string')
+)
+
+# Calculator result key -> logical type, per option; column names are
+# '<option>_<key>' except where renamed in _RESULT_COLUMN_NAMES
+_RESULT_KEYS = {
+    'dig_haul': (
+        ('total_cost', 'float'), ('cost_per_cy', 'float'), ('project_days', 'int'), ('co2_tons', 'float'),
+        ('landfill_name', 'string'), ('distance_miles', 'float'), ('avg_speed_mph', 'float'),
+        ('equipment_cost', 'float'), ('trucking_cost', 'float'), ('disposal_cost', 'float'),
+        ('backfill_cost', 'float'), ('includes_backfill', 'bool'), ('backfill_available_at_landfill', 'bool'),
+        ('bottleneck', 'string'), ('truck_capacity_per_day', 'float'), ('equipment_capacity_per_day', 'float'),
+        ('actual_daily_capacity', 'float'), ('num_trucks', 'int'), ('num_trips', 'int'),
+        ('trip_time_hours', 'float'), ('base_trip_time_hours', 'float'), ('extra_backfill_minutes', 'int'),
+        ('extra_backfill_co2_tons', 'float')
+    ),
+    'onsite': (
+        ('total_cost', 'float'), ('cost_per_cy', 'float'), ('project_days', 'int'), ('co2_tons', 'float'),
+        ('processing_cost', 'float'), ('mobilization_cost', 'float'), ('amendment_cost', 'float'),
+        ('includes_backfill', 'bool'), ('soil_returned_clean', 'bool'), ('permeability_factor', 'string'),
+        ('rate_per_cy', 'float')
+    ),
+    'surface': (
+        ('total_cost', 'float'), ('cost_per_cy', 'float'), ('project_days', 'int'), ('co2_tons', 'float'),
+        ('facility_name', 'string'), ('distance_miles', 'float'), ('avg_speed_mph', 'float'),
+        ('trucking_cost', 'float'), ('processing_cost', 'float'), ('equipment_cost', 'float'),
+        ('includes_backfill', 'bool'), ('soil_returned_clean', 'bool'), ('bottleneck', 'string'),
+        ('truck_capacity_per_day', 'float'), ('equipment_capacity_per_day', 'float'),
+        ('actual_daily_capacity', 'float'), ('num_trucks', 'int'), ('num_trips', 'int'),
+        ('trip_time_hours', 'float')
+    )
+}
+
+# Same names as the CSV columns for the facility
+_RESULT_COLUMN_NAMES = {'dig_haul_landfill_name': 'dig_haul_landfill', 'surface_facility_name': 'surface_facility'}
+
+_TRAILING_COLUMNS = (
+    ('recommended', 'string'), ('score_dig_haul', 'float'), ('score_onsite', 'float'),
+    ('score_surface', 'float'), ('dig_haul_simulated_days', 'int'), ('surface_simulated_days', 'int'),
+    ('error', 'string')
+)
+
+def _result_columns():
+    """(column, option, result key, logical type) for every calculator result column"""
+    columns = []
+    for opt_type, keys in _RESULT_KEYS.items():
+        for key, kind in keys:
+            name = f'{opt_type}_{key}'
+            columns.append((_RESULT_COLUMN_NAMES.get(name, name), opt_type, key, kind))
+    return columns
+
+_RESULT_COLUMNS = _result_columns()
+
+def parquet_columns():
+    """Column names and logical types of the Parquet schema, in order"""
+    return ([(name, kind) for name, kind in _SITE_COLUMNS] +
+            [(name, kind) for name, _, _, kind in _RESULT_COLUMNS] +
+            list(_TRAILING_COLUMNS))
+
+def _require_pyarrow():
+    """Import pyarrow, with an install hint when it is missing"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet output needs pyarrow (pip install pyarrow)") from e
+    return pyarrow, pyarrow.parquet
+
+def batch_parquet_schema():
+    """Arrow schema of batch result rows (partition columns included)"""
+    pa, _ = _require_pyarrow()
+    types = {'string': pa.string(), 'float': pa.float64(), 'int': pa.int64(), 'bool': pa.bool_()}
+    return pa.schema([pa.field(name, types[kind]) for name, kind in parquet_columns()],
+                     metadata={'clean_futures_schema_version': PARQUET_SCHEMA_VERSION})
+
+def parquet_result_row(site_id, analysis, results, state, county):
+    """Flatten one site's analysis results into a row with every Parquet column"""
+    row = {
+        'site_id': site_id,
+        'site_lat': analysis['site_lat'],
+        'site_lon': analysis['site_lon'],
+        'state': state,
+        'county': county,
+        'volume_cy': analysis['volume_cy'],
+        'tph_level': analysis['tph_level'],
+        'chloride_level': analysis['chloride_level'],
+        'needs_backfill': analysis['needs_backfill'],
+        'landfill_has_backfill': analysis.get('landfill_has_backfill'),
+        'num_trucks_input': analysis.get('num_trucks'),
+        'equipment_capacity_input': analysis.get('equipment_capacity_per_day'),
+        'soil_permeability': analysis.get('soil_permeability'),
+        'groundwater_depth': analysis.get('groundwater_depth'),
+        'recommended': results['recommended']
+    }
+    for name, opt_type, key, _ in _RESULT_COLUMNS:
+        opt = results[opt_type]
+        row[name] = opt.get(key) if opt else None
+    for opt_type in ('dig_haul', 'onsite', 'surface'):
+        row[f'score_{opt_type}'] = results['scores'].get(opt_type)
+    return row
+
+def _partition_path(values):
+    """Hive-style directory of a partition (state=Texas/county=UPTON), values URL-quoted"""
+    return os.path.join(*(f"{name}={_NULL_PARTITION if value is None else quote(str(value), safe='')}"
+                          for name, value in zip(PARQUET_PARTITION_COLUMNS, values)))
+
+def _partition_writer(values, writers, pq, file_schema, output_dir):
+    """Open (or reuse) the file for a partition, closing the least recently used one when too many are open"""
+    writer = writers['open'].pop(values, None)
+    if writer is None:
+        if len(writers['open']) >= PARQUET_MAX_OPEN_FILES:
+            writers['open'].popitem(last=False)[1].close()
+        directory = os.path.join(output_dir, _partition_path(values))
+        os.makedirs(directory, exist_ok=True)
+        files = writers['files'].get(values, 0)
+        writers['files'][values] = files + 1
+        writer = pq.ParquetWriter(os.path.join(directory, f"part-{files}.parquet"), file_schema)
+    writers['open'][values] = writer
+    return writer
+
+def _buffer_rows(table, keys, buffers, pa):
+    """Append each partition's rows of a chunk to its buffer; returns the partitions now holding a full row group"""
+    groups = {}
+    for i, values in enumerate(keys):
+        groups.setdefault(values, []).append(i)
+    full = []
+    for values, indices in groups.items():
+        buffer = buffers.setdefault(values, {'tables': [], 'rows': 0})
+        buffer['tables'].append(table.take(indices))
+        buffer['rows'] += len(indices)
+        if len(buffer['tables']) > PARQUET_BUFFER_PIECES:
+            # Many small slices cost more than their rows; merge them into one
+            buffer['tables'] = [pa.concat_tables(buffer['tables']).combine_chunks()]
+        if buffer['rows'] >= PARQUET_ROW_GROUP_ROWS:
+            full.append(values)
+    return full
+
+def _flush_partition(values, buffers, writers, pa, pq, file_schema, output_dir):
+    """Write a partition's buffered rows as one row group and empty its buffer"""
+    buffer = buffers.pop(values)
+    table = pa.concat_tables(buffer['tables'])
+    _partition_writer(values, writers, pq, file_schema, output_dir).write_table(table, row_group_size=len(table))
+    return buffer['rows']
+
+def write_batch_parquet(input_file, output_dir, db=None, chunk_size=BATCH_CHUNK_SIZE, workers=1, simulate=False):
+    """
+    Score every site in a CSV stream and write a Parquet dataset partitioned by state and county.
+    
+    Same scoring and error handling as run_batch; rows that could not be
+    parsed are kept with only site_id and error set (their state and county
+    are null). output_dir must not already hold data.
+    
+    Returns:
+        Tuple of (rows processed, rows with errors)
+    """
+    pa, pq = _require_pyarrow()
+    if os.path.isdir(output_dir) and os.listdir(output_dir):
+        raise ValueError(f"{output_dir}: output directory is not empty")
+    if db is None:
+        db = get_facilities_database()
+    
+    schema = batch_parquet_schema()
+    # Partition values live in the directory names, not in the files
+    file_schema = pa.schema([field for field in schema if field.name not in PARQUET_PARTITION_COLUMNS],
+                            metadata=schema.metadata)
+    processed = errors = buffered = 0
+    buffers = {}
+    writers = {'open': OrderedDict(), 'files': {}}
+    
+    def flush(values):
+        nonlocal buffered
+        buffered -= _flush_partition(values, buffers, writers, pa, pq, file_schema, output_dir)
+    
+    try:
+        for parsed, scored in iter_scored_batch(csv.DictReader(input_file), db, chunk_size, workers, simulate):
+            rows = []
+            errors += write_scored_chunk(parsed, scored, rows.append, parquet_result_row)
+            processed += len(parsed)
+            keys = [tuple(row.get(name) for name in PARQUET_PARTITION_COLUMNS) for row in rows]
+            table = pa.Table.from_pylist(rows, schema=schema).drop_columns(list(PARQUET_PARTITION_COLUMNS))
+            buffered += len(rows)
+            for values in _buffer_rows(table, keys, buffers, pa):
+                flush(values)
+            # Over the memory cap: write out the biggest partitions early
+            while buffered > PARQUET_MAX_BUFFERED_ROWS:
+                flush(max(buffers, key=lambda values: buffers[values]['rows']))
+        for values in list(buffers):
+            flush(values)
+    finally:
+        for writer in writers['open'].values():
+            writer.close()
+    return processed, errors
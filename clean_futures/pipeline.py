@@ -0,0 +1,238 @@
+"""
+Dependency-tracked results pipeline for the Clean Futures calculation core.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from .candidates import top_k_options
+from .calculators import calculate_dig_and_haul, calculate_onsite_remediation, calculate_surface_facility
+from .facilities import get_derived, get_facilities_database
+from .geo import (determine_state_county, find_nearest_cf_facility, find_nearest_qualified_landfill,
+                  get_regulatory_thresholds, get_soil_type)
+from .recommendation import canonical_analysis_key, generate_recommendation
+from .records import SiteResults
+from .roads import get_road_network
+
+# ============================================================================
+# RESULTS PIPELINE
+# ============================================================================
+# The results page is a graph of stages:
+#
+#   location -> soil_type, thresholds
+#   nearest_landfill -> dig_haul ----\
+#   onsite -------------------------- > scoring -> (presentation tables)
+#   nearest_facility -> surface -----/
+#   nearest_landfill -> candidates (top-k cheapest facilities per trucking option)
+#
+# Each stage names the analysis fields it reads and the stages it depends
+# on. Its key is a hash of those field values and its dependencies' keys, so
+# a key changes exactly when something upstream of the stage changed. Stages
+# that look facilities up by route also key on the installed road network's
+# fingerprint (None without one), so a new or edited graph file reruns them
+# and everything downstream. Stage
+# values are memoized by key in an LRU shared by all sessions (and dropped
+# with the facilities snapshot), so changing only the priorities reruns
+# scoring and whatever is built from it, and reuses everything else.
+#
+# Stage values are shared between sessions and must be treated as
+# read-only. Callers can add their own stages (the app adds its comparison
+# table, Excel report, fleet sweep and truck simulation) as long as they are
+# deterministic in their inputs and list every analysis field they read.
+
+PIPELINE_CACHE_SIZE = 2048
+
+# Inputs shared by the two trucking calculators
+_TRUCKING_INPUTS = ('volume_cy', 'site_lat', 'site_lon', 'needs_backfill', 'tph_level', 'chloride_level',
+                    'num_trucks', 'equipment_capacity_per_day', 'advanced_params')
+
+def pipeline_stage(inputs, deps, compute, uses_roads=False):
+    """
+    Describe one stage of a results pipeline.
+    
+    Args:
+        inputs: Analysis fields the stage reads
+        deps: Names of the stages whose values it needs
+        compute: Function (analysis, db, dep_values) -> value, where
+            dep_values maps each dependency name to its value
+        uses_roads: Whether the stage routes over the road network (its key
+            then includes the network fingerprint)
+    """
+    return {'inputs': tuple(inputs), 'deps': tuple(deps), 'compute': compute, 'uses_roads': uses_roads}
+
+def _dig_haul(analysis, db, deps):
+    if deps['nearest_landfill'] is None:
+        return None
+    return calculate_dig_and_haul(
+        analysis['volume_cy'], analysis['site_lat'], analysis['site_lon'], analysis['needs_backfill'],
+        analysis['tph_level'], analysis['chloride_level'], db,
+        num_trucks=analysis.get('num_trucks', 3),
+        equipment_capacity_per_day=analysis.get('equipment_capacity_per_day', 300),
+        landfill_has_backfill=analysis.get('landfill_has_backfill', False),
+        extra_backfill_minutes=analysis.get('extra_backfill_minutes', 0),
+        advanced_params=analysis['advanced_params'],
+        nearest_landfill=deps['nearest_landfill']
+    )
+
+def _surface(analysis, db, deps):
+    if deps['nearest_facility'] is None:
+        return None
+    return calculate_surface_facility(
+        analysis['volume_cy'], analysis['site_lat'], analysis['site_lon'], analysis['needs_backfill'],
+        analysis['tph_level'], analysis['chloride_level'], db,
+        num_trucks=analysis.get('num_trucks', 3),
+        equipment_capacity_per_day=analysis.get('equipment_capacity_per_day', 300),
+        advanced_params=analysis['advanced_params'],
+        nearest_facility=deps['nearest_facility']
+    )
+
+# Stages behind analyze_site and the location summary, in dependency order
+RESULTS_PIPELINE = {
+    'location': pipeline_stage(
+        ('site_lat', 'site_lon'), (),
+        lambda analysis, db, deps: determine_state_county(analysis['site_lat'], analysis['site_lon'], db)
+    ),
+    'soil_type': pipeline_stage(
+        ('site_lat', 'site_lon'), ('location',),
+        lambda analysis, db, deps: get_soil_type(analysis['site_lat'], analysis['site_lon'], deps['location'][0])
+    ),
+    'thresholds': pipeline_stage(
+        ('groundwater_depth',), ('location',),
+        lambda analysis, db, deps: get_regulatory_thresholds(deps['location'][0], analysis.get('groundwater_depth'))
+    ),
+    # needs_backfill does not change which landfill is nearest, so it is not an input
+    'nearest_landfill': pipeline_stage(
+        ('site_lat', 'site_lon', 'tph_level', 'chloride_level'), (),
+        lambda analysis, db, deps: find_nearest_qualified_landfill(
+            analysis['site_lat'], analysis['site_lon'], analysis['tph_level'],
+            analysis['chloride_level'], None, db
+        ),
+        uses_roads=True
+    ),
+    'nearest_facility': pipeline_stage(
+        ('site_lat', 'site_lon'), (),
+        lambda analysis, db, deps: find_nearest_cf_facility(analysis['site_lat'], analysis['site_lon'], db),
+        uses_roads=True
+    ),
+    'dig_haul': pipeline_stage(
+        _TRUCKING_INPUTS + ('landfill_has_backfill', 'extra_backfill_minutes'), ('nearest_landfill',), _dig_haul
+    ),
+    'onsite': pipeline_stage(
+        ('volume_cy', 'site_lat', 'site_lon', 'soil_permeability', 'tph_level', 'chloride_level', 'advanced_params'),
+        (),
+        lambda analysis, db, deps: calculate_onsite_remediation(
+            analysis['volume_cy'], analysis['site_lat'], analysis['site_lon'],
+            analysis.get('soil_permeability', 'medium'), analysis['tph_level'], analysis['chloride_level'],
+            analysis['advanced_params']
+        )
+    ),
+    'surface': pipeline_stage(_TRUCKING_INPUTS, ('nearest_facility',), _surface),
+    'candidates': pipeline_stage(
+        _TRUCKING_INPUTS + ('landfill_has_backfill', 'extra_backfill_minutes'), ('nearest_landfill',),
+        lambda analysis, db, deps: top_k_options(analysis, db, nearest_landfill=deps['nearest_landfill']),
+        uses_roads=True
+    ),
+    'scoring': pipeline_stage(
+        ('priorities',), ('dig_haul', 'onsite', 'surface'),
+        lambda analysis, db, deps: generate_recommendation(deps['dig_haul'], deps['onsite'], deps['surface'],
+                                                           analysis['priorities'])
+    )
+}
+
+def _new_pipeline_cache():
+    return {
+        'entries': OrderedDict(),
+        'max_size': PIPELINE_CACHE_SIZE,
+        'hits': 0,
+        'misses': 0,
+        'lock': threading.Lock()
+    }
+
+_MISSING = object()
+
+def run_pipeline(analysis, db, stages=RESULTS_PIPELINE, targets=None):
+    """
+    Evaluate pipeline stages, reusing memoized values whose inputs did not change.
+    
+    Args:
+        analysis: Dictionary in the same shape as st.session_state.analysis
+        db: Facilities database (its snapshot holds the memo)
+        stages: Stage name -> pipeline_stage (defaults to RESULTS_PIPELINE)
+        targets: Stage names to evaluate (default: all); their dependencies
+            are evaluated as needed
+    
+    Returns:
+        Tuple of (values, trace): stage name -> value, and one entry per
+        evaluated stage in evaluation order with 'stage', 'status'
+        ('reused' or 'computed'), 'key' (shortened) and 'ms'
+    """
+    cache = get_derived(db, 'pipeline_cache', _new_pipeline_cache)
+    network = get_road_network()
+    road_fingerprint = network['fingerprint'] if network is not None else None
+    values, keys, trace = {}, {}, []
+    
+    def evaluate(name):
+        if name in keys:
+            return
+        stage = stages[name]
+        for dep in stage['deps']:
+            evaluate(dep)
+        key_fields = {
+            'stage': name,
+            'inputs': {field: analysis[field] for field in stage['inputs'] if field in analysis},
+            'deps': [keys[dep] for dep in stage['deps']]
+        }
+        if stage.get('uses_roads'):
+            key_fields['roads'] = road_fingerprint
+        key = canonical_analysis_key(key_fields)
+    
+        started = time.perf_counter()
+        with cache['lock']:
+            value = cache['entries'].get(key, _MISSING)
+            if value is not _MISSING:
+                cache['entries'].move_to_end(key)
+                cache['hits'] += 1
+            else:
+                cache['misses'] += 1
+        status = 'reused'
+        if value is _MISSING:
+            status = 'computed'
+            value = stage['compute'](analysis, db, {dep: values[dep] for dep in stage['deps']})
+            with cache['lock']:
+                cache['entries'][key] = value
+                while len(cache['entries']) > cache['max_size']:
+                    cache['entries'].popitem(last=False)
+    
+        keys[name] = key
+        values[name] = value
+        trace.append({'stage': name, 'status': status, 'key': key[:12],
+                      'ms': (time.perf_counter() - started) * 1000})
+    
+    for name in (stages if targets is None else targets):
+        evaluate(name)
+    return values, trace
+
+def pipeline_cache_stats(db=None):
+    """Return stage hit/miss counts and size of the pipeline memo for a snapshot"""
+    if db is None:
+        db = get_facilities_database()
+    cache = get_derived(db, 'pipeline_cache', _new_pipeline_cache)
+    with cache['lock']:
+        return {
+            'hits': cache['hits'],
+            'misses': cache['misses'],
+            'size': len(cache['entries']),
+            'max_size': cache['max_size']
+        }
+
+def pipeline_results(values):
+    """analyze_site-shaped SiteResults record from RESULTS_PIPELINE values"""
+    recommended, scores = values['scoring']
+    return SiteResults(
+        dig_haul=values['dig_haul'],
+        onsite=values['onsite'],
+        surface=values['surface'],
+        recommended=recommended,
+        scores=scores
+    )
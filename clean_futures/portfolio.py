@@ -0,0 +1,156 @@
+"""
+Portfolio evaluation: score large site lists across a pool of worker processes.
+"""
+
+import itertools
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .batch import analyze_sites
+from .counties import get_county_raster
+from .distance_matrix import facility_coordinate_arrays
+from .facilities import freeze_facilities_database, get_facilities_database
+from .facility_raster import get_facility_raster
+from .roads import facility_road_trees, get_road_network
+
+# ============================================================================
+# PORTFOLIO EVALUATION (PROCESS POOL)
+# ============================================================================
+# Site chunks are scored in worker processes. Each worker receives the
+# facility records once, through its initializer, and maps the numeric
+# facility arrays (coordinates, acceptance limits, rates) from one shared
+# memory block published by the parent. Tasks carry only the site analyses,
+# and results are yielded in input order.
+
+# Sites per task sent to a worker
+PORTFOLIO_CHUNK_SIZE = 2000
+
+# Chunks kept in flight per worker, so input is read ahead without loading it all
+PORTFOLIO_PREFETCH = 2
+
+# Per-process state set up by _init_worker
+_WORKER = {}
+
+def publish_facility_arrays(db):
+    """
+    Copy the facility arrays of db into one shared memory block.
+    
+    Returns:
+        Tuple of (SharedMemory, layout), where layout lists
+        (array name, byte offset, length, dtype) per column; columns start
+        on 8-byte boundaries. The caller must close() and unlink() the block
+        when the pool is done.
+    """
+    arrays = facility_coordinate_arrays(db)
+    layout = []
+    offset = 0
+    for name, array in arrays.items():
+        layout.append((name, offset, array.size, array.dtype.str))
+        offset += -(-array.nbytes // 8) * 8  # next 8-byte boundary
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    
+    for name, start, size, dtype in layout:
+        np.ndarray((size,), dtype=dtype, buffer=shm.buf, offset=start)[:] = arrays[name]
+    
+    return shm, layout
+
+def attach_facility_arrays(name, layout):
+    """Map read-only facility arrays onto a shared memory block published by publish_facility_arrays"""
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = {}
+    for key, offset, size, dtype in layout:
+        array = np.ndarray((size,), dtype=dtype, buffer=shm.buf, offset=offset)
+        array.setflags(write=False)
+        arrays[key] = array
+    return shm, arrays
+
+def _plain_facilities_database(db):
+    """Copy a (possibly frozen) facilities database into picklable dicts and lists"""
+    return {
+        'landfills': [dict(lf) for lf in db['landfills']],
+        'clean_futures_facilities': [dict(cf) for cf in db['clean_futures_facilities']]
+    }
+
+def _init_worker(db, shm_name, layout):
+    """Worker initializer: build the facility snapshot once and attach the shared arrays"""
+    snapshot = freeze_facilities_database(db)
+    shm, arrays = attach_facility_arrays(shm_name, layout)
+    # Seed the snapshot's derived cache so the distance engine uses the shared block
+    snapshot['_derived']['coordinate_arrays'] = arrays
+    get_county_raster()
+    _WORKER['db'] = snapshot
+    _WORKER['shm'] = shm
+
+def _score_chunk(analyses, simulate=False):
+    """Worker task: score one chunk of analyses against the worker's snapshot"""
+    return analyze_sites(analyses, _WORKER['db'], simulate)
+
+def iter_scored_chunks(tagged_chunks, db=None, workers=None, simulate=False):
+    """
+    Score chunks of analyses in a process pool.
+    
+    Args:
+        tagged_chunks: Iterable of (tag, analyses) pairs. The tag stays in
+            this process and is handed back with the chunk's results.
+        db: Facilities database (defaults to the current snapshot)
+        workers: Number of worker processes (defaults to one per CPU core).
+            With a single worker the chunks are scored in this process.
+        simulate: Also run the truck-cycle simulation for each site
+    
+    Yields:
+        (tag, scored) pairs in input order, where scored is the
+        analyze_sites output for that chunk
+    """
+    if db is None:
+        db = get_facilities_database()
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    
+    if workers == 1:
+        for tag, analyses in tagged_chunks:
+            yield tag, analyze_sites(analyses, db, simulate)
+        return
+    
+    # Build or load the raster (and road trees) here first, so the workers only map the finished files
+    get_facility_raster(db)
+    network = get_road_network()
+    if network is not None:
+        facility_road_trees(db, network)
+    shm, layout = publish_facility_arrays(db)
+    try:
+        # spawn gives the same worker start-up on every platform and never
+        # forks a process that holds other threads' locks (e.g. inside Streamlit)
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(_plain_facilities_database(db), shm.name, layout)) as pool:
+            pending = deque()
+            for tag, analyses in tagged_chunks:
+                pending.append((tag, pool.submit(_score_chunk, analyses, simulate)))
+                if len(pending) >= workers * PORTFOLIO_PREFETCH:
+                    tag, future = pending.popleft()
+                    yield tag, future.result()
+            while pending:
+                tag, future = pending.popleft()
+                yield tag, future.result()
+    finally:
+        shm.close()
+        shm.unlink()
+
+def evaluate_portfolio(analyses, db=None, workers=None, chunk_size=PORTFOLIO_CHUNK_SIZE):
+    """
+    Score every analysis dictionary in a portfolio across a process pool.
+    
+    Yields one analyze_sites entry (a dict with 'results', 'state',
+    'county' and 'error') per analysis, in input order. The input is
+    consumed lazily, so it can be a generator over a large file.
+    """
+    analyses = iter(analyses)
+    chunks = iter(lambda: list(itertools.islice(analyses, chunk_size)), [])
+    for _, scored in iter_scored_chunks(((None, chunk) for chunk in chunks), db, workers):
+        yield from scored
@@ -0,0 +1,196 @@
+"""
+Recommendation scoring and full-site analysis for the Clean Futures calculation core.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+
+from .calculators import calculate_dig_and_haul, calculate_onsite_remediation, calculate_surface_facility
+from .records import SiteResults
+
+# ============================================================================
+# RECOMMENDATION
+# ============================================================================
+
+# (metric, priority, level) -> (weight, score when the minimum is not positive).
+# An alternative scores weight x (1 - its excess over the best alternative,
+# relative to the best); 'low' priorities add nothing.
+RECOMMENDATION_WEIGHTS = {
+    ('cost_per_cy', 'cost', 'high'): (40, 20), ('cost_per_cy', 'cost', 'medium'): (20, 10),
+    ('project_days', 'speed', 'high'): (30, 15), ('project_days', 'speed', 'medium'): (15, 7),
+    ('co2_tons', 'esg', 'high'): (30, 15), ('co2_tons', 'esg', 'medium'): (15, 7)
+}
+
+# Scored metrics, in the order their terms are added
+RECOMMENDATION_METRICS = (('cost_per_cy', 'cost'), ('project_days', 'speed'), ('co2_tons', 'esg'))
+
+# Options that treat the soil instead of burying it get a bonus at high ESG priority
+TREATMENT_OPTION_TYPES = ('onsite', 'surface')
+TREATMENT_BONUS = 10
+
+def rank_alternatives(alternatives, user_priorities):
+    """
+    Score and rank any number of alternatives in one vectorized pass.
+    
+    Each metric's minimum is taken once over all alternatives, so scoring is
+    linear in their number.
+    
+    Args:
+        alternatives: Sequence of (option_type, result) pairs, where
+            option_type is 'dig_haul', 'onsite' or 'surface' (several
+            alternatives may share one, e.g. one per candidate facility)
+            and result is a calculator result
+        user_priorities: Dictionary with 'cost', 'speed' and 'esg' levels
+    
+    Returns:
+        Tuple of (ranking, scores): alternative indexes from best to worst
+        (ties keep input order) and an array of scores
+    """
+    scores = np.zeros(len(alternatives))
+    if not len(alternatives):
+        return np.zeros(0, dtype=np.int64), scores
+    
+    for metric, priority in RECOMMENDATION_METRICS:
+        level = user_priorities.get(priority, 'medium')
+        if (metric, priority, level) not in RECOMMENDATION_WEIGHTS:
+            continue
+        weight, fallback = RECOMMENDATION_WEIGHTS[(metric, priority, level)]
+        values = np.array([result[metric] for _, result in alternatives], dtype=float)
+        minimum = values.min()
+        if minimum > 0:
+            scores += weight * (1 - (values - minimum) / minimum)
+        else:
+            scores += fallback
+        if priority == 'esg' and level == 'high':
+            is_treatment = np.array([opt_type in TREATMENT_OPTION_TYPES for opt_type, _ in alternatives])
+            scores += np.where(is_treatment, TREATMENT_BONUS, 0)
+    
+    # Stable sort on the negated scores keeps the first of equal scores on top
+    ranking = np.argsort(-scores, kind='stable')
+    return ranking, scores
+
+def generate_recommendation(dig_haul, onsite, surface_facility, user_priorities):
+    """Generate recommendation based on calculations and user priorities"""
+    
+    options = []
+    if dig_haul:
+        options.append(('dig_haul', dig_haul))
+    if onsite:
+        options.append(('onsite', onsite))
+    if surface_facility:
+        options.append(('surface', surface_facility))
+    
+    if not options:
+        return None
+    
+    # Score each option based on priorities
+    ranking, score_array = rank_alternatives(options, user_priorities)
+    scores = {opt_type: float(score) for (opt_type, _), score in zip(options, score_array)}
+    
+    # Find recommendation
+    recommended = options[ranking[0]][0]
+    
+    return recommended, scores
+
+def analyze_site(analysis, db, nearest_landfill=None, nearest_facility=None):
+    """
+    Run all three option calculators and the recommendation for one site.
+    
+    Args:
+        analysis: Dictionary in the same shape as st.session_state.analysis
+        db: Facilities database from get_facilities_database()
+        nearest_landfill: Optional precomputed find_nearest_qualified_landfill result
+        nearest_facility: Optional precomputed find_nearest_cf_facility result
+    
+    Returns:
+        SiteResults record with 'dig_haul', 'onsite', 'surface', 'recommended' and 'scores'
+    """
+    # Get truck and equipment params (with defaults for backward compatibility)
+    num_trucks = analysis.get('num_trucks', 3)
+    equipment_capacity_per_day = analysis.get('equipment_capacity_per_day', 300)
+    landfill_has_backfill = analysis.get('landfill_has_backfill', False)
+    extra_backfill_minutes = analysis.get('extra_backfill_minutes', 0)
+    
+    dig_haul = calculate_dig_and_haul(
+        analysis['volume_cy'],
+        analysis['site_lat'],
+        analysis['site_lon'],
+        analysis['needs_backfill'],
+        analysis['tph_level'],
+        analysis['chloride_level'],
+        db,
+        num_trucks=num_trucks,
+        equipment_capacity_per_day=equipment_capacity_per_day,
+        landfill_has_backfill=landfill_has_backfill,
+        extra_backfill_minutes=extra_backfill_minutes,
+        advanced_params=analysis['advanced_params'],
+        nearest_landfill=nearest_landfill
+    )
+    
+    onsite = calculate_onsite_remediation(
+        analysis['volume_cy'],
+        analysis['site_lat'],
+        analysis['site_lon'],
+        analysis.get('soil_permeability', 'medium'),
+        analysis['tph_level'],
+        analysis['chloride_level'],
+        analysis['advanced_params']
+    )
+    
+    surface = calculate_surface_facility(
+        analysis['volume_cy'],
+        analysis['site_lat'],
+        analysis['site_lon'],
+        analysis['needs_backfill'],
+        analysis['tph_level'],
+        analysis['chloride_level'],
+        db,
+        num_trucks=num_trucks,
+        equipment_capacity_per_day=equipment_capacity_per_day,
+        advanced_params=analysis['advanced_params'],
+        nearest_facility=nearest_facility
+    )
+    
+    # Generate recommendation
+    recommended, scores = generate_recommendation(dig_haul, onsite, surface, analysis['priorities'])
+    
+    return SiteResults(
+        dig_haul=dig_haul,
+        onsite=onsite,
+        surface=surface,
+        recommended=recommended,
+        scores=scores
+    )
+
+# ============================================================================
+# CACHE KEYS
+# ============================================================================
+# Results are memoized by a SHA-256 hash of the canonicalized inputs (see
+# pipeline.py), so reruns that do not change the inputs (opening an
+# expander, pressing a button) skip the calculators.
+
+# Decimal places kept when normalizing inputs for the cache key
+CACHE_KEY_COORD_DECIMALS = 6
+CACHE_KEY_FLOAT_DECIMALS = 9
+
+def _canonical_value(value, key=None):
+    """Normalize a value for hashing: sorted dicts, rounded floats, ints as floats"""
+    if isinstance(value, dict):
+        return {str(k): _canonical_value(v, k) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical_value(v) for v in value]
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        value = value.item()  # NumPy scalar -> Python scalar
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        decimals = CACHE_KEY_COORD_DECIMALS if key in ('site_lat', 'site_lon') else CACHE_KEY_FLOAT_DECIMALS
+        return round(float(value), decimals) + 0.0  # + 0.0 folds -0.0 into 0.0
+    return str(value)
+
+def canonical_analysis_key(analysis):
+    """Return the cache key (hex SHA-256) for an analysis dictionary"""
+    canonical = json.dumps(_canonical_value(analysis), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
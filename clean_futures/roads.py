@@ -0,0 +1,545 @@
+"""
+Offline road network routing for the Clean Futures calculation core.
+
+    python -m clean_futures.roads roads.geojson permian_roads.npz
+"""
+
+import argparse
+import functools
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from .distance_matrix import (facility_coordinate_arrays, facility_distance_matrix, haversine_distance_pairs,
+                              qualified_landfill_mask)
+from .facilities import DATA_DIR, facilities_cache_tag, get_derived
+from .geo import STRAIGHT_LINE_SPEED_MPH
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# ROAD NETWORK ROUTING
+# ============================================================================
+# Straight-line distance at 45 mph understates hauls where the roads wind
+# around playas, pipelines and ranch fences. When a road graph for the basin
+# is installed, trucking uses drive time and road miles instead.
+#
+# The graph is a compact CSR array file (permian_roads.npz) built offline
+# from an OpenStreetMap extract with the converter at the bottom of this
+# module; nothing is fetched over the network. Because there are only a few
+# dozen facilities, a shortest-path tree is grown from every landfill and
+# CF facility once (Dijkstra over the reversed graph), giving the drive time
+# and road miles from every node to every facility. A site query is then a
+# snap to the nearest node plus an array lookup; no search runs per query.
+#
+# The trees are cached beside the graph as a memory-mapped .npy file keyed
+# by the facilities file and a digest of the graph file and the facility
+# coordinates, so they are rebuilt only when either changes. The build runs
+# under its own derived-structure lock, and worker pools and the scoring
+# service run it before any site is scored. Sites or facilities further than
+# ROAD_SNAP_MAX_MILES from the network, and pairs the network does not
+# connect, fall back to straight-line miles at STRAIGHT_LINE_SPEED_MPH.
+
+# Graph file next to the app; CLEAN_FUTURES_ROAD_GRAPH overrides the location
+ROAD_GRAPH_FILENAME = "permian_roads.npz"
+
+# Speed on the off-network leg between a site or facility and its snapped node
+ROAD_ACCESS_SPEED_MPH = 15
+
+# Sites further than this from every node are routed in a straight line
+ROAD_SNAP_MAX_MILES = 5.0
+
+# Cell size of the snap grid
+ROAD_SNAP_CELL_DEG = 0.02
+
+# Sites snapped per block (bounds the candidate arrays)
+ROAD_SNAP_CHUNK = 2048
+
+# Free-flow speeds by OSM highway class when a way has no usable maxspeed
+ROAD_CLASS_SPEEDS_MPH = {
+    'motorway': 65, 'motorway_link': 45, 'trunk': 60, 'trunk_link': 40,
+    'primary': 55, 'primary_link': 35, 'secondary': 50, 'secondary_link': 35,
+    'tertiary': 45, 'tertiary_link': 30, 'unclassified': 35, 'residential': 30,
+    'service': 20, 'track': 15
+}
+ROAD_DEFAULT_SPEED_MPH = 25
+
+# Permissions of the cached trees file
+ROAD_TREES_FILE_MODE = 0o644
+
+# Record lists routed to, in tree column order
+ROAD_FACILITY_KINDS = ('landfills', 'clean_futures_facilities')
+
+_MILES_PER_DEG = 3959 * math.pi / 180
+
+def road_graph_path():
+    """Return the path of the road graph file"""
+    override = os.environ.get('CLEAN_FUTURES_ROAD_GRAPH')
+    if override:
+        return Path(override)
+    return DATA_DIR / ROAD_GRAPH_FILENAME
+
+# ============================================================================
+# GRAPH FILE
+# ============================================================================
+
+def build_road_graph(node_lats, node_lons, tails, heads, miles, hours):
+    """
+    Build a CSR road graph from directed edge lists.
+    
+    Args:
+        node_lats, node_lons: Node coordinates
+        tails, heads: Node indexes of each directed edge
+        miles, hours: Length and free-flow drive time of each edge
+    
+    Returns:
+        Dictionary of arrays: 'node_lat', 'node_lon', 'indptr' (edges of
+        node i are indptr[i]:indptr[i+1]), 'indices' (head nodes), 'miles'
+        and 'hours'
+    """
+    tails = np.asarray(tails, dtype=np.int64)
+    order = np.argsort(tails, kind='stable')
+    n_nodes = len(node_lats)
+    return {
+        'node_lat': np.asarray(node_lats, dtype=float),
+        'node_lon': np.asarray(node_lons, dtype=float),
+        'indptr': np.r_[0, np.cumsum(np.bincount(tails, minlength=n_nodes))].astype(np.int64),
+        'indices': np.asarray(heads, dtype=np.int32)[order],
+        'miles': np.asarray(miles, dtype=np.float32)[order],
+        'hours': np.asarray(hours, dtype=np.float32)[order]
+    }
+
+def save_road_graph(graph, path):
+    """Write a road graph to an .npz file"""
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **graph)
+
+def load_road_graph(path):
+    """Read a road graph written by save_road_graph"""
+    with np.load(path) as data:
+        graph = {name: data[name] for name in ('node_lat', 'node_lon', 'indptr', 'indices', 'miles', 'hours')}
+    if len(graph['indptr']) != len(graph['node_lat']) + 1:
+        raise ValueError(f"{path}: indptr does not match the node count")
+    for array in graph.values():
+        array.setflags(write=False)
+    return graph
+
+@functools.lru_cache(maxsize=1)
+def _cached_road_network(path, mtime_ns, size):
+    """Load the graph and its snap grid (keyed by file identity so edits reload)"""
+    graph = load_road_graph(path)
+    return dict(graph, path=path, fingerprint=f"{Path(path).name}:{size}:{mtime_ns}",
+                snap_grid=build_snap_grid(graph['node_lat'], graph['node_lon']))
+
+def get_road_network(path=None):
+    """
+    Return the installed road network, or None when there is no graph file.
+    
+    The graph is loaded once per process and again only when the file changes.
+    """
+    path = str(path or road_graph_path())
+    try:
+        # Checked on every lookup, so a plain os.stat rather than Path.stat
+        stat = os.stat(path)
+    except OSError:
+        return None
+    try:
+        return _cached_road_network(path, stat.st_mtime_ns, stat.st_size)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Road graph %s could not be loaded; using straight-line distances: %s", Path(path).name, e)
+        return None
+
+# ============================================================================
+# SNAPPING
+# ============================================================================
+# Nodes are bucketed into a lat/lon grid sorted by cell. Every node within
+# ROAD_SNAP_MAX_MILES of a site lies in the block of cells around the site's
+# cell, so one gather over that block finds the nearest node exactly.
+
+def build_snap_grid(node_lats, node_lons, cell_deg=ROAD_SNAP_CELL_DEG):
+    """Bucket node positions into a grid of cell_deg cells"""
+    lat_min, lon_min = float(node_lats.min()), float(node_lons.min())
+    n_rows = int((node_lats.max() - lat_min) / cell_deg) + 1
+    n_cols = int((node_lons.max() - lon_min) / cell_deg) + 1
+    cells = ((node_lats - lat_min) / cell_deg).astype(np.int64) * n_cols + ((node_lons - lon_min) / cell_deg).astype(np.int64)
+    order = np.argsort(cells, kind='stable')
+    # Smallest east-west cell width anywhere in the grid bounds the block radius
+    max_abs_lat = max(abs(lat_min), abs(lat_min + n_rows * cell_deg))
+    cell_miles = cell_deg * _MILES_PER_DEG * math.cos(math.radians(max_abs_lat)) * 0.99
+    return {
+        'lat_min': lat_min, 'lon_min': lon_min, 'cell_deg': cell_deg,
+        'n_rows': n_rows, 'n_cols': n_cols,
+        'order': order,
+        'cell_start': np.searchsorted(cells[order], np.arange(n_rows * n_cols + 1)),
+        'radius': max(1, math.ceil(ROAD_SNAP_MAX_MILES / cell_miles))
+    }
+
+def snap_to_network(lats, lons, network):
+    """
+    Snap coordinates to their nearest road node.
+    
+    Returns:
+        Tuple of (nodes, miles): node index (-1 when no node is within
+        ROAD_SNAP_MAX_MILES) and straight-line miles to it
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    grid = network['snap_grid']
+    radius = grid['radius']
+    offsets = np.arange(-radius, radius + 1)
+    d_row, d_col = (axis.ravel() for axis in np.meshgrid(offsets, offsets, indexing='ij'))
+    
+    nodes = np.full(len(lats), -1, dtype=np.int64)
+    snap_miles = np.full(len(lats), np.inf)
+    for start in range(0, len(lats), ROAD_SNAP_CHUNK):
+        stop = min(start + ROAD_SNAP_CHUNK, len(lats))
+        rows = np.floor((lats[start:stop] - grid['lat_min']) / grid['cell_deg']).astype(np.int64)[:, None] + d_row
+        cols = np.floor((lons[start:stop] - grid['lon_min']) / grid['cell_deg']).astype(np.int64)[:, None] + d_col
+        valid = (rows >= 0) & (rows < grid['n_rows']) & (cols >= 0) & (cols < grid['n_cols'])
+        cells = np.where(valid, rows * grid['n_cols'] + cols, 0)
+        first = np.where(valid, grid['cell_start'][cells], 0).ravel()
+        counts = np.where(valid, grid['cell_start'][cells + 1], 0).ravel() - first
+        if not counts.sum():
+            continue
+    
+        # Expand (site, cell) pairs into (site, candidate node) pairs
+        site = np.repeat(np.arange(stop - start), counts.reshape(stop - start, -1).sum(axis=1))
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidate = grid['order'][np.repeat(first, counts) + within]
+        dist = haversine_distance_pairs(lats[start + site], lons[start + site],
+                                        network['node_lat'][candidate], network['node_lon'][candidate])
+    
+        # Nearest candidate per site: first row of each site after sorting by distance
+        order = np.lexsort((candidate, dist, site))
+        best = order[np.r_[True, site[order][1:] != site[order][:-1]]]
+        close = dist[best] <= ROAD_SNAP_MAX_MILES
+        nodes[start + site[best[close]]] = candidate[best[close]]
+        snap_miles[start + site[best[close]]] = dist[best[close]]
+    return nodes, snap_miles
+
+# ============================================================================
+# SHORTEST-PATH TREES
+# ============================================================================
+
+def _reverse_adjacency(network):
+    """Incoming edges per node as plain lists (Dijkstra runs in pure Python)"""
+    indptr = network['indptr']
+    tails = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.argsort(network['indices'], kind='stable')
+    rev_indptr = np.searchsorted(network['indices'][order], np.arange(len(indptr)))
+    return (rev_indptr.tolist(), tails[order].tolist(),
+            network['hours'][order].astype(float).tolist(), network['miles'][order].astype(float).tolist())
+
+def _shortest_path_tree(target, adjacency, n_nodes):
+    """Drive hours and road miles from every node to target along the fastest path"""
+    rev_indptr, sources, edge_hours, edge_miles = adjacency
+    hours = [math.inf] * n_nodes
+    miles = [math.inf] * n_nodes
+    hours[target] = 0.0
+    miles[target] = 0.0
+    heap = [(0.0, target)]
+    while heap:
+        h, node = heapq.heappop(heap)
+        if h > hours[node]:
+            continue
+        m = miles[node]
+        for e in range(rev_indptr[node], rev_indptr[node + 1]):
+            tail = sources[e]
+            candidate = h + edge_hours[e]
+            if candidate < hours[tail]:
+                hours[tail] = candidate
+                miles[tail] = m + edge_miles[e]
+                heapq.heappush(heap, (candidate, tail))
+    return hours, miles
+
+def build_facility_trees(network, db):
+    """
+    Grow a shortest-path tree from every landfill and CF facility.
+    
+    The off-network leg from each facility's snapped node to its gate is
+    included. Unreachable entries are inf.
+    
+    Returns:
+        Array of shape (2, n_nodes, n_landfills + n_cf): drive hours, then road miles
+    """
+    n_nodes = len(network['node_lat'])
+    facilities = [record for kind in ROAD_FACILITY_KINDS for record in db[kind]]
+    trees = np.full((2, n_nodes, len(facilities)), np.inf, dtype=np.float32)
+    if not facilities:
+        return trees
+    
+    nodes, access_miles = snap_to_network([f['latitude'] for f in facilities],
+                                          [f['longitude'] for f in facilities], network)
+    adjacency = _reverse_adjacency(network)
+    for column, (node, access) in enumerate(zip(nodes.tolist(), access_miles.tolist())):
+        if node < 0:
+            continue
+        hours, miles = _shortest_path_tree(node, adjacency, n_nodes)
+        trees[0, :, column] = np.asarray(hours) + access / ROAD_ACCESS_SPEED_MPH
+        trees[1, :, column] = np.asarray(miles) + access
+    return trees
+
+def _trees_cache_path(network, db):
+    """Cache file for the trees of this graph file and these facility positions"""
+    key = repr((network['fingerprint'], ROAD_ACCESS_SPEED_MPH, ROAD_SNAP_MAX_MILES,
+                [[(r['latitude'], r['longitude']) for r in db[kind]] for kind in ROAD_FACILITY_KINDS]))
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    graph_path = Path(network['path'])
+    return graph_path.with_name(f"{graph_path.stem}.trees-{facilities_cache_tag()}-{digest}.npy")
+
+def _load_or_build_trees(network, db):
+    """Memory-map cached trees, or build them and write the cache"""
+    cache = _trees_cache_path(network, db)
+    expected = (2, len(network['node_lat']), sum(len(db[kind]) for kind in ROAD_FACILITY_KINDS))
+    try:
+        trees = np.load(cache, mmap_mode='r')
+        if trees.dtype == np.float32 and trees.shape == expected:
+            return trees
+        logger.warning("Road trees %s do not match the graph and facilities; rebuilding", cache.name)
+    except (OSError, ValueError):
+        pass
+    
+    logger.info("Building road shortest-path trees for %s", Path(network['path']).name)
+    trees = build_facility_trees(network, db)
+    trees.setflags(write=False)
+    # Each builder writes its own temp file, so concurrent builds never share one
+    partial = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=cache.parent, prefix=f"{cache.stem}-", suffix='.tmp',
+                                         delete=False) as f:
+            partial = f.name
+            np.save(f, trees)
+        # NamedTemporaryFile creates the file 0600; other users' processes map the cache too
+        os.chmod(partial, ROAD_TREES_FILE_MODE)
+        os.replace(partial, cache)
+    except OSError as e:
+        logger.warning("Road trees could not be cached (%s); keeping them in memory", e)
+        if partial is not None:
+            try:
+                os.unlink(partial)
+            except OSError:
+                pass
+        return trees
+    
+    # Trees for earlier graph or facility versions of this facilities file are no longer needed
+    for stale in cache.parent.glob(f"{Path(network['path']).stem}.trees-{facilities_cache_tag()}-*.npy"):
+        if stale != cache:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+    return trees
+
+def facility_road_trees(db, network):
+    """Return the facility shortest-path trees for a network, built once per db"""
+    return get_derived(db, ('road_trees', network['fingerprint']),
+                       lambda: _load_or_build_trees(network, db))
+
+# ============================================================================
+# ROUTE LOOKUPS
+# ============================================================================
+
+def road_routes(site_lats, site_lons, kind, db, network):
+    """
+    Road miles and drive hours from every site to every facility of one kind.
+    
+    Args:
+        kind: 'landfills' or 'clean_futures_facilities'
+    
+    Returns:
+        Tuple of (miles, hours) arrays of shape (n_sites, n_facilities)
+    """
+    site_lats = np.atleast_1d(np.asarray(site_lats, dtype=float))
+    site_lons = np.atleast_1d(np.asarray(site_lons, dtype=float))
+    coords = facility_coordinate_arrays(db)
+    straight = facility_distance_matrix(site_lats, site_lons, coords, kind)
+    
+    n_landfills = len(db['landfills'])
+    columns = slice(0, n_landfills) if kind == 'landfills' else slice(n_landfills, None)
+    nodes, access = snap_to_network(site_lats, site_lons, network)
+    trees = facility_road_trees(db, network)
+    snapped = nodes >= 0
+    hours = np.full(straight.shape, np.inf)
+    miles = np.full(straight.shape, np.inf)
+    hours[snapped] = trees[0, nodes[snapped], columns] + (access[snapped] / ROAD_ACCESS_SPEED_MPH)[:, None]
+    miles[snapped] = trees[1, nodes[snapped], columns] + access[snapped][:, None]
+    
+    unrouted = ~np.isfinite(hours)
+    miles[unrouted] = straight[unrouted]
+    hours[unrouted] = straight[unrouted] / STRAIGHT_LINE_SPEED_MPH
+    return miles, hours
+
+def _fastest(miles, hours, allowed=None):
+    """Index, miles and hours of the quickest allowed facility per site (-1 / nan when none)"""
+    if allowed is not None:
+        hours = np.where(allowed, hours, np.inf)
+    n_sites = hours.shape[0]
+    if not hours.shape[1]:
+        return np.full(n_sites, -1, dtype=np.int64), np.full(n_sites, np.nan), np.full(n_sites, np.nan)
+    best = np.argmin(hours, axis=1)
+    rows = np.arange(n_sites)
+    found = np.isfinite(hours[rows, best])
+    return (np.where(found, best, -1), np.where(found, miles[rows, best], np.nan),
+            np.where(found, hours[rows, best], np.nan))
+
+def nearest_facilities_by_road(site_lats, site_lons, tph_levels, chloride_levels, db, network):
+    """
+    Road counterpart of nearest_facilities_batch: quickest drive instead of nearest.
+    
+    Returns:
+        Dictionary of arrays: 'landfill_index' (-1 when no landfill
+        qualifies), 'landfill_distance' (road miles), 'landfill_hours',
+        'cf_index', 'cf_distance' and 'cf_hours'
+    """
+    coords = facility_coordinate_arrays(db)
+    allowed = qualified_landfill_mask(tph_levels, chloride_levels, coords)
+    landfill = _fastest(*road_routes(site_lats, site_lons, 'landfills', db, network), allowed)
+    cf = _fastest(*road_routes(site_lats, site_lons, 'clean_futures_facilities', db, network))
+    return {
+        'landfill_index': landfill[0],
+        'landfill_distance': landfill[1],
+        'landfill_hours': landfill[2],
+        'cf_index': cf[0],
+        'cf_distance': cf[1],
+        'cf_hours': cf[2]
+    }
+
+def nearest_by_road(lat, lon, kind, db, network, tph_level=None, chloride_level=None):
+    """
+    Quickest facility of one kind by road for a single site.
+    
+    Landfills are limited to those accepting tph_level and chloride_level.
+    
+    Returns:
+        Tuple of (record, road miles, drive hours), or (None, None, None)
+    """
+    allowed = None
+    if kind == 'landfills':
+        allowed = qualified_landfill_mask([tph_level], [chloride_level], facility_coordinate_arrays(db))
+    index, miles, hours = _fastest(*road_routes([lat], [lon], kind, db, network), allowed)
+    if index[0] < 0:
+        return None, None, None
+    return db[kind][index[0]], float(miles[0]), float(hours[0])
+
+# ============================================================================
+# OSM CONVERTER
+# ============================================================================
+# Converts a GeoJSON export of OSM ways (LineString/MultiLineString features
+# with 'highway', optional 'maxspeed' and 'oneway' properties, e.g. from
+# osmium export or ogr2ogr) into the CSR graph file. Vertices are matched
+# by coordinates rounded to 1e-6°. Only way endpoints and vertices shared
+# by several ways become graph nodes; the shape points in between are folded
+# into the edge lengths, which keeps the file and the trees small.
+
+def _way_speed_mph(properties):
+    """Free-flow speed of a way from maxspeed or its highway class"""
+    maxspeed = str(properties.get('maxspeed') or '').strip().lower()
+    number = maxspeed.split()[0] if maxspeed else ''
+    try:
+        speed = float(number)
+    except ValueError:
+        speed = 0.0
+    if speed > 0:
+        return speed if 'mph' in maxspeed else speed * 0.621371
+    return ROAD_CLASS_SPEEDS_MPH.get(properties.get('highway'), ROAD_DEFAULT_SPEED_MPH)
+
+def _way_lines(geometry):
+    """Coordinate lists of a LineString or MultiLineString"""
+    if geometry is None:
+        return []
+    if geometry['type'] == 'LineString':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiLineString':
+        return geometry['coordinates']
+    return []
+
+def convert_geojson_roads(path):
+    """
+    Build a road graph from a GeoJSON file of OSM ways.
+    
+    Returns:
+        Graph dictionary as from build_road_graph
+    """
+    with open(path, encoding='utf-8') as f:
+        features = json.load(f)['features']
+    
+    ways = []
+    for feature in features:
+        properties = feature.get('properties') or {}
+        if not properties.get('highway'):
+            continue
+        speed = _way_speed_mph(properties)
+        oneway = str(properties.get('oneway', 'no')).lower()
+        for line in _way_lines(feature.get('geometry')):
+            points = [(round(lat, 6), round(lon, 6)) for lon, lat, *_ in line]
+            if len(points) >= 2:
+                ways.append((points, speed, oneway))
+    
+    # Graph nodes: way endpoints and vertices used more than once
+    uses = {}
+    for points, _, _ in ways:
+        for point in points:
+            uses[point] = uses.get(point, 0) + 1
+    node_ids = {}
+    for points, _, _ in ways:
+        for i, point in enumerate(points):
+            if point not in node_ids and (i == 0 or i == len(points) - 1 or uses[point] > 1):
+                node_ids[point] = len(node_ids)
+    
+    tails, heads, edge_miles, edge_hours = [], [], [], []
+    for points, speed, oneway in ways:
+        if oneway == '-1':
+            points = points[::-1]
+        lats = np.array([p[0] for p in points])
+        lons = np.array([p[1] for p in points])
+        segment = haversine_distance_pairs(lats[:-1], lons[:-1], lats[1:], lons[1:])
+        run_start, length = 0, 0.0
+        for i in range(1, len(points)):
+            length += segment[i - 1]
+            if points[i] not in node_ids:
+                continue
+            a, b = node_ids[points[run_start]], node_ids[points[i]]
+            if a != b:
+                tails.append(a)
+                heads.append(b)
+                edge_miles.append(length)
+                edge_hours.append(length / speed)
+                if oneway not in ('yes', 'true', '1', '-1'):
+                    tails.append(b)
+                    heads.append(a)
+                    edge_miles.append(length)
+                    edge_hours.append(length / speed)
+            run_start, length = i, 0.0
+    
+    coordinates = sorted(node_ids, key=node_ids.get)
+    return build_road_graph([p[0] for p in coordinates], [p[1] for p in coordinates],
+                            tails, heads, edge_miles, edge_hours)
+
+def main(argv=None):
+    """Command-line entry point for the OSM converter"""
+    parser = argparse.ArgumentParser(
+        prog='python -m clean_futures.roads',
+        description='Convert a GeoJSON export of OSM roads into the Clean Futures road graph file.'
+    )
+    parser.add_argument('input', help='GeoJSON file of OSM ways (highway, maxspeed, oneway properties)')
+    parser.add_argument('output', nargs='?', default=None,
+                        help=f'Graph file to write (default: {ROAD_GRAPH_FILENAME} next to the app)')
+    args = parser.parse_args(argv)
+    
+    graph = convert_geojson_roads(args.input)
+    output = Path(args.output) if args.output else road_graph_path()
+    save_road_graph(graph, output)
+    print(f"Wrote {len(graph['node_lat'])} nodes and {len(graph['indices'])} edges to {output}",
+          file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""
+Local HTTP scoring service: real-time quotes without the Streamlit UI.
+
+    python -m clean_futures.service --port 8765
+    
+    POST /score   body: JSON object with the st.session_state.analysis fields
+    GET  /health
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+
+from .batch import analyze_sites
+from .counties import get_county_raster
+from .distance_matrix import facility_coordinate_arrays
+from .facilities import get_facilities_database
+from .facility_raster import get_facility_raster
+from .roads import facility_road_trees, get_road_network
+
+# ============================================================================
+# HTTP SCORING SERVICE
+# ============================================================================
+# Requests are parsed on the event loop and queued. A single batching task
+# takes the first waiting request, keeps collecting for up to
+# SERVICE_BATCH_WINDOW_MS (or until SERVICE_MAX_BATCH requests are waiting),
+# then scores the whole batch with one analyze_sites call in a worker thread.
+# While a batch is being scored, new requests queue up and form the next
+# batch, so a burst is absorbed in a few large passes instead of many small
+# ones and the event loop never blocks on the calculators.
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+
+# How long the batcher waits for more requests after the first one arrives
+SERVICE_BATCH_WINDOW_MS = 5
+
+# Upper bound on requests scored together in one pass
+SERVICE_MAX_BATCH = 256
+
+# Largest request body accepted, in bytes
+SERVICE_MAX_BODY = 1 << 20
+
+# Seconds an idle keep-alive connection is held open
+SERVICE_IDLE_TIMEOUT = 30
+
+# Most header lines accepted per request
+SERVICE_MAX_HEADERS = 100
+
+# Accepted values for each priority and for soil_permeability
+PRIORITY_LEVELS = ('low', 'medium', 'high')
+
+# Advanced parameters that count, size or rate equipment and must be greater
+# than zero; the other (per-CY and lump-sum costs) may be zero
+ADVANCED_POSITIVE_PARAMS = ('truck_capacity_cy', 'num_trucks', 'truck_hourly_rate', 'excavator_rate',
+                            'loader_rate', 'work_hours_per_day', 'excavator_capacity_cy_hr',
+                            'loader_capacity_cy_hr', 'num_excavators', 'num_loaders')
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                411: 'Length Required', 413: 'Payload Too Large', 414: 'URI Too Long',
+                431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}
+
+def _request_number(payload, key, default=None, positive=False, non_negative=False, name=None):
+    """
+    Read a finite number from a request payload, falling back to default.
+    
+    positive also rejects values <= 0 and non_negative values < 0; name
+    is the field name used in error messages (default key).
+    """
+    name = name or key
+    value = payload.get(key, default)
+    if value is None:
+        raise ValueError(f"Missing required field: {name}")
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"Field {name} must be a finite number")
+    if positive and value <= 0:
+        raise ValueError(f"Field {name} must be greater than zero")
+    if non_negative and value < 0:
+        raise ValueError(f"Field {name} must not be negative")
+    return value
+
+def analysis_from_request(payload):
+    """
+    Build an analysis dictionary from a /score request body.
+    
+    Accepts the same fields as st.session_state.analysis. site_lat,
+    site_lon and volume_cy are required; everything else falls back to the
+    Simple Mode defaults. Raises ValueError (a 400 response) for missing or
+    out-of-range values.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Request body must be a JSON object")
+    
+    needs_backfill = payload.get('needs_backfill', True)
+    landfill_has_backfill = payload.get('landfill_has_backfill', False)
+    if not isinstance(needs_backfill, bool) or not isinstance(landfill_has_backfill, bool):
+        raise ValueError("needs_backfill and landfill_has_backfill must be true or false")
+    
+    priorities = payload.get('priorities') or {}
+    if not isinstance(priorities, dict):
+        raise ValueError("priorities must be an object")
+    priorities = {key: priorities.get(key, 'medium') for key in ('cost', 'speed', 'esg')}
+    for key, level in priorities.items():
+        if level not in PRIORITY_LEVELS:
+            raise ValueError(f"priorities.{key} must be one of {', '.join(PRIORITY_LEVELS)}")
+    
+    advanced_params = payload.get('advanced_params')
+    if advanced_params is not None:
+        if not isinstance(advanced_params, dict):
+            raise ValueError("advanced_params must be an object or null")
+        for key in advanced_params:
+            _request_number(advanced_params, key, positive=key in ADVANCED_POSITIVE_PARAMS, non_negative=True,
+                            name=f"advanced_params.{key}")
+    
+    soil_permeability = payload.get('soil_permeability', 'medium')
+    if soil_permeability not in PRIORITY_LEVELS:
+        raise ValueError(f"soil_permeability must be one of {', '.join(PRIORITY_LEVELS)}")
+    
+    return {
+        'site_lat': _request_number(payload, 'site_lat'),
+        'site_lon': _request_number(payload, 'site_lon'),
+        'groundwater_depth': payload.get('groundwater_depth'),
+        'tph_level': _request_number(payload, 'tph_level', 0),
+        'chloride_level': _request_number(payload, 'chloride_level', 0),
+        'volume_cy': _request_number(payload, 'volume_cy', positive=True),
+        'needs_backfill': needs_backfill,
+        'landfill_has_backfill': landfill_has_backfill if needs_backfill else False,
+        'extra_backfill_minutes': _request_number(payload, 'extra_backfill_minutes', 0, non_negative=True),
+        'num_trucks': _request_number(payload, 'num_trucks', 3, positive=True),
+        'equipment_capacity_per_day': _request_number(payload, 'equipment_capacity_per_day', 300, positive=True),
+        'priorities': priorities,
+        'advanced_params': advanced_params,
+        'soil_permeability': soil_permeability
+    }
+
+async def _batch_scorer(queue, window_ms, max_batch):
+    """Collect queued (analysis, future) pairs into micro-batches and score them"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + window_ms / 1000
+        while len(batch) < max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Requests that queued while the previous batch ran join without waiting
+        while len(batch) < max_batch and not queue.empty():
+            batch.append(queue.get_nowait())
+    
+        analyses = [analysis for analysis, _ in batch]
+        try:
+            # Current snapshot per batch, so facility edits are picked up by the hot reload
+            scored = await loop.run_in_executor(None, analyze_sites, analyses, get_facilities_database())
+        except Exception as e:  # keep the service alive; fail only this batch
+            scored = [{'results': None, 'error': f"Scoring failed: {e}", 'status': 500}] * len(batch)
+    
+        for (_, future), site in zip(batch, scored):
+            if not future.cancelled():
+                future.set_result(site)
+
+def _score_response(site):
+    """Build the (status, body) response for one scored site"""
+    if site.get('error') is not None:
+        return site.get('status', 400), {'error': site['error']}
+    results = site['results']
+    return 200, {
+        'state': site['state'],
+        'county': site['county'],
+        'dig_haul': results['dig_haul'],
+        'onsite': results['onsite'],
+        'surface': results['surface'],
+        'recommended': results['recommended'],
+        'scores': results['scores']
+    }
+
+async def _handle_request(state, method, path, body):
+    """Route one parsed HTTP request; returns (status, JSON-serializable body)"""
+    if path == '/health':
+        if method != 'GET':
+            return 405, {'error': "Use GET /health"}
+        return 200, {'status': 'ok', 'queued': state['queue'].qsize(), 'scored': state['scored']}
+    
+    if path != '/score':
+        return 404, {'error': f"Unknown path: {path}"}
+    if method != 'POST':
+        return 405, {'error': "Use POST /score"}
+    
+    try:
+        analysis = analysis_from_request(json.loads(body or b'null'))
+    except (ValueError, UnicodeDecodeError) as e:
+        return 400, {'error': str(e)}
+    
+    future = asyncio.get_running_loop().create_future()
+    await state['queue'].put((analysis, future))
+    site = await future
+    state['scored'] += 1
+    return _score_response(site)
+
+async def _write_response(writer, status, payload, keep_alive):
+    """Send one JSON response"""
+    data = json.dumps(payload, default=dict).encode('utf-8')
+    writer.write(
+        f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+    )
+    await writer.drain()
+
+async def _read_headers(reader):
+    """Header name -> value until the blank line; None when there are too many"""
+    headers = {}
+    for _ in range(SERVICE_MAX_HEADERS + 1):
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return headers
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return None
+
+async def _handle_connection(state, reader, writer):
+    """Serve HTTP/1.1 requests on one connection until it closes"""
+    try:
+        while True:
+            try:
+                request_line = await asyncio.wait_for(reader.readline(), SERVICE_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                break
+            except (asyncio.LimitOverrunError, ValueError):
+                # readline reports a line longer than the stream limit as ValueError
+                await _write_response(writer, 414, {'error': "Request line too long"}, False)
+                break
+            if not request_line:
+                break
+            parts = request_line.decode('latin-1').split()
+            if len(parts) != 3:
+                await _write_response(writer, 400, {'error': "Malformed request line"}, False)
+                break
+            method, path, version = parts
+    
+            try:
+                headers = await _read_headers(reader)
+            except (asyncio.LimitOverrunError, ValueError):
+                headers = None
+            if headers is None:
+                await _write_response(writer, 431, {'error': "Request headers too large"}, False)
+                break
+    
+            keep_alive = (headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1')
+            length = headers.get('content-length')
+            if method == 'POST' and length is None:
+                status, payload = 411, {'error': "Content-Length required"}
+                keep_alive = False
+            elif length is not None and (not length.isdigit() or int(length) > SERVICE_MAX_BODY):
+                status, payload = 413, {'error': f"Body must be at most {SERVICE_MAX_BODY} bytes"}
+                keep_alive = False
+            else:
+                body = await reader.readexactly(int(length)) if length else b''
+                status, payload = await _handle_request(state, method, path.split('?', 1)[0], body)
+    
+            await _write_response(writer, status, payload, keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+def _warm_up():
+    """Build the lookup structures the first batch would otherwise pay for"""
+    get_county_raster()
+    db = get_facilities_database()
+    facility_coordinate_arrays(db)
+    get_facility_raster(db)
+    network = get_road_network()
+    if network is not None:
+        facility_road_trees(db, network)
+
+async def serve(host=SERVICE_HOST, port=SERVICE_PORT, window_ms=SERVICE_BATCH_WINDOW_MS,
+                max_batch=SERVICE_MAX_BATCH, ready=None):
+    """
+    Run the scoring service until cancelled.
+    
+    Args:
+        ready: Optional callback called with the bound (host, port) once
+            the server is listening (port 0 picks a free port)
+    """
+    # Build the facility arrays and rasters (and road trees) before accepting
+    # connections, so no batch ever builds them while another is waiting
+    await asyncio.get_running_loop().run_in_executor(None, _warm_up)
+    state = {'queue': asyncio.Queue(), 'scored': 0}
+    scorer = asyncio.create_task(_batch_scorer(state['queue'], window_ms, max_batch))
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_connection(state, reader, writer), host, port
+    )
+    if ready is not None:
+        ready(server.sockets[0].getsockname()[:2])
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        scorer.cancel()
+
+def service_main(argv=None):
+    """Command-line entry point for the local HTTP scoring service"""
+    parser = argparse.ArgumentParser(
+        prog="python -m clean_futures.service",
+        description="Serve POST /score quotes for single sites over local HTTP."
+    )
+    parser.add_argument('--host', default=SERVICE_HOST, help=f"Bind address (default {SERVICE_HOST})")
+    parser.add_argument('--port', type=int, default=SERVICE_PORT, help=f"Port (default {SERVICE_PORT})")
+    parser.add_argument('--batch-window-ms', type=float, default=SERVICE_BATCH_WINDOW_MS,
+                        help="How long to collect concurrent requests into one batch")
+    parser.add_argument('--max-batch', type=int, default=SERVICE_MAX_BATCH,
+                        help="Most requests scored together in one pass")
+    args = parser.parse_args(argv)
+    
+    started = time.time()
+    
+    def ready(address):
+        print(f"Scoring service listening on http://{address[0]}:{address[1]} "
+              f"(ready in {time.time() - started:.1f}s)", file=sys.stderr)
+    
+    try:
+        asyncio.run(serve(args.host, args.port, args.batch_window_ms, args.max_batch, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(service_main())
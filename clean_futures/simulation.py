@@ -0,0 +1,218 @@
+"""
+Discrete-event simulation of truck cycles for the Clean Futures calculation core.
+"""
+
+import heapq
+import itertools
+import math
+from array import array
+from collections import deque
+
+from .vectorized import resolve_calculator_inputs
+
+# ============================================================================
+# TRUCK CYCLE SIMULATION
+# ============================================================================
+# The analytic bottleneck estimate treats trips per truck per day as a
+# fractional average. The simulation instead steps each truck through its
+# cycle on a heap-ordered event queue:
+#
+#   load at site (one loader, FIFO) -> travel -> gate (unloading bays, FIFO)
+#   -> travel back (+ backfill detour) -> dump backfill at site -> queue again
+#
+# Loading only happens inside the daily shift. shift_rule sets how much of
+# the cycle must fit before the shift ends for a load to start:
+#   'load'    - loading itself (trucks may deliver and return after hours)
+#   'deliver' - loading, haul and unloading (the gate closes with the shift)
+#   'return'  - the whole cycle, back on site with backfill
+# Hauls too long to ever fit may start any time during the shift. Trucks
+# already on the road finish their cycle after hours. Per-truck state lives in compact arrays, so a
+# 10-truck, 60-day job is a few thousand events and runs in milliseconds.
+# Times are in hours from the start of day 1; shift d runs from 24*d to
+# 24*d + work_hours_per_day.
+
+# Unloading bays at the landfill / facility gate
+SIMULATION_GATE_BAYS = 2
+
+# Time to drop backfill at the site when a truck returns (the second
+# loading_time in the analytic trip time)
+SIMULATION_DUMP_HOURS = 0.25
+
+# Default shift rule (see above)
+SIMULATION_SHIFT_RULE = 'deliver'
+
+# Safety limit on simulated project length
+SIMULATION_MAX_DAYS = 3650
+
+# Event kinds, in tie-break order for events at the same time
+_LOAD_DONE, _AT_GATE, _UNLOAD_DONE, _AT_SITE, _LOADER_OPEN = range(5)
+
+def simulate_truck_cycles(num_loads, distance_miles, num_trucks, loader_rate_cy_hr,
+                          truck_capacity_cy=18, work_hours_per_day=10, avg_speed_mph=45,
+                          loading_time_hours=0.25, unloading_time_hours=0.5,
+                          dump_time_hours=SIMULATION_DUMP_HOURS, detour_hours=0.0,
+                          gate_bays=SIMULATION_GATE_BAYS, shift_rule=SIMULATION_SHIFT_RULE,
+                          max_days=SIMULATION_MAX_DAYS):
+    """
+    Simulate hauling num_loads truck loads with a single site loader.
+    
+    A load takes the longer of loading_time_hours and the time the loading
+    equipment needs to fill one truck (truck_capacity_cy / loader_rate_cy_hr).
+    shift_rule is 'load', 'deliver' or 'return' (see the section notes).
+    
+    Returns:
+        Dictionary with 'project_days', 'end_hours' (time the last truck is
+        back on site), 'loads_per_day', 'loader_busy_hours',
+        'loader_wait_hours' and 'gate_wait_hours' (truck hours spent queueing
+        during the shift), 'truck_loads' (loads hauled per truck) and 'events'
+    """
+    num_trucks = int(num_trucks)
+    if num_loads <= 0:
+        return {'project_days': 0, 'end_hours': 0.0, 'loads_per_day': [], 'loader_busy_hours': 0.0,
+                'loader_wait_hours': 0.0, 'gate_wait_hours': 0.0, 'truck_loads': [0] * num_trucks, 'events': 0}
+    if num_trucks < 1 or loader_rate_cy_hr <= 0 or work_hours_per_day <= 0:
+        raise ValueError("Simulation needs at least one truck, a positive loader rate and a positive shift")
+    
+    travel = distance_miles / avg_speed_mph
+    service = max(loading_time_hours, truck_capacity_cy / loader_rate_cy_hr)
+    back_on_site = travel + detour_hours + dump_time_hours
+    cycle = service + travel + unloading_time_hours + back_on_site
+    # Time that has to fit in the rest of the shift before a load may start
+    if shift_rule == 'load':
+        required = service
+    elif shift_rule == 'deliver':
+        required = service + travel + unloading_time_hours
+    elif shift_rule == 'return':
+        required = cycle
+    else:
+        raise ValueError(f"Unknown shift rule: {shift_rule!r}")
+    limit = max_days * 24
+    
+    # Per-truck state
+    truck_loads = array('i', [0]) * num_trucks
+    queued_since = array('d', [0.0]) * num_trucks
+    
+    loader_queue = deque(range(num_trucks))
+    gate_queue = deque()
+    events = []
+    seq = itertools.count()
+    loads_per_day = []
+    
+    state = {
+        'started': 0, 'loader_busy': False, 'open_pending': False, 'opened_at': 0.0,
+        'gate_busy': 0, 'loader_busy_hours': 0.0, 'loader_wait': 0.0, 'gate_wait': 0.0
+    }
+    
+    def next_load_start(now):
+        """Earliest time at or after now that a new load may start"""
+        shift_start = math.floor(now / 24) * 24
+        shift_end = shift_start + work_hours_per_day
+        if now < shift_end and (now + required <= shift_end or required > work_hours_per_day):
+            return now
+        return shift_start + 24
+    
+    def dispatch_loader(now):
+        """Start the next queued truck on the loader if allowed"""
+        if state['loader_busy'] or not loader_queue or state['started'] >= num_loads:
+            return
+        start = next_load_start(now)
+        if start > now:
+            if not state['open_pending']:
+                state['open_pending'] = True
+                heapq.heappush(events, (start, _LOADER_OPEN, next(seq), -1))
+            return
+        truck = loader_queue.popleft()
+        state['loader_wait'] += now - max(queued_since[truck], state['opened_at'])
+        state['started'] += 1
+        state['loader_busy'] = True
+        state['loader_busy_hours'] += service
+        day = int(now // 24)
+        loads_per_day.extend([0] * (day + 1 - len(loads_per_day)))
+        loads_per_day[day] += 1
+        heapq.heappush(events, (now + service, _LOAD_DONE, next(seq), truck))
+    
+    dispatch_loader(0.0)
+    end = 0.0
+    processed = 0
+    while events:
+        now, kind, _, truck = heapq.heappop(events)
+        processed += 1
+        if now > limit:
+            raise ValueError(f"Simulation did not finish within {max_days} days")
+    
+        if kind == _LOAD_DONE:
+            state['loader_busy'] = False
+            heapq.heappush(events, (now + travel, _AT_GATE, next(seq), truck))
+            dispatch_loader(now)
+        elif kind == _AT_GATE:
+            if state['gate_busy'] < gate_bays:
+                state['gate_busy'] += 1
+                heapq.heappush(events, (now + unloading_time_hours, _UNLOAD_DONE, next(seq), truck))
+            else:
+                queued_since[truck] = now
+                gate_queue.append(truck)
+        elif kind == _UNLOAD_DONE:
+            state['gate_busy'] -= 1
+            if gate_queue:
+                waiting = gate_queue.popleft()
+                state['gate_wait'] += now - queued_since[waiting]
+                state['gate_busy'] += 1
+                heapq.heappush(events, (now + unloading_time_hours, _UNLOAD_DONE, next(seq), waiting))
+            heapq.heappush(events, (now + back_on_site, _AT_SITE, next(seq), truck))
+        elif kind == _AT_SITE:
+            truck_loads[truck] += 1
+            end = now
+            queued_since[truck] = now
+            loader_queue.append(truck)
+            dispatch_loader(now)
+        else:  # _LOADER_OPEN
+            state['open_pending'] = False
+            state['opened_at'] = now
+            dispatch_loader(now)
+    
+    return {
+        'project_days': int(end // 24) + 1,
+        'end_hours': end,
+        'loads_per_day': loads_per_day,
+        'loader_busy_hours': state['loader_busy_hours'],
+        'loader_wait_hours': state['loader_wait'],
+        'gate_wait_hours': state['gate_wait'],
+        'truck_loads': truck_loads.tolist(),
+        'events': processed
+    }
+
+def simulate_option(analysis, opt_type, option, gate_bays=SIMULATION_GATE_BAYS, shift_rule=SIMULATION_SHIFT_RULE):
+    """
+    Simulate the hauling schedule behind one Dig & Haul or Surface Facility result.
+    
+    Args:
+        analysis: Dictionary in the same shape as st.session_state.analysis
+        opt_type: 'dig_haul' or 'surface'
+        option: The calculate_dig_and_haul / calculate_surface_facility result
+    
+    Returns:
+        simulate_truck_cycles result plus 'analytic_project_days' for comparison
+    """
+    params = resolve_calculator_inputs(analysis, None, None)[opt_type]
+    detour_hours = option.get('extra_backfill_minutes', 0) / 60.0 if opt_type == 'dig_haul' else 0.0
+    sim = simulate_truck_cycles(
+        option['num_trips'], option['distance_miles'], option['num_trucks'],
+        option['equipment_capacity_per_day'] / params['work_hours_per_day'],
+        truck_capacity_cy=params['truck_capacity_cy'],
+        work_hours_per_day=params['work_hours_per_day'],
+        avg_speed_mph=option.get('avg_speed_mph', params['avg_speed_mph']),
+        loading_time_hours=params['loading_time_hours'],
+        detour_hours=detour_hours,
+        gate_bays=gate_bays,
+        shift_rule=shift_rule
+    )
+    sim['analytic_project_days'] = option['project_days']
+    return sim
+
+def simulate_site(analysis, results, gate_bays=SIMULATION_GATE_BAYS, shift_rule=SIMULATION_SHIFT_RULE):
+    """Simulate both trucking options of an analyze_site result (None where unavailable)"""
+    return {
+        opt_type: (simulate_option(analysis, opt_type, results[opt_type], gate_bays, shift_rule)
+                   if results[opt_type] else None)
+        for opt_type in ('dig_haul', 'surface')
+    }
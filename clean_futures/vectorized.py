@@ -0,0 +1,305 @@
+"""
+NumPy-vectorized option calculators for the Clean Futures calculation core.
+"""
+
+import numpy as np
+
+from .recommendation import RECOMMENDATION_METRICS, RECOMMENDATION_WEIGHTS, TREATMENT_BONUS, TREATMENT_OPTION_TYPES
+
+# ============================================================================
+# VECTORIZED CALCULATIONS
+# ============================================================================
+# Array-in/array-out versions of the option calculators for sweeps over many
+# parameter combinations. Every argument may be a scalar or an array; inputs
+# are broadcast together. The arithmetic mirrors the scalar calculators step
+# for step so results match them exactly (including math.ceil and the
+# min-bottleneck rule).
+
+def calculate_dig_and_haul_vectorized(volume_cy, distance_miles, needs_backfill=True,
+                                      num_trucks=3, equipment_capacity_per_day=300,
+                                      landfill_has_backfill=False, extra_backfill_minutes=0,
+                                      truck_capacity_cy=18, truck_hourly_rate=85,
+                                      excavator_rate=150, loader_rate=125,
+                                      work_hours_per_day=10, disposal_cost_cy=25,
+                                      backfill_cost_cy=10, avg_speed_mph=45,
+                                      loading_time_hours=0.25):
+    """
+    Vectorized Dig & Haul calculation over columns of inputs.
+    
+    Distances are passed in directly (see find_nearest_qualified_landfill);
+    everything else matches calculate_dig_and_haul.
+    
+    Returns:
+        Dictionary of NumPy arrays keyed like the calculate_dig_and_haul result
+    """
+    volume_cy = np.asarray(volume_cy, dtype=float)
+    distance_miles = np.asarray(distance_miles, dtype=float)
+    needs_backfill = np.asarray(needs_backfill, dtype=bool)
+    landfill_has_backfill = np.asarray(landfill_has_backfill, dtype=bool)
+    
+    # Trip time calculation
+    travel_time_hours = distance_miles / avg_speed_mph
+    loading_time = loading_time_hours
+    unloading_time = 0.5
+    base_trip_time = loading_time + travel_time_hours + unloading_time + travel_time_hours + loading_time
+    
+    needs_extra_trip = needs_backfill & ~landfill_has_backfill
+    extra_backfill_hours = np.where(needs_extra_trip, np.asarray(extra_backfill_minutes) / 60.0, 0.0)
+    trip_time = base_trip_time + extra_backfill_hours
+    
+    # BOTTLENECK ANALYSIS
+    trips_per_truck_per_day = work_hours_per_day / trip_time
+    truck_capacity_per_day = trips_per_truck_per_day * num_trucks * truck_capacity_cy
+    trucking_bound = truck_capacity_per_day <= equipment_capacity_per_day
+    actual_daily_capacity = np.where(trucking_bound, truck_capacity_per_day, equipment_capacity_per_day)
+    bottleneck = np.where(trucking_bound, "Trucking", "Loading Equipment")
+    
+    project_days = np.ceil(volume_cy / actual_daily_capacity)
+    project_hours = project_days * work_hours_per_day
+    num_trips = np.ceil(volume_cy / truck_capacity_cy)
+    
+    # COSTS
+    equipment_cost = (excavator_rate + loader_rate) * project_hours
+    total_truck_hours = num_trips * trip_time
+    trucking_cost = total_truck_hours * truck_hourly_rate
+    disposal_total = volume_cy * disposal_cost_cy
+    backfill_total = np.where(needs_backfill, volume_cy * backfill_cost_cy, 0.0)
+    total_cost = equipment_cost + trucking_cost + disposal_total + backfill_total
+    cost_per_cy = total_cost / volume_cy
+    
+    # CO2 calculations
+    base_truck_fuel = 4 * (num_trips * base_trip_time)
+    extra_backfill_fuel = 4 * (num_trips * extra_backfill_hours)
+    total_fuel = 6 * project_hours + 5 * project_hours + base_truck_fuel + extra_backfill_fuel
+    co2_tons = total_fuel * 22.38 / 2000
+    extra_backfill_co2_tons = extra_backfill_fuel * 22.38 / 2000
+    
+    return {
+        'total_cost': total_cost,
+        'cost_per_cy': cost_per_cy,
+        'project_days': project_days.astype(np.int64),
+        'distance_miles': distance_miles,
+        'co2_tons': co2_tons,
+        'equipment_cost': equipment_cost,
+        'trucking_cost': trucking_cost,
+        'disposal_cost': disposal_total,
+        'backfill_cost': backfill_total,
+        'bottleneck': bottleneck,
+        'truck_capacity_per_day': truck_capacity_per_day,
+        'equipment_capacity_per_day': np.broadcast_to(equipment_capacity_per_day, np.shape(truck_capacity_per_day)),
+        'actual_daily_capacity': actual_daily_capacity,
+        'num_trips': num_trips.astype(np.int64),
+        'trip_time_hours': trip_time,
+        'base_trip_time_hours': base_trip_time,
+        'extra_backfill_co2_tons': extra_backfill_co2_tons
+    }
+
+def calculate_onsite_remediation_vectorized(volume_cy, soil_permeability='medium',
+                                            tph_level=0, chloride_level=0,
+                                            processing_cost_cy=30, mobilization_cost=0,
+                                            amendment_cost=0, base_treatment_days=45):
+    """
+    Vectorized Onsite Remediation calculation over columns of inputs.
+    
+    Returns:
+        Dictionary of NumPy arrays keyed like the calculate_onsite_remediation result
+    """
+    volume_cy = np.asarray(volume_cy, dtype=float)
+    soil_permeability = np.asarray(soil_permeability)
+    tph_level = np.asarray(tph_level)
+    chloride_level = np.asarray(chloride_level)
+    
+    total_processing_cost = volume_cy * processing_cost_cy
+    total_cost = total_processing_cost + mobilization_cost + amendment_cost
+    
+    # Treatment duration by soil permeability, then contamination adjustments
+    treatment_days = np.select(
+        [soil_permeability == 'high', soil_permeability == 'low'],
+        [base_treatment_days * 0.7, base_treatment_days * 1.5],
+        default=base_treatment_days
+    ).astype(float)
+    treatment_days = np.where(tph_level > 3000, treatment_days * 1.2, treatment_days)
+    treatment_days = np.where(chloride_level > 7000, treatment_days * 1.2, treatment_days)
+    treatment_days = np.trunc(treatment_days).astype(np.int64)
+    
+    cost_per_cy = total_cost / volume_cy
+    co2_tons = volume_cy * 0.1 * 22.38 / 2000
+    
+    return {
+        'total_cost': total_cost,
+        'cost_per_cy': cost_per_cy,
+        'project_days': treatment_days,
+        'processing_cost': total_processing_cost,
+        'co2_tons': co2_tons
+    }
+
+def calculate_surface_facility_vectorized(volume_cy, distance_miles, num_trucks=3,
+                                          equipment_capacity_per_day=300,
+                                          truck_capacity_cy=18, truck_hourly_rate=85,
+                                          processing_cost_cy=25, excavator_rate=150,
+                                          loader_rate=125, work_hours_per_day=10,
+                                          avg_speed_mph=45, loading_time_hours=0.25):
+    """
+    Vectorized Surface Facility calculation over columns of inputs.
+    
+    Distances are passed in directly (see find_nearest_cf_facility);
+    everything else matches calculate_surface_facility.
+    
+    Returns:
+        Dictionary of NumPy arrays keyed like the calculate_surface_facility result
+    """
+    volume_cy = np.asarray(volume_cy, dtype=float)
+    distance_miles = np.asarray(distance_miles, dtype=float)
+    
+    # Round trip time (drop off dirty, pick up clean - all in one trip)
+    travel_time_hours = distance_miles / avg_speed_mph
+    trip_time = loading_time_hours + travel_time_hours + 0.5 + travel_time_hours + loading_time_hours
+    
+    # BOTTLENECK ANALYSIS
+    trips_per_truck_per_day = work_hours_per_day / trip_time
+    truck_capacity_per_day = trips_per_truck_per_day * num_trucks * truck_capacity_cy
+    trucking_bound = truck_capacity_per_day <= equipment_capacity_per_day
+    actual_daily_capacity = np.where(trucking_bound, truck_capacity_per_day, equipment_capacity_per_day)
+    bottleneck = np.where(trucking_bound, "Trucking", "Loading Equipment")
+    
+    project_days = np.ceil(volume_cy / actual_daily_capacity)
+    num_trips = np.ceil(volume_cy / truck_capacity_cy)
+    total_truck_hours = num_trips * trip_time
+    
+    # COSTS
+    trucking_cost = total_truck_hours * truck_hourly_rate
+    processing_cost = volume_cy * processing_cost_cy
+    equipment_hours = project_days * work_hours_per_day
+    equipment_cost = (excavator_rate + loader_rate) * equipment_hours
+    total_cost = trucking_cost + processing_cost + equipment_cost
+    cost_per_cy = total_cost / volume_cy
+    
+    # CO2 (trucking + loading equipment)
+    total_fuel = 4 * total_truck_hours + 6 * equipment_hours + 5 * equipment_hours
+    co2_tons = total_fuel * 22.38 / 2000
+    
+    return {
+        'total_cost': total_cost,
+        'cost_per_cy': cost_per_cy,
+        'project_days': project_days.astype(np.int64),
+        'distance_miles': distance_miles,
+        'trucking_cost': trucking_cost,
+        'processing_cost': processing_cost,
+        'equipment_cost': equipment_cost,
+        'co2_tons': co2_tons,
+        'bottleneck': bottleneck,
+        'truck_capacity_per_day': truck_capacity_per_day,
+        'equipment_capacity_per_day': np.broadcast_to(equipment_capacity_per_day, np.shape(truck_capacity_per_day)),
+        'actual_daily_capacity': actual_daily_capacity,
+        'num_trips': num_trips.astype(np.int64),
+        'trip_time_hours': trip_time
+    }
+
+# Analysis fields resolve_calculator_inputs reads
+CALCULATOR_INPUT_FIELDS = ('advanced_params', 'num_trucks', 'equipment_capacity_per_day')
+
+def resolve_calculator_inputs(analysis, landfill, facility):
+    """
+    Point values of every calculator input for one site, per option.
+    
+    Mirrors how the scalar calculators resolve Simple and Advanced Mode
+    parameters, so the vectorized calculators fed with these values
+    reproduce them.
+    
+    Returns:
+        Dictionary of keyword arguments per option ('dig_haul', 'onsite',
+        'surface'); landfill and facility may be None when unavailable
+    """
+    advanced = analysis['advanced_params']
+    num_trucks = analysis.get('num_trucks', 3)
+    equipment_capacity_per_day = analysis.get('equipment_capacity_per_day', 300)
+    
+    if advanced:
+        work_hours_per_day = advanced.get('work_hours_per_day', 10)
+        num_trucks = advanced.get('num_trucks', num_trucks)
+        equipment_capacity_per_day = min(
+            advanced.get('excavator_capacity_cy_hr', 40) * advanced.get('num_excavators', 1),
+            advanced.get('loader_capacity_cy_hr', 35) * advanced.get('num_loaders', 1)
+        ) * work_hours_per_day
+        shared = {
+            'num_trucks': num_trucks,
+            'equipment_capacity_per_day': equipment_capacity_per_day,
+            'truck_capacity_cy': advanced.get('truck_capacity_cy', 18),
+            'truck_hourly_rate': advanced.get('truck_hourly_rate', 85),
+            'work_hours_per_day': work_hours_per_day
+        }
+        dig_haul = dict(shared,
+                        excavator_rate=advanced.get('excavator_rate', 150),
+                        loader_rate=advanced.get('loader_rate', 125),
+                        disposal_cost_cy=advanced.get('disposal_cost_cy', landfill['disposal_cost_cy']) if landfill else None,
+                        backfill_cost_cy=advanced.get('backfill_cost_cy', 10))
+        surface = dict(shared, processing_cost_cy=advanced.get('surface_processing_cost_cy', 25))
+        onsite = {'processing_cost_cy': advanced.get('onsite_processing_cost_cy', 30),
+                  'mobilization_cost': advanced.get('mobilization_cost', 0),
+                  'amendment_cost': advanced.get('amendment_cost', 0)}
+    else:
+        shared = {
+            'num_trucks': num_trucks,
+            'equipment_capacity_per_day': equipment_capacity_per_day,
+            'truck_capacity_cy': 18,
+            'truck_hourly_rate': 85,
+            'work_hours_per_day': 10
+        }
+        dig_haul = dict(shared, excavator_rate=150, loader_rate=125,
+                        disposal_cost_cy=landfill['disposal_cost_cy'] if landfill else None,
+                        backfill_cost_cy=10)
+        surface = dict(shared, processing_cost_cy=facility['processing_cost_cy'] if facility else None)
+        onsite = {'processing_cost_cy': 30, 'mobilization_cost': 0, 'amendment_cost': 0}
+    
+    # Not configurable in either mode
+    for params in (dig_haul, surface):
+        params['avg_speed_mph'] = 45
+        params['loading_time_hours'] = 0.25
+    surface['excavator_rate'] = 150
+    surface['loader_rate'] = 125
+    onsite['base_treatment_days'] = 45
+    
+    return {'dig_haul': dig_haul, 'onsite': onsite, 'surface': surface}
+
+def generate_recommendation_vectorized(dig_haul, onsite, surface_facility, user_priorities):
+    """
+    Vectorized generate_recommendation over option results holding arrays.
+    
+    Each option is a result dictionary from the vectorized calculators (or
+    None when unavailable); every draw/row is scored with the same weights
+    and ties resolve the same way as generate_recommendation.
+    
+    Returns:
+        Tuple of (recommended, scores): an array of option names and a
+        dictionary of score arrays, or None when no option is available
+    """
+    options = [(opt_type, opt) for opt_type, opt in
+               (('dig_haul', dig_haul), ('onsite', onsite), ('surface', surface_facility)) if opt]
+    if not options:
+        return None
+    
+    # Scores keep the batch shape even when no metric is weighted
+    shape = np.broadcast_shapes(*(np.shape(opt[metric]) for _, opt in options for metric, _ in RECOMMENDATION_METRICS))
+    scores = {opt_type: np.zeros(shape) for opt_type, _ in options}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for metric, priority in RECOMMENDATION_METRICS:
+            level = user_priorities.get(priority, 'medium')
+            if (metric, priority, level) not in RECOMMENDATION_WEIGHTS:
+                continue
+            weight, fallback = RECOMMENDATION_WEIGHTS[(metric, priority, level)]
+            # Options may mix scalars and draw arrays (e.g. only trucking inputs uncertain)
+            minimum = np.minimum.reduce(np.broadcast_arrays(*[np.asarray(opt[metric], dtype=float)
+                                                              for _, opt in options]))
+            for opt_type, opt in options:
+                term = np.where(minimum > 0, weight * (1 - (opt[metric] - minimum) / minimum), fallback)
+                scores[opt_type] = scores[opt_type] + term
+                # Bonus for treatment vs disposal
+                if priority == 'esg' and level == 'high' and opt_type in TREATMENT_OPTION_TYPES:
+                    scores[opt_type] = scores[opt_type] + TREATMENT_BONUS
+    
+    names = np.array([opt_type for opt_type, _ in options])
+    stacked = np.stack(np.broadcast_arrays(*[np.asarray(scores[opt_type], dtype=float) for opt_type, _ in options]))
+    # argmax returns the first maximum, like max() over the scores dict
+    recommended = names[np.argmax(stacked, axis=0)]
+    
+    return recommended, scores
@@ -15,10 +15,22 @@ APP_VERSION = "1.4.3"
 
 import streamlit as st
 import pandas as pd
-import json
-import math
+import io
+import sys
 from datetime import datetime, timedelta
-from pathlib import Path
+
+# Calculation core (no Streamlit dependency; also used by batch mode and workers)
+from clean_futures.calculators import calculate_volume_cy
+from clean_futures.candidates import TOP_K_CANDIDATES
+from clean_futures.excel_report import EXCEL_MIME_TYPE, SITE_REPORT_FIELDS, write_site_report
+from clean_futures.facilities import get_facilities_database
+from clean_futures.fleet import FLEET_MAX_EXCAVATORS, FLEET_MAX_LOADERS, FLEET_MAX_TRUCKS, optimize_fleet
+from clean_futures.geo import determine_state_county, get_regulatory_thresholds
+from clean_futures.montecarlo import MONTE_CARLO_DRAWS, monte_carlo_site
+from clean_futures.pipeline import (RESULTS_PIPELINE, pipeline_cache_stats, pipeline_results, pipeline_stage,
+                                    run_pipeline)
+from clean_futures.simulation import simulate_site
+from clean_futures.vectorized import CALCULATOR_INPUT_FIELDS
 
 # ============================================================================
 # PAGE CONFIGURATION
@@ -249,881 +261,6 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-# ============================================================================
-# HELPER FUNCTIONS - DISTANCE AND GEOSPATIAL
-# ============================================================================
-
-# ============================================================================
-# HELPER FUNCTIONS - DISTANCE AND GEOSPATIAL
-# ============================================================================
-
-def determine_state_county(lat, lon, db):
-    """Determine state and county from GPS coordinates"""
-    # Texas/New Mexico boundary is roughly at -103° longitude
-    state = "Texas" if lon > -103.0 else "New Mexico"
-    
-    # Find nearest county from the landfill database
-    county_distances = {}
-    
-    for lf in db['landfills']:
-        county = lf['county']
-        # Calculate distance to this landfill (use as proxy for county)
-        distance = haversine_distance(lat, lon, lf['latitude'], lf['longitude'])
-        
-        # Keep the closest distance for each county
-        if county not in county_distances or distance < county_distances[county]:
-            county_distances[county] = distance
-    
-    if county_distances:
-        # Return the county with the closest landfill
-        nearest_county = min(county_distances, key=county_distances.get)
-        return state, nearest_county
-    
-    # Fallback: try to estimate based on coordinates
-    if state == "Texas":
-        # Rough Texas Permian Basin county estimates
-        if lon > -101.5:
-            return state, "HOWARD"
-        elif lon > -102.5:
-            return state, "MIDLAND"
-        else:
-            return state, "REEVES"
-    else:
-        # New Mexico side
-        return state, "LEA"
-
-def get_soil_type(lat, lon, state):
-    """Estimate soil type based on location in Permian Basin"""
-    # Simplified soil classification for Permian Basin
-    # In production, this would query USDA Web Soil Survey or similar database
-    
-    # Eastern Permian (more clay-rich)
-    if lon > -102.0:
-        return "Clay Loam / Silty Clay"
-    # Central Permian (mixed)
-    elif lon > -103.5:
-        return "Sandy Clay Loam / Caliche"
-    # Western Permian (more sandy)
-    else:
-        return "Sandy Loam / Desert Soils"
-
-def get_regulatory_thresholds(state, groundwater_depth_category=None):
-    """
-    Get soil regulatory thresholds for TPH and Chlorides.
-    
-    Args:
-        state: "Texas" or "New Mexico"
-        groundwater_depth_category: For New Mexico only - one of:
-            - "50_or_less" (groundwater at 50 feet or less)
-            - "51_to_100" (groundwater at 51-100 feet)  
-            - "over_100" (groundwater at >100 feet)
-    
-    Returns:
-        Dictionary with threshold values and regulatory information
-    """
-    # Texas TCEQ Protective Concentration Levels (PCLs)
-    # New Mexico NMED Soil Screening Levels (SSLs)
-    
-    if state == "Texas":
-        return {
-            'tph_threshold_mgkg': 10000,
-            'tph_residential_mgkg': 10000,
-            'tph_industrial_mgkg': 10000,
-            'chloride_threshold_mgkg': 3000,
-            'chloride_soil_mgkg': '3,000 mg/kg (guidance)',
-            'benzene_threshold_mgkg': 0.026,
-            'regulatory_agency': 'TCEQ (Texas Commission on Environmental Quality)',
-            'regulation_type': 'Guidance',
-            'groundwater_depth_display': 'N/A (Texas)',
-            'notes': 'Texas uses risk-based guidance levels; site-specific cleanup levels may vary'
-        }
-    else:  # New Mexico - thresholds depend on groundwater depth
-        if groundwater_depth_category == "50_or_less":
-            return {
-                'tph_threshold_mgkg': 100,
-                'tph_residential_mgkg': 100,
-                'tph_industrial_mgkg': 100,
-                'chloride_threshold_mgkg': 600,
-                'chloride_soil_mgkg': '600 mg/kg',
-                'benzene_threshold_mgkg': 10,
-                'btex_threshold_mgkg': 50,
-                'regulatory_agency': 'NMED (New Mexico Environment Department)',
-                'regulation_type': 'Regulation',
-                'groundwater_depth_display': '≤50 feet',
-                'notes': 'Strictest thresholds apply when groundwater is shallow (≤50 ft)'
-            }
-        elif groundwater_depth_category == "51_to_100":
-            return {
-                'tph_threshold_mgkg': 2500,
-                'tph_residential_mgkg': 2500,
-                'tph_industrial_mgkg': 2500,
-                'chloride_threshold_mgkg': 10000,
-                'chloride_soil_mgkg': '10,000 mg/kg',
-                'benzene_threshold_mgkg': 10,
-                'btex_threshold_mgkg': 50,
-                'gro_dro_threshold_mgkg': 1000,
-                'regulatory_agency': 'NMED (New Mexico Environment Department)',
-                'regulation_type': 'Regulation',
-                'groundwater_depth_display': '51-100 feet',
-                'notes': 'Moderate thresholds apply for mid-depth groundwater (51-100 ft)'
-            }
-        else:  # over_100 or default
-            return {
-                'tph_threshold_mgkg': 2500,
-                'tph_residential_mgkg': 2500,
-                'tph_industrial_mgkg': 2500,
-                'chloride_threshold_mgkg': 20000,
-                'chloride_soil_mgkg': '20,000 mg/kg',
-                'benzene_threshold_mgkg': 10,
-                'btex_threshold_mgkg': 50,
-                'gro_dro_threshold_mgkg': 1000,
-                'regulatory_agency': 'NMED (New Mexico Environment Department)',
-                'regulation_type': 'Regulation',
-                'groundwater_depth_display': '>100 feet',
-                'notes': 'Less restrictive thresholds apply when groundwater is deep (>100 ft)'
-            }
-
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two GPS coordinates in miles"""
-    R = 3959  # Earth's radius in miles
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
-
-def load_facilities_database():
-    """Return the facilities database (embedded in code for reliable deployment)"""
-    return {
-        "landfills": [
-            {
-                "id": "LF001",
-                "company": "MILESTONE",
-                "site_name": "UPTON",
-                "county": "GLASSCOCK",
-                "latitude": 31.499316,
-                "longitude": -101.931524,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": True,
-                "backfill_cost_cy": 10
-            },
-            {
-                "id": "LF002",
-                "company": "MILESTONE",
-                "site_name": "STANTON LANDFILL",
-                "county": "HOWARD",
-                "latitude": 31.981708,
-                "longitude": -101.771822,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": False,
-                "backfill_cost_cy": 0
-            },
-            {
-                "id": "LF003",
-                "company": "R360",
-                "site_name": "WISHBONE",
-                "county": "HOWARD",
-                "latitude": 32.201328,
-                "longitude": -101.737306,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": True,
-                "backfill_cost_cy": 10
-            },
-            {
-                "id": "LF004",
-                "company": "REPUBLIC",
-                "site_name": "SOUTH ODESSA",
-                "county": "MIDLAND",
-                "latitude": 31.77227,
-                "longitude": -102.542218,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": False,
-                "backfill_cost_cy": 0
-            },
-            {
-                "id": "LF005",
-                "company": "US ECOLOGY",
-                "site_name": "REAGAN",
-                "county": "GLASSCOCK",
-                "latitude": 31.418575,
-                "longitude": -101.691314,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": True,
-                "backfill_cost_cy": 10
-            },
-            {
-                "id": "LF006",
-                "company": "WM",
-                "site_name": "BIG LAKE",
-                "county": "GLASSCOCK",
-                "latitude": 31.344978,
-                "longitude": -101.502558,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": False,
-                "backfill_cost_cy": 0
-            },
-            {
-                "id": "LF007",
-                "company": "WM",
-                "site_name": "HOWARD",
-                "county": "HOWARD",
-                "latitude": 32.175082,
-                "longitude": -101.665695,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": False,
-                "backfill_cost_cy": 0
-            },
-            {
-                "id": "LF008",
-                "company": "MILESTONE",
-                "site_name": "ORLA EWF",
-                "county": "LOVING",
-                "latitude": 31.865379,
-                "longitude": -103.847547,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": True,
-                "backfill_cost_cy": 10
-            },
-            {
-                "id": "LF009",
-                "company": "R360",
-                "site_name": "RED BLUFF",
-                "county": "CULBERSON",
-                "latitude": 31.9861,
-                "longitude": -104.021569,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": False,
-                "backfill_cost_cy": 0
-            },
-            {
-                "id": "LF010",
-                "company": "WM",
-                "site_name": "ORLA LANDFILL",
-                "county": "LOVING",
-                "latitude": 31.824627,
-                "longitude": -103.910185,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": False,
-                "backfill_cost_cy": 0
-            },
-            {
-                "id": "LF011",
-                "company": "WM",
-                "site_name": "DEEP SIX",
-                "county": "REEVES",
-                "latitude": 31.286899,
-                "longitude": -103.392814,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": False,
-                "backfill_cost_cy": 0
-            },
-            {
-                "id": "LF012",
-                "company": "REPUBLIC",
-                "site_name": "REEVES",
-                "county": "REEVES",
-                "latitude": 31.654254,
-                "longitude": -103.637612,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": True,
-                "backfill_cost_cy": 10
-            },
-            {
-                "id": "LF013",
-                "company": "DESERT ENVIRONMENTAL",
-                "site_name": "DRF MENTONE",
-                "county": "LOVING",
-                "latitude": 31.960808,
-                "longitude": -103.75866,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": True,
-                "backfill_cost_cy": 10
-            },
-            {
-                "id": "LF014",
-                "company": "US ECOLOGY",
-                "site_name": "PECOS",
-                "county": "REEVES",
-                "latitude": 31.320076,
-                "longitude": -103.621133,
-                "accepts_tph": True,
-                "tph_max_mgkg": 5000,
-                "accepts_chloride": True,
-                "chloride_max_mgkg": 10000,
-                "disposal_cost_cy": 25,
-                "backfill_available": False,
-                "backfill_cost_cy": 0
-            }
-        ],
-        "clean_futures_facilities": [
-            {
-                "id": "CF001",
-                "facility_name": "Clean Futures Facility 1",
-                "region": "Delaware Basin",
-                "latitude": 31.9195,
-                "longitude": -103.6285,
-                "processing_cost_cy": 25,
-                "includes_backfill": True,
-                "backfill_cost_cy": 0,
-                "typical_turnaround_days": 30,
-                "notes": "Treated soil returned to site"
-            },
-            {
-                "id": "CF002",
-                "facility_name": "Clean Futures Facility 2",
-                "region": "Midland Basin",
-                "latitude": 32.1022,
-                "longitude": -102.4654,
-                "processing_cost_cy": 25,
-                "includes_backfill": True,
-                "backfill_cost_cy": 0,
-                "typical_turnaround_days": 30,
-                "notes": "Treated soil returned to site"
-            },
-            {
-                "id": "CF003",
-                "facility_name": "Clean Futures Facility 3",
-                "region": "Central Basin",
-                "latitude": 31.3458,
-                "longitude": -101.7301,
-                "processing_cost_cy": 25,
-                "includes_backfill": True,
-                "backfill_cost_cy": 0,
-                "typical_turnaround_days": 30,
-                "notes": "Treated soil returned to site"
-            },
-            {
-                "id": "CF004",
-                "facility_name": "Clean Futures Facility 4",
-                "region": "Eastern Basin",
-                "latitude": 32.3109,
-                "longitude": -101.8421,
-                "processing_cost_cy": 25,
-                "includes_backfill": True,
-                "backfill_cost_cy": 0,
-                "typical_turnaround_days": 30,
-                "notes": "Treated soil returned to site"
-            }
-        ]
-    }
-
-def find_nearest_qualified_landfill(lat, lon, tph_level, chloride_level, needs_backfill, db):
-    """Find the nearest landfill that accepts the contamination levels"""
-    qualified = []
-    
-    for lf in db['landfills']:
-        # Check if landfill accepts the contamination levels
-        accepts_tph = tph_level <= lf['tph_max_mgkg'] if tph_level > 0 else True
-        accepts_chloride = chloride_level <= lf['chloride_max_mgkg'] if chloride_level > 0 else True
-        
-        if accepts_tph and accepts_chloride:
-            # Include all qualified landfills - we'll note backfill availability separately
-            distance = haversine_distance(lat, lon, lf['latitude'], lf['longitude'])
-            qualified.append({
-                'landfill': lf,
-                'distance_miles': distance
-            })
-    
-    # Sort by distance
-    qualified.sort(key=lambda x: x['distance_miles'])
-    
-    return qualified[0] if qualified else None
-
-def find_nearest_cf_facility(lat, lon, db):
-    """Find the nearest Clean Futures facility"""
-    facilities = []
-    
-    for cf in db['clean_futures_facilities']:
-        distance = haversine_distance(lat, lon, cf['latitude'], cf['longitude'])
-        facilities.append({
-            'facility': cf,
-            'distance_miles': distance
-        })
-    
-    facilities.sort(key=lambda x: x['distance_miles'])
-    
-    return facilities[0] if facilities else None
-
-# ============================================================================
-# CALCULATION FUNCTIONS
-# ============================================================================
-
-def calculate_volume_cy(surface_area_sqft, depth_ft):
-    """Calculate volume in cubic yards from surface area and depth"""
-    cubic_feet = surface_area_sqft * depth_ft
-    cubic_yards = cubic_feet / 27
-    return cubic_yards
-
-def calculate_co2_emissions(fuel_gallons):
-    """Calculate CO2 emissions from fuel consumption"""
-    # Diesel produces approximately 22.38 lbs CO2 per gallon
-    co2_lbs = fuel_gallons * 22.38
-    co2_tons = co2_lbs / 2000
-    return co2_lbs, co2_tons
-
-def calculate_dig_and_haul(volume_cy, site_lat, site_lon, needs_backfill, 
-                          tph_level, chloride_level, db, 
-                          num_trucks=3, equipment_capacity_per_day=300,
-                          landfill_has_backfill=False, extra_backfill_minutes=0,
-                          advanced_params=None):
-    """
-    Calculate costs and metrics for Dig & Haul option.
-    
-    Implements bottleneck analysis:
-    - Truck capacity/day = (trips per truck per day) × num_trucks × truck_capacity_cy
-    - Equipment capacity/day = from input (simple) or calculated (advanced)
-    - Actual daily capacity = MIN(truck capacity, equipment capacity)
-    
-    Backfill logic:
-    - If landfill has backfill: no extra time needed
-    - If landfill does NOT have backfill: add extra_backfill_minutes to each trip
-    - Extra travel time affects: trip duration, project timeline, trucking cost, CO2
-    
-    This math aligns with Advanced Mode where users can specify detailed equipment.
-    """
-    
-    # Find nearest qualified landfill
-    nearest_lf = find_nearest_qualified_landfill(site_lat, site_lon, tph_level, 
-                                                  chloride_level, needs_backfill, db)
-    
-    if not nearest_lf:
-        return None
-    
-    landfill = nearest_lf['landfill']
-    distance_miles = nearest_lf['distance_miles']
-    
-    # Use advanced parameters or defaults
-    if advanced_params:
-        truck_capacity_cy = advanced_params.get('truck_capacity_cy', 18)
-        num_trucks = advanced_params.get('num_trucks', num_trucks)
-        truck_hourly_rate = advanced_params.get('truck_hourly_rate', 85)
-        excavator_rate = advanced_params.get('excavator_rate', 150)
-        loader_rate = advanced_params.get('loader_rate', 125)
-        work_hours_per_day = advanced_params.get('work_hours_per_day', 10)
-        disposal_cost = advanced_params.get('disposal_cost_cy', landfill['disposal_cost_cy'])
-        backfill_cost = advanced_params.get('backfill_cost_cy', 10)
-        # Advanced mode: calculate equipment capacity from detailed specs
-        excavator_capacity_cy_hr = advanced_params.get('excavator_capacity_cy_hr', 40)
-        loader_capacity_cy_hr = advanced_params.get('loader_capacity_cy_hr', 35)
-        num_excavators = advanced_params.get('num_excavators', 1)
-        num_loaders = advanced_params.get('num_loaders', 1)
-        equipment_capacity_per_day = min(
-            excavator_capacity_cy_hr * num_excavators,
-            loader_capacity_cy_hr * num_loaders
-        ) * work_hours_per_day
-    else:
-        # Simple mode defaults
-        truck_capacity_cy = 18
-        truck_hourly_rate = 85
-        excavator_rate = 150
-        loader_rate = 125
-        work_hours_per_day = 10
-        disposal_cost = landfill['disposal_cost_cy']
-        backfill_cost = 10 if needs_backfill else 0  # Always $10/CY in simple mode
-        # equipment_capacity_per_day comes from function parameter (user selection)
-    
-    # Trip time calculation
-    avg_speed_mph = 45
-    travel_time_hours = distance_miles / avg_speed_mph
-    loading_time = 0.25  # 15 min to load truck at site
-    unloading_time = 0.5  # 30 min at landfill (drop off + pick up backfill if available)
-    
-    # Base trip time (assuming backfill at landfill)
-    base_trip_time = loading_time + travel_time_hours + unloading_time + travel_time_hours + loading_time
-    
-    # Extra time if backfill NOT at landfill
-    if needs_backfill and not landfill_has_backfill:
-        extra_backfill_hours = extra_backfill_minutes / 60.0
-    else:
-        extra_backfill_hours = 0
-    
-    # Total trip time includes extra backfill sourcing time
-    trip_time = base_trip_time + extra_backfill_hours
-    
-    # BOTTLENECK ANALYSIS
-    # Calculate truck capacity per day
-    trips_per_truck_per_day = work_hours_per_day / trip_time
-    truck_capacity_per_day = trips_per_truck_per_day * num_trucks * truck_capacity_cy
-    
-    # Determine bottleneck
-    if truck_capacity_per_day <= equipment_capacity_per_day:
-        bottleneck = "Trucking"
-        actual_daily_capacity = truck_capacity_per_day
-    else:
-        bottleneck = "Loading Equipment"
-        actual_daily_capacity = equipment_capacity_per_day
-    
-    # Calculate duration based on bottleneck
-    project_days = math.ceil(volume_cy / actual_daily_capacity)
-    project_hours = project_days * work_hours_per_day
-    
-    # Number of trips (for cost calculation)
-    num_trips = math.ceil(volume_cy / truck_capacity_cy)
-    
-    # COSTS
-    # Equipment runs for project duration
-    equipment_cost = (excavator_rate + loader_rate) * project_hours
-    
-    # Trucking cost based on actual trips needed (includes extra backfill time)
-    total_truck_hours = num_trips * trip_time
-    trucking_cost = total_truck_hours * truck_hourly_rate
-    
-    # Disposal and backfill
-    disposal_total = volume_cy * disposal_cost
-    backfill_total = volume_cy * backfill_cost if needs_backfill else 0
-    
-    total_cost = equipment_cost + trucking_cost + disposal_total + backfill_total
-    cost_per_cy = total_cost / volume_cy
-    
-    # CO2 calculations
-    excavator_fuel_gph = 6
-    loader_fuel_gph = 5
-    truck_fuel_gph = 4
-    
-    # Base fuel consumption
-    base_truck_hours = num_trips * base_trip_time
-    base_truck_fuel = truck_fuel_gph * base_truck_hours
-    
-    # Extra fuel from backfill sourcing trips
-    extra_backfill_truck_hours = num_trips * extra_backfill_hours
-    extra_backfill_fuel = truck_fuel_gph * extra_backfill_truck_hours
-    
-    total_fuel = (excavator_fuel_gph * project_hours + 
-                  loader_fuel_gph * project_hours +
-                  base_truck_fuel +
-                  extra_backfill_fuel)
-    
-    co2_lbs, co2_tons = calculate_co2_emissions(total_fuel)
-    
-    # Also calculate CO2 breakdown for display
-    _, extra_backfill_co2_tons = calculate_co2_emissions(extra_backfill_fuel)
-    
-    return {
-        'option_name': 'Dig & Haul to Landfill',
-        'total_cost': total_cost,
-        'cost_per_cy': cost_per_cy,
-        'project_days': project_days,
-        'landfill_name': f"{landfill['company']} - {landfill['site_name']}",
-        'distance_miles': distance_miles,
-        'co2_tons': co2_tons,
-        'equipment_cost': equipment_cost,
-        'trucking_cost': trucking_cost,
-        'disposal_cost': disposal_total,
-        'backfill_cost': backfill_total,
-        'includes_backfill': needs_backfill,
-        'backfill_available_at_landfill': landfill_has_backfill,
-        # Bottleneck info
-        'bottleneck': bottleneck,
-        'truck_capacity_per_day': truck_capacity_per_day,
-        'equipment_capacity_per_day': equipment_capacity_per_day,
-        'actual_daily_capacity': actual_daily_capacity,
-        'num_trucks': num_trucks,
-        'num_trips': num_trips,
-        'trip_time_hours': trip_time,
-        'base_trip_time_hours': base_trip_time,
-        # Extra backfill info
-        'extra_backfill_minutes': extra_backfill_minutes if needs_backfill and not landfill_has_backfill else 0,
-        'extra_backfill_co2_tons': extra_backfill_co2_tons
-    }
-
-def calculate_onsite_remediation(volume_cy, site_lat, site_lon, soil_permeability='medium',
-                                tph_level=0, chloride_level=0, advanced_params=None):
-    """Calculate costs and metrics for Onsite Remediation option"""
-    
-    # Simple mode: flat $30/CY rate
-    # Advanced mode: will use detailed calculation with mobilization, amendments, etc.
-    if advanced_params:
-        processing_cost_cy = advanced_params.get('onsite_processing_cost_cy', 30)
-        # Advanced mode could add mobilization, amendments, etc. here
-        total_processing_cost = volume_cy * processing_cost_cy
-        mobilization_cost = advanced_params.get('mobilization_cost', 0)
-        amendment_cost = advanced_params.get('amendment_cost', 0)
-        total_cost = total_processing_cost + mobilization_cost + amendment_cost
-    else:
-        # Simple mode: flat $30/CY all-in rate
-        processing_cost_cy = 30
-        total_processing_cost = volume_cy * processing_cost_cy
-        mobilization_cost = 0  # Included in flat rate
-        amendment_cost = 0  # Included in flat rate
-        total_cost = total_processing_cost
-    
-    # Treatment duration estimation based on soil permeability
-    base_treatment_days = 45
-    if soil_permeability == 'high':
-        treatment_days = base_treatment_days * 0.7  # Faster treatment
-    elif soil_permeability == 'low':
-        treatment_days = base_treatment_days * 1.5  # Slower treatment
-    else:
-        treatment_days = base_treatment_days
-    
-    # Adjust for contamination levels
-    if tph_level > 3000:
-        treatment_days *= 1.2
-    if chloride_level > 7000:
-        treatment_days *= 1.2
-    
-    treatment_days = int(treatment_days)
-    
-    cost_per_cy = total_cost / volume_cy
-    
-    # CO2 estimation (much lower than dig & haul)
-    # Onsite equipment and limited trucking
-    estimated_fuel_gallons = volume_cy * 0.1  # Much less fuel than hauling
-    co2_lbs, co2_tons = calculate_co2_emissions(estimated_fuel_gallons)
-    
-    return {
-        'option_name': 'Clean Futures Onsite Remediation',
-        'total_cost': total_cost,
-        'cost_per_cy': cost_per_cy,
-        'project_days': treatment_days,
-        'processing_cost': total_processing_cost,
-        'mobilization_cost': mobilization_cost,
-        'amendment_cost': amendment_cost,
-        'co2_tons': co2_tons,
-        'includes_backfill': True,
-        'soil_returned_clean': True,
-        'permeability_factor': soil_permeability,
-        'rate_per_cy': processing_cost_cy
-    }
-
-def calculate_surface_facility(volume_cy, site_lat, site_lon, needs_backfill,
-                               tph_level, chloride_level, db, 
-                               num_trucks=3, equipment_capacity_per_day=300,
-                               advanced_params=None):
-    """
-    Calculate costs and metrics for Surface Facility option.
-    
-    KEY CONCEPT: Operators drop off contaminated soil and pick up clean backfill
-    (from previously treated stockpile) on the SAME TRIP. Treatment happens after
-    the operator leaves and doesn't affect their timeline.
-    
-    This makes Surface Facility timeline = just the hauling days (same as Dig & Haul).
-    
-    Competitive advantages over landfill:
-    - No disposal liability (soil is treated, not buried)
-    - Backfill included (pick up clean soil same trip)
-    - Faster/more convenient than sourcing separate backfill
-    - Environmentally friendly alternative
-    """
-    
-    # Find nearest CF facility
-    nearest_cf = find_nearest_cf_facility(site_lat, site_lon, db)
-    
-    if not nearest_cf:
-        return None
-    
-    facility = nearest_cf['facility']
-    distance_miles = nearest_cf['distance_miles']
-    
-    # Transportation parameters
-    if advanced_params:
-        truck_capacity_cy = advanced_params.get('truck_capacity_cy', 18)
-        num_trucks = advanced_params.get('num_trucks', num_trucks)
-        truck_hourly_rate = advanced_params.get('truck_hourly_rate', 85)
-        processing_cost_cy = advanced_params.get('surface_processing_cost_cy', 25)
-        work_hours_per_day = advanced_params.get('work_hours_per_day', 10)
-        # Advanced mode equipment calculation
-        excavator_capacity_cy_hr = advanced_params.get('excavator_capacity_cy_hr', 40)
-        loader_capacity_cy_hr = advanced_params.get('loader_capacity_cy_hr', 35)
-        num_excavators = advanced_params.get('num_excavators', 1)
-        num_loaders = advanced_params.get('num_loaders', 1)
-        equipment_capacity_per_day = min(
-            excavator_capacity_cy_hr * num_excavators,
-            loader_capacity_cy_hr * num_loaders
-        ) * work_hours_per_day
-    else:
-        truck_capacity_cy = 18
-        truck_hourly_rate = 85
-        processing_cost_cy = facility['processing_cost_cy']
-        work_hours_per_day = 10
-        # equipment_capacity_per_day comes from function parameter
-    
-    # Trip calculations
-    avg_speed_mph = 45
-    travel_time_hours = distance_miles / avg_speed_mph
-    loading_time = 0.25  # Load contaminated soil at site
-    unloading_time = 0.5  # Drop off contaminated, pick up clean backfill at facility
-    
-    # Round trip time (drop off dirty, pick up clean - all in one trip)
-    trip_time = loading_time + travel_time_hours + unloading_time + travel_time_hours + loading_time
-    
-    # BOTTLENECK ANALYSIS
-    # Calculate truck capacity per day
-    trips_per_truck_per_day = work_hours_per_day / trip_time
-    truck_capacity_per_day = trips_per_truck_per_day * num_trucks * truck_capacity_cy
-    
-    # Determine bottleneck
-    if truck_capacity_per_day <= equipment_capacity_per_day:
-        bottleneck = "Trucking"
-        actual_daily_capacity = truck_capacity_per_day
-    else:
-        bottleneck = "Loading Equipment"
-        actual_daily_capacity = equipment_capacity_per_day
-    
-    # Calculate hauling duration - THIS IS THE TOTAL PROJECT TIME
-    # (No waiting for treatment - operator picks up clean backfill same trip)
-    project_days = math.ceil(volume_cy / actual_daily_capacity)
-    
-    # Number of trips
-    num_trips = math.ceil(volume_cy / truck_capacity_cy)
-    total_truck_hours = num_trips * trip_time
-    
-    # COSTS
-    trucking_cost = total_truck_hours * truck_hourly_rate
-    processing_cost = volume_cy * processing_cost_cy
-    
-    # Equipment cost for loading (excavator + loader during project)
-    excavator_rate = 150
-    loader_rate = 125
-    equipment_hours = project_days * work_hours_per_day
-    equipment_cost = (excavator_rate + loader_rate) * equipment_hours
-    
-    total_cost = trucking_cost + processing_cost + equipment_cost
-    cost_per_cy = total_cost / volume_cy
-    
-    # CO2 (trucking + loading equipment)
-    truck_fuel_gph = 4
-    excavator_fuel_gph = 6
-    loader_fuel_gph = 5
-    total_fuel = (truck_fuel_gph * total_truck_hours + 
-                  excavator_fuel_gph * equipment_hours +
-                  loader_fuel_gph * equipment_hours)
-    co2_lbs, co2_tons = calculate_co2_emissions(total_fuel)
-    
-    return {
-        'option_name': 'Clean Futures Surface Facility',
-        'total_cost': total_cost,
-        'cost_per_cy': cost_per_cy,
-        'project_days': project_days,  # Just haul days - no treatment wait!
-        'facility_name': facility['facility_name'],
-        'distance_miles': distance_miles,
-        'trucking_cost': trucking_cost,
-        'processing_cost': processing_cost,
-        'equipment_cost': equipment_cost,
-        'co2_tons': co2_tons,
-        'includes_backfill': True,
-        'soil_returned_clean': True,
-        # Bottleneck info
-        'bottleneck': bottleneck,
-        'truck_capacity_per_day': truck_capacity_per_day,
-        'equipment_capacity_per_day': equipment_capacity_per_day,
-        'actual_daily_capacity': actual_daily_capacity,
-        'num_trucks': num_trucks,
-        'num_trips': num_trips,
-        'trip_time_hours': trip_time
-    }
-
-def generate_recommendation(dig_haul, onsite, surface_facility, user_priorities):
-    """Generate recommendation based on calculations and user priorities"""
-    
-    options = []
-    if dig_haul:
-        options.append(('dig_haul', dig_haul))
-    if onsite:
-        options.append(('onsite', onsite))
-    if surface_facility:
-        options.append(('surface', surface_facility))
-    
-    if not options:
-        return None
-    
-    # Score each option based on priorities
-    scores = {}
-    for opt_type, opt in options:
-        score = 0
-        
-        # Cost priority
-        if user_priorities.get('cost', 'medium') == 'high':
-            # Lower cost = higher score
-            min_cost = min([o[1]['cost_per_cy'] for o in options])
-            score += 40 * (1 - (opt['cost_per_cy'] - min_cost) / min_cost) if min_cost > 0 else 20
-        elif user_priorities.get('cost', 'medium') == 'medium':
-            min_cost = min([o[1]['cost_per_cy'] for o in options])
-            score += 20 * (1 - (opt['cost_per_cy'] - min_cost) / min_cost) if min_cost > 0 else 10
-        
-        # Timeline priority
-        if user_priorities.get('speed', 'medium') == 'high':
-            min_days = min([o[1]['project_days'] for o in options])
-            score += 30 * (1 - (opt['project_days'] - min_days) / min_days) if min_days > 0 else 15
-        elif user_priorities.get('speed', 'medium') == 'medium':
-            min_days = min([o[1]['project_days'] for o in options])
-            score += 15 * (1 - (opt['project_days'] - min_days) / min_days) if min_days > 0 else 7
-        
-        # ESG priority
-        if user_priorities.get('esg', 'medium') == 'high':
-            min_co2 = min([o[1]['co2_tons'] for o in options])
-            score += 30 * (1 - (opt['co2_tons'] - min_co2) / min_co2) if min_co2 > 0 else 15
-            # Bonus for treatment vs disposal
-            if opt_type in ['onsite', 'surface']:
-                score += 10
-        elif user_priorities.get('esg', 'medium') == 'medium':
-            min_co2 = min([o[1]['co2_tons'] for o in options])
-            score += 15 * (1 - (opt['co2_tons'] - min_co2) / min_co2) if min_co2 > 0 else 7
-        
-        scores[opt_type] = score
-    
-    # Find recommendation
-    recommended = max(scores, key=scores.get)
-    
-    return recommended, scores
-
 # ============================================================================
 # WELCOME PAGE
 # ============================================================================
@@ -1306,9 +443,9 @@ def show_simple_questionnaire():
     with col2:
         site_lon = st.number_input("Longitude", value=-103.9563, min_value=-105.0, max_value=-100.0, format="%.4f", key="site_lon_simple")
     
-    # Determine state from longitude and show appropriate info
-    is_new_mexico = site_lon < -103.0
-    state_display = "New Mexico" if is_new_mexico else "Texas"
+    # Determine state from the county raster and show appropriate info
+    state_display, _ = determine_state_county(site_lat, site_lon, get_facilities_database())
+    is_new_mexico = state_display == "New Mexico"
     
     # Show state indicator and groundwater depth dropdown for New Mexico
     if is_new_mexico:
@@ -1459,9 +596,9 @@ def show_advanced_questionnaire():
     with col2:
         site_lon = st.number_input("Longitude", value=-102.0, min_value=-105.0, max_value=-100.0, format="%.4f", key="site_lon_advanced")
     
-    # Determine state from longitude and show appropriate info
-    is_new_mexico = site_lon < -103.0
-    state_display = "New Mexico" if is_new_mexico else "Texas"
+    # Determine state from the county raster and show appropriate info
+    state_display, _ = determine_state_county(site_lat, site_lon, get_facilities_database())
+    is_new_mexico = state_display == "New Mexico"
     
     # Show state indicator and groundwater depth dropdown for New Mexico
     if is_new_mexico:
@@ -1606,11 +743,87 @@ def show_advanced_questionnaire():
 # RESULTS DISPLAY
 # ============================================================================
 
+def _comparison_rows(analysis, db, deps):
+    """Rows of the solution comparison table (a results pipeline stage)"""
+    recommended = deps['scoring'][0]
+    options_list = [(opt_type, deps[opt_type]) for opt_type in ('dig_haul', 'onsite', 'surface')
+                    if deps[opt_type]]
+    
+    # Create comprehensive comparison dataframe
+    comparison_data = []
+    for opt_type, opt in options_list:
+        is_recommended = (opt_type == recommended)
+        
+        # Build key details string
+        if opt_type == 'dig_haul':
+            key_details = f"→ {opt['landfill_name']}\n({opt['distance_miles']:.0f} mi)"
+            if not opt.get('backfill_available_at_landfill') and analysis.get('needs_backfill', True):
+                extra_mins = opt.get('extra_backfill_minutes', 0)
+                if extra_mins > 0:
+                    key_details += f"\n⚠️ +{extra_mins} min/trip for backfill"
+                else:
+                    key_details += "\n⚠️ Separate backfill source"
+            disposal_liability = "Permanent"
+        elif opt_type == 'onsite':
+            key_details = "Treated on your site\nSoil stays in place"
+            disposal_liability = "None"
+        else:  # surface
+            key_details = f"→ {opt['facility_name']}\n({opt['distance_miles']:.0f} mi)"
+            disposal_liability = "None"
+        
+        row = {
+            '': '⭐ RECOMMENDED' if is_recommended else '',
+            'Solution': opt['option_name'].replace('Clean Futures ', 'CF '),
+            'Total Cost': f"${opt['total_cost']:,.0f}",
+            'Cost/CY': f"${opt['cost_per_cy']:.2f}",
+            'Timeline': f"{opt['project_days']} days",
+            'CO₂': f"{opt['co2_tons']:.1f} tons",
+            'Backfill': '✅ Included' if opt.get('includes_backfill', False) else '❌ Separate',
+            'Liability': disposal_liability,
+            'Details': key_details
+        }
+        
+        comparison_data.append(row)
+    return comparison_data
+
+def _excel_report(analysis, db, deps):
+    """Excel report bytes for the download button (a results pipeline stage)"""
+    state, county = deps['location']
+    buffer = io.BytesIO()
+    write_site_report(buffer, analysis, pipeline_results(deps), state, county, deps['soil_type'], deps['thresholds'])
+    return buffer.getvalue()
+
+# The results page adds its comparison table, Excel report, fleet sweep and
+# truck simulation to the calculation stages. The fleet optimizer reads the
+# same fields as the Dig & Haul calculator plus the deadline from its expander.
+RESULTS_STAGES = dict(
+    RESULTS_PIPELINE,
+    comparison_rows=pipeline_stage(
+        ('needs_backfill',), ('dig_haul', 'onsite', 'surface', 'scoring'), _comparison_rows
+    ),
+    excel_report=pipeline_stage(
+        SITE_REPORT_FIELDS,
+        ('location', 'soil_type', 'thresholds', 'dig_haul', 'onsite', 'surface', 'scoring'), _excel_report
+    ),
+    fleet=pipeline_stage(
+        RESULTS_PIPELINE['dig_haul']['inputs'] + ('fleet_deadline_days',), (),
+        lambda analysis, db, deps: optimize_fleet(analysis, analysis['fleet_deadline_days'], db=db),
+        uses_roads=True
+    ),
+    simulation=pipeline_stage(
+        CALCULATOR_INPUT_FIELDS, ('dig_haul', 'surface'),
+        lambda analysis, db, deps: simulate_site(analysis, deps)
+    )
+)
+
+# Stages run up front; the fleet stage runs in its expander once the deadline is known
+RESULTS_PAGE_STAGES = tuple(name for name in RESULTS_STAGES if name != 'fleet')
+
 def show_results():
     """Display analysis results and recommendations"""
     
     analysis = st.session_state.analysis
-    db = load_facilities_database()
+    db = get_facilities_database()
     
     # Header with Start Over button
     col_title, col_button = st.columns([4, 1])
@@ -1624,27 +837,56 @@ def show_results():
             st.session_state.analysis = None
             st.rerun()
     
+    # The location summary is filled in once the pipeline has run below
+    location_summary = st.container()
+    
+    # ========================================================================
+    # PRIORITIES
+    # ========================================================================
+    # Changing only the priorities reruns scoring and the comparison table;
+    # the pipeline reuses the lookups and calculators.
+    
+    with st.expander("⚖️ Adjust Priorities", expanded=False):
+        col1, col2, col3 = st.columns(3)
+        priorities = {}
+        for col, (key, label) in zip((col1, col2, col3), (('cost', "Cost Importance"),
+                                                           ('speed', "Speed Importance"),
+                                                           ('esg', "ESG/Sustainability"))):
+            with col:
+                priorities[key] = st.select_slider(label, options=['low', 'medium', 'high'],
+                                                   value=analysis['priorities'].get(key, 'medium'),
+                                                   key=f"results_priority_{key}")
+    if priorities != analysis['priorities']:
+        analysis = dict(analysis, priorities=priorities)
+        st.session_state.analysis = analysis
+    
+    # ========================================================================
+    # PERFORM CALCULATIONS
+    # ========================================================================
+    
+    with st.spinner("Analyzing remediation options..."):
+        stage_values, stage_trace = run_pipeline(analysis, db, RESULTS_STAGES, RESULTS_PAGE_STAGES)
+    results = pipeline_results(stage_values)
+    
+    dig_haul = results['dig_haul']
+    onsite = results['onsite']
+    surface = results['surface']
+    recommended = results['recommended']
+    
     # ========================================================================
     # LOCATION SUMMARY
     # ========================================================================
     
-    st.markdown("### 📍 Location Summary")
+    location_summary.markdown("### 📍 Location Summary")
     
     # Get location details
-    state, county = determine_state_county(analysis['site_lat'], analysis['site_lon'], db)
-    soil_type = get_soil_type(analysis['site_lat'], analysis['site_lon'], state)
+    state, county = stage_values['location']
+    soil_type = stage_values['soil_type']
     groundwater_depth = analysis.get('groundwater_depth', None)  # Get from analysis
-    reg_thresholds = get_regulatory_thresholds(state, groundwater_depth)
-    
-    # Find nearest qualified landfill for distance
-    nearest_lf = find_nearest_qualified_landfill(
-        analysis['site_lat'], 
-        analysis['site_lon'],
-        analysis['tph_level'],
-        analysis['chloride_level'],
-        analysis['needs_backfill'],
-        db
-    )
+    reg_thresholds = stage_values['thresholds']
+    
+    # Nearest qualified landfill for distance
+    nearest_lf = stage_values['nearest_landfill']
     
     if nearest_lf:
         distance_to_landfill = nearest_lf['distance_miles']
@@ -1656,7 +898,7 @@ def show_results():
         distance_display = "N/A"
     
     # Display location info in columns
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3 = location_summary.columns(3)
     
     with col1:
         st.markdown(f"""
@@ -1693,7 +935,7 @@ def show_results():
         """, unsafe_allow_html=True)
     
     # Regulatory information
-    with st.expander("📋 Regulatory Thresholds & Standards", expanded=False):
+    with location_summary.expander("📋 Regulatory Thresholds & Standards", expanded=False):
         # Show groundwater depth info for New Mexico
         gw_depth_info = ""
         if state == "New Mexico" and groundwater_depth:
@@ -1732,108 +974,15 @@ def show_results():
     
     st.markdown("---")
     
-    # ========================================================================
-    # PERFORM CALCULATIONS
-    # ========================================================================
-    
-    with st.spinner("Analyzing remediation options..."):
-        # Get truck and equipment params (with defaults for backward compatibility)
-        num_trucks = analysis.get('num_trucks', 3)
-        equipment_capacity_per_day = analysis.get('equipment_capacity_per_day', 300)
-        landfill_has_backfill = analysis.get('landfill_has_backfill', False)
-        extra_backfill_minutes = analysis.get('extra_backfill_minutes', 0)
-        
-        dig_haul = calculate_dig_and_haul(
-            analysis['volume_cy'],
-            analysis['site_lat'],
-            analysis['site_lon'],
-            analysis['needs_backfill'],
-            analysis['tph_level'],
-            analysis['chloride_level'],
-            db,
-            num_trucks=num_trucks,
-            equipment_capacity_per_day=equipment_capacity_per_day,
-            landfill_has_backfill=landfill_has_backfill,
-            extra_backfill_minutes=extra_backfill_minutes,
-            advanced_params=analysis['advanced_params']
-        )
-        
-        onsite = calculate_onsite_remediation(
-            analysis['volume_cy'],
-            analysis['site_lat'],
-            analysis['site_lon'],
-            analysis.get('soil_permeability', 'medium'),
-            analysis['tph_level'],
-            analysis['chloride_level'],
-            analysis['advanced_params']
-        )
-        
-        surface = calculate_surface_facility(
-            analysis['volume_cy'],
-            analysis['site_lat'],
-            analysis['site_lon'],
-            analysis['needs_backfill'],
-            analysis['tph_level'],
-            analysis['chloride_level'],
-            db,
-            num_trucks=num_trucks,
-            equipment_capacity_per_day=equipment_capacity_per_day,
-            advanced_params=analysis['advanced_params']
-        )
-    
-    # Generate recommendation
-    recommended, scores = generate_recommendation(dig_haul, onsite, surface, analysis['priorities'])
-    
     # ========================================================================
     # COMPARISON TABLE
     # ========================================================================
     
     st.markdown("### 📊 Solution Comparison")
     
-    # Build options list
-    options_list = []
-    if dig_haul:
-        options_list.append(('dig_haul', dig_haul))
-    if onsite:
-        options_list.append(('onsite', onsite))
-    if surface:
-        options_list.append(('surface', surface))
-    
-    # Create comprehensive comparison dataframe
-    comparison_data = []
-    for opt_type, opt in options_list:
-        is_recommended = (opt_type == recommended)
-        
-        # Build key details string
-        if opt_type == 'dig_haul':
-            key_details = f"→ {opt['landfill_name']}\n({opt['distance_miles']:.0f} mi)"
-            if not opt.get('backfill_available_at_landfill') and analysis.get('needs_backfill', True):
-                extra_mins = opt.get('extra_backfill_minutes', 0)
-                if extra_mins > 0:
-                    key_details += f"\n⚠️ +{extra_mins} min/trip for backfill"
-                else:
-                    key_details += "\n⚠️ Separate backfill source"
-            disposal_liability = "Permanent"
-        elif opt_type == 'onsite':
-            key_details = "Treated on your site\nSoil stays in place"
-            disposal_liability = "None"
-        else:  # surface
-            key_details = f"→ {opt['facility_name']}\n({opt['distance_miles']:.0f} mi)"
-            disposal_liability = "None"
-        
-        row = {
-            '': '⭐ RECOMMENDED' if is_recommended else '',
-            'Solution': opt['option_name'].replace('Clean Futures ', 'CF '),
-            'Total Cost': f"${opt['total_cost']:,.0f}",
-            'Cost/CY': f"${opt['cost_per_cy']:.2f}",
-            'Timeline': f"{opt['project_days']} days",
-            'CO₂': f"{opt['co2_tons']:.1f} tons",
-            'Backfill': '✅ Included' if opt.get('includes_backfill', False) else '❌ Separate',
-            'Liability': disposal_liability,
-            'Details': key_details
-        }
-        
-        comparison_data.append(row)
+    options_list = [(opt_type, opt) for opt_type, opt in
+                     (('dig_haul', dig_haul), ('onsite', onsite), ('surface', surface)) if opt]
+    comparison_data = stage_values['comparison_rows']
     
     df_comparison = pd.DataFrame(comparison_data)
     
@@ -1942,6 +1091,8 @@ def show_results():
             else:
                 backfill_source = "Not required"
                 extra_time_note = ""
+            # Road-routed distances carry their own average speed
+            dh_speed = dh.get('avg_speed_mph', 45)
             
             st.markdown(f"""
 **Parameters Used:**
@@ -1956,7 +1107,7 @@ def show_results():
 | Excavator Rate | $150/hr |
 | Loader Rate | $125/hr |
 | Work Hours/Day | 10 hours |
-| Travel Speed | 45 mph |
+| Travel Speed | {dh_speed:.0f} mph |
 | Disposal Cost | $25/CY |
 | Backfill Cost | $10/CY |
 | **Backfill Source** | **{backfill_source}** |
@@ -1964,8 +1115,8 @@ def show_results():
 **Step-by-Step Calculation:**
 
 1. **Trip Time:**
-   - Travel time (one way) = {dh['distance_miles']:.1f} mi ÷ 45 mph = {dh['distance_miles']/45:.2f} hours
-   - Base trip = Load (0.25 hr) + Travel ({dh['distance_miles']/45:.2f} hr) + Unload (0.5 hr) + Return ({dh['distance_miles']/45:.2f} hr) + Unload backfill (0.25 hr)
+   - Travel time (one way) = {dh['distance_miles']:.1f} mi ÷ {dh_speed:.0f} mph = {dh['distance_miles']/dh_speed:.2f} hours
+   - Base trip = Load (0.25 hr) + Travel ({dh['distance_miles']/dh_speed:.2f} hr) + Unload (0.5 hr) + Return ({dh['distance_miles']/dh_speed:.2f} hr) + Unload backfill (0.25 hr)
    - Base trip time = {dh.get('base_trip_time_hours', dh.get('trip_time_hours', 0)):.2f} hours{extra_time_note}
    - **Total trip time = {dh.get('trip_time_hours', 0):.2f} hours**
 
@@ -2028,6 +1179,7 @@ This rate includes:
     with st.expander("**Clean Futures Surface Facility** - Calculation Details", expanded=False):
         sf = surface
         if sf:
+            sf_speed = sf.get('avg_speed_mph', 45)
             st.markdown(f"""
 **How Surface Facilities Work:**
 
@@ -2054,13 +1206,13 @@ Clean Futures treats the dropped-off soil behind the scenes and adds it to the s
 | Excavator Rate | $150/hr |
 | Loader Rate | $125/hr |
 | Processing Cost | $25/CY |
-| Travel Speed | 45 mph |
+| Travel Speed | {sf_speed:.0f} mph |
 
 **Step-by-Step Calculation:**
 
 1. **Trip Time:**
-   - Travel time (one way) = {sf['distance_miles']:.1f} mi ÷ 45 mph = {sf['distance_miles']/45:.2f} hours
-   - Trip = Load at site (0.25 hr) + Travel ({sf['distance_miles']/45:.2f} hr) + Exchange at facility (0.5 hr) + Return ({sf['distance_miles']/45:.2f} hr) + Unload backfill (0.25 hr)
+   - Travel time (one way) = {sf['distance_miles']:.1f} mi ÷ {sf_speed:.0f} mph = {sf['distance_miles']/sf_speed:.2f} hours
+   - Trip = Load at site (0.25 hr) + Travel ({sf['distance_miles']/sf_speed:.2f} hr) + Exchange at facility (0.5 hr) + Return ({sf['distance_miles']/sf_speed:.2f} hr) + Unload backfill (0.25 hr)
    - **Total trip time = {sf.get('trip_time_hours', 0):.2f} hours**
 
 2. **Bottleneck Analysis:**
@@ -2202,6 +1354,147 @@ Clean Futures treats the dropped-off soil behind the scenes and adds it to the s
             - Facility proximity makes this cost-effective
         """)
     
+    # ========================================================================
+    # FACILITY CANDIDATES
+    # ========================================================================
+    
+    with st.expander(f"🏭 Cheapest Facilities - Top {TOP_K_CANDIDATES} per Option", expanded=False):
+        st.caption("Costs every qualified landfill and Clean Futures facility, not just the nearest. A farther "
+                   "landfill with backfill on site or a lower disposal rate can come out cheaper. The landfill "
+                   "used above keeps your backfill answers; every other landfill uses its own backfill "
+                   "availability from the facilities database.")
+        candidates = stage_values['candidates']
+        candidate_rows = []
+        for opt_type, name_key, label, used in (('dig_haul', 'landfill_name', 'Dig & Haul', dig_haul),
+                                                 ('surface', 'facility_name', 'Surface Facility', surface)):
+            for rank, opt in enumerate(candidates[opt_type], start=1):
+                used_above = bool(used) and opt[name_key] == used[name_key]
+                backfill = ''
+                if opt_type == 'dig_haul' and analysis['needs_backfill']:
+                    source = "your answer" if used_above else "facility data"
+                    backfill = f"{'Yes' if opt['backfill_available_at_landfill'] else 'No'} ({source})"
+                candidate_rows.append({
+                    'Option': label,
+                    'Rank': rank,
+                    'Facility': opt[name_key],
+                    'Distance': f"{opt['distance_miles']:.0f} mi",
+                    'Total Cost': f"${opt['total_cost']:,.0f}",
+                    'Cost/CY': f"${opt['cost_per_cy']:.2f}",
+                    'Timeline': f"{opt['project_days']} days",
+                    'Backfill at Landfill': backfill,
+                    'Used Above': '✅' if used_above else ''
+                })
+        if candidate_rows:
+            st.dataframe(pd.DataFrame(candidate_rows), use_container_width=True, hide_index=True)
+        else:
+            st.info("No landfill or Clean Futures facility is available for this site.")
+    
+    # ========================================================================
+    # UNCERTAINTY (MONTE CARLO)
+    # ========================================================================
+    
+    with st.expander("🎲 Uncertainty Range (Monte Carlo)", expanded=False):
+        st.caption(f"Varies volume (-15% to +30%), truck speed, loading time, equipment and trucking rates, "
+                   f"and treatment time around the values above over {MONTE_CARLO_DRAWS:,} draws. "
+                   f"Results are reproducible (fixed seed).")
+        if st.checkbox("Run uncertainty analysis", key="run_monte_carlo"):
+            mc = monte_carlo_site(analysis, seed=0, db=db)
+            option_names = {'dig_haul': 'Dig & Haul', 'onsite': 'Onsite Remediation', 'surface': 'Surface Facility'}
+            mc_rows = []
+            for opt_type, summary in mc['options'].items():
+                if summary:
+                    mc_rows.append({
+                        'Option': option_names[opt_type],
+                        'Cost P10 / P50 / P90': " / ".join(f"${summary['total_cost'][p]:,.0f}" for p in ('p10', 'p50', 'p90')),
+                        'Days P10 / P50 / P90': " / ".join(f"{summary['project_days'][p]:.0f}" for p in ('p10', 'p50', 'p90')),
+                        'CO₂ Tons P10 / P50 / P90': " / ".join(f"{summary['co2_tons'][p]:.1f}" for p in ('p10', 'p50', 'p90')),
+                        'Recommended In': f"{mc['recommendation_probability'][opt_type]:.0%} of draws"
+                    })
+            st.dataframe(pd.DataFrame(mc_rows), use_container_width=True, hide_index=True)
+    
+    # ========================================================================
+    # FLEET OPTIMIZER
+    # ========================================================================
+    
+    with st.expander("🚚 Fleet Optimizer - Cheapest Fleet for a Deadline", expanded=False):
+        st.caption(f"Sweeps 1-{FLEET_MAX_TRUCKS} trucks and 1-{FLEET_MAX_EXCAVATORS} excavators / "
+                   f"1-{FLEET_MAX_LOADERS} loaders of three sizes each. Equipment cost scales with the number of machines.")
+        deadline_days = st.number_input("Target completion (days)", min_value=1, value=10, step=1, key="fleet_deadline")
+        fleet_values, fleet_trace = run_pipeline(dict(analysis, fleet_deadline_days=deadline_days), db,
+                                                 RESULTS_STAGES, ('fleet',))
+        fleet = fleet_values['fleet']
+        stage_trace = stage_trace + fleet_trace
+        option_names = {'dig_haul': 'Dig & Haul', 'surface': 'Surface Facility'}
+        fleet_rows = []
+        curve_rows = []
+        for opt_type, name in option_names.items():
+            opt = fleet[opt_type]
+            if not opt:
+                continue
+            best = opt['best']
+            if best:
+                fleet_rows.append({
+                    'Option': name,
+                    'Trucks': best['num_trucks'],
+                    'Excavators': f"{best['num_excavators']} × {best['excavator_capacity_cy_hr']:.0f} CY/hr",
+                    'Loaders': f"{best['num_loaders']} × {best['loader_capacity_cy_hr']:.0f} CY/hr",
+                    'Days': best['project_days'],
+                    'Total Cost': f"${best['total_cost']:,.0f}",
+                    'Bottleneck': best['bottleneck']
+                })
+            else:
+                st.warning(f"{name}: no configuration finishes within {deadline_days} days "
+                           f"(fastest is {opt['fastest_days']} days).")
+            for point in opt['curve']:
+                curve_rows.append({'Option': name, 'Days': point['project_days'], 'Total Cost': point['total_cost']})
+        if fleet_rows:
+            st.dataframe(pd.DataFrame(fleet_rows), use_container_width=True, hide_index=True)
+        if curve_rows:
+            st.markdown("**Cheapest cost for each project length**")
+            st.line_chart(pd.DataFrame(curve_rows).pivot(index='Days', columns='Option', values='Total Cost'))
+    
+    # ========================================================================
+    # TRUCK CYCLE SIMULATION
+    # ========================================================================
+    
+    with st.expander("⏱️ Truck Cycle Simulation - Day Count Check", expanded=False):
+        st.caption("Simulates every truck trip: waiting for the loader, hauling, waiting at the gate, the backfill "
+                   "detour and the daily shift (loads start only if they can be dumped before the shift ends). "
+                   "The estimate above uses average trips per day instead.")
+        simulation = stage_values['simulation']
+        option_names = {'dig_haul': 'Dig & Haul', 'surface': 'Surface Facility'}
+        sim_rows = []
+        for opt_type, sim in simulation.items():
+            if sim:
+                sim_rows.append({
+                    'Option': option_names[opt_type],
+                    'Estimated Days': sim['analytic_project_days'],
+                    'Simulated Days': sim['project_days'],
+                    'Loads / Day (first day)': sim['loads_per_day'][0] if sim['loads_per_day'] else 0,
+                    'Truck Hours Waiting at Loader': f"{sim['loader_wait_hours']:,.1f}",
+                    'Truck Hours Waiting at Gate': f"{sim['gate_wait_hours']:,.1f}"
+                })
+        if sim_rows:
+            st.dataframe(pd.DataFrame(sim_rows), use_container_width=True, hide_index=True)
+    
+    # ========================================================================
+    # COMPUTATION GRAPH (DEBUG)
+    # ========================================================================
+    
+    if st.query_params.get('debug'):
+        with st.expander("🧩 Computation Graph", expanded=False):
+            st.caption("Stages evaluated for this page. Reused stages came from the memo because none of "
+                       "their inputs changed.")
+            memo = pipeline_cache_stats(db)
+            st.caption(f"Memo across sessions: {memo['hits']:,} hits, {memo['misses']:,} misses, "
+                       f"{memo['size']:,}/{memo['max_size']:,} entries")
+            st.dataframe(pd.DataFrame([{
+                'Stage': entry['stage'],
+                'Status': entry['status'],
+                'Key': entry['key'],
+                'ms': f"{entry['ms']:.2f}"
+            } for entry in stage_trace]), use_container_width=True, hide_index=True)
+    
     # ========================================================================
     # DOWNLOAD & RESTART
     # ========================================================================
@@ -2234,6 +1527,15 @@ Clean Futures treats the dropped-off soil behind the scenes and adds it to the s
             mime="text/csv",
             use_container_width=True
         )
+        
+        # Inputs, cost breakdowns, bottleneck details and thresholds on separate sheets
+        st.download_button(
+            label="📊 Download Report (Excel)",
+            data=stage_values['excel_report'],
+            file_name=f"clean_futures_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            mime=EXCEL_MIME_TYPE,
+            use_container_width=True
+        )
     
     with col2:
         if st.button("🔄 Start Over", use_container_width=True, key="start_over_bottom"):
@@ -2279,4 +1581,10 @@ def main():
     """, unsafe_allow_html=True)
 
 if __name__ == "__main__":
-    main()
+    # Under `streamlit run` render the app; plain `python` runs batch mode
+    if st.runtime.exists():
+        main()
+    else:
+        from clean_futures.batch import batch_main
+        sys.exit(batch_main())
+
@@ -0,0 +1,63 @@
+"""
+Shared fixtures: cache files kept out of the app directory, and a tiny road graph.
+"""
+
+import os
+
+import pytest
+
+from clean_futures import facility_raster
+from clean_futures.facilities import default_facilities_database
+from clean_futures.roads import build_road_graph, save_road_graph
+
+# Road graph fixture: four nodes along 32°N, the landfill on node 0 and the
+# CF facility on node 3. Directed edges as (tail, head, miles, hours):
+#
+#   0 <-> 1 <-> 2 <-> 3   3, 3 and 3 miles at 0.05, 0.05 and 0.1 hours
+#   0 <-> 2               4 miles at 0.2 hours (shorter but slower)
+#   3  -> 0               1 mile at 0.01 hours (one way)
+ROAD_NODE_LATS = (32.0, 32.0, 32.0, 32.0)
+ROAD_NODE_LONS = (-102.0, -102.05, -102.1, -102.15)
+ROAD_EDGES = (
+    (0, 1, 3.0, 0.05), (1, 0, 3.0, 0.05),
+    (1, 2, 3.0, 0.05), (2, 1, 3.0, 0.05),
+    (2, 3, 3.0, 0.1), (3, 2, 3.0, 0.1),
+    (0, 2, 4.0, 0.2), (2, 0, 4.0, 0.2),
+    (3, 0, 1.0, 0.01)
+)
+
+def road_graph(scale_hours=1.0):
+    """The fixture graph, with every drive time multiplied by scale_hours"""
+    tails, heads, miles, hours = zip(*ROAD_EDGES)
+    return build_road_graph(ROAD_NODE_LATS, ROAD_NODE_LONS, tails, heads, miles,
+                            [h * scale_hours for h in hours])
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """Write rasters under tmp_path and start without a road network"""
+    monkeypatch.setattr(facility_raster, 'DATA_DIR', tmp_path)
+    monkeypatch.setenv('CLEAN_FUTURES_ROAD_GRAPH', str(tmp_path / 'roads' / 'permian_roads.npz'))
+    (tmp_path / 'roads').mkdir()
+
+@pytest.fixture
+def road_db():
+    """Plain facilities dict with one landfill on node 0 and one CF facility on node 3"""
+    db = default_facilities_database()
+    return {
+        'landfills': [dict(db['landfills'][0], latitude=ROAD_NODE_LATS[0], longitude=ROAD_NODE_LONS[0])],
+        'clean_futures_facilities': [dict(db['clean_futures_facilities'][0], latitude=ROAD_NODE_LATS[3],
+                                          longitude=ROAD_NODE_LONS[3])]
+    }
+
+@pytest.fixture
+def install_roads():
+    """Install the fixture graph at CLEAN_FUTURES_ROAD_GRAPH; returns its path"""
+    def install(scale_hours=1.0):
+        path = os.environ['CLEAN_FUTURES_ROAD_GRAPH']
+        save_road_graph(road_graph(scale_hours), path)
+        # Later installs in the same test must look like a different file
+        stat = os.stat(path)
+        installs = install.count = getattr(install, 'count', 0) + 1
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + installs * 1_000_000_000))
+        return path
+    return install
@@ -0,0 +1,116 @@
+"""
+Portfolio assignment: the transportation solver against brute force, and capacity handling.
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from clean_futures.assignment import assign_portfolio, solve_transportation
+from clean_futures.facilities import default_facilities_database, freeze_facilities_database
+
+SEED = 20240616
+
+DB = freeze_facilities_database(default_facilities_database())
+
+def _splits(units, parts):
+    """Every way to split an integer number of units over parts columns"""
+    if parts == 1:
+        yield (units,)
+        return
+    for first in range(units + 1):
+        for rest in _splits(units - first, parts - 1):
+            yield (first,) + rest
+
+def _brute_force(costs, supply, capacity):
+    """(unassigned units, cost) of the best integer assignment, fewest unassigned first"""
+    n_sites, n_facilities = costs.shape
+    best = None
+    for plan in itertools.product(*(_splits(int(s), n_facilities + 1) for s in supply)):
+        flows = np.array(plan, dtype=float)[:, :n_facilities]
+        if (flows.sum(axis=0) > capacity).any() or (flows[~np.isfinite(costs)] > 0).any():
+            continue
+        candidate = (sum(row[-1] for row in plan), float((flows * np.where(flows > 0, costs, 0)).sum()))
+        if best is None or candidate < best:
+            best = candidate
+    return best
+
+def _random_instance(rng):
+    n_sites, n_facilities = int(rng.integers(1, 4)), int(rng.integers(1, 4))
+    costs = rng.integers(1, 20, size=(n_sites, n_facilities)).astype(float)
+    costs[rng.random(costs.shape) < 0.2] = np.inf
+    supply = rng.integers(0, 4, size=n_sites).astype(float)
+    capacity = rng.integers(0, 6, size=n_facilities).astype(float)
+    capacity[rng.random(n_facilities) < 0.2] = np.inf
+    return costs, supply, capacity
+
+def _check_feasible(costs, supply, capacity, flows, unassigned):
+    placed = np.zeros(costs.shape[1])
+    for i, flow in enumerate(flows):
+        assert sum(flow.values()) + unassigned[i] == pytest.approx(supply[i])
+        for j, units in flow.items():
+            assert units > 0 and np.isfinite(costs[i, j])
+            placed[j] += units
+    assert (placed <= capacity + 1e-9).all()
+
+@pytest.mark.parametrize('case', range(150))
+def test_solver_matches_brute_force(case):
+    rng = np.random.default_rng([SEED, case])
+    costs, supply, capacity = _random_instance(rng)
+    flows, unassigned, _ = solve_transportation(costs, supply, capacity)
+    _check_feasible(costs, supply, capacity, flows, unassigned)
+    
+    expected_unassigned, expected_cost = _brute_force(costs, supply, capacity)
+    cost = sum(units * costs[i, j] for i, flow in enumerate(flows) for j, units in flow.items())
+    assert unassigned.sum() == pytest.approx(expected_unassigned)
+    assert cost == pytest.approx(expected_cost)
+
+def test_congested_facility_reroutes_the_cheapest_site():
+    # Both sites prefer column 0, which holds one of them; moving site 1 costs 1, site 0 costs 5
+    costs = np.array([[1.0, 6.0], [2.0, 3.0]])
+    flows, unassigned, augmentations = solve_transportation(costs, [10, 10], [10, np.inf])
+    assert flows == [{0: 10.0}, {1: 10.0}]
+    assert unassigned.tolist() == [0.0, 0.0]
+    assert augmentations == 1
+
+def test_volume_beyond_all_capacity_is_unassigned():
+    flows, unassigned, _ = solve_transportation(np.array([[1.0, 2.0]]), [10], [3, 4])
+    assert flows == [{0: 3.0, 1: 4.0}]
+    assert unassigned.tolist() == [3.0]
+
+def test_forbidden_pairs_are_never_used():
+    costs = np.array([[np.inf, 5.0], [1.0, np.inf]])
+    flows, unassigned, _ = solve_transportation(costs, [4, 4], [10, 2])
+    assert flows == [{1: 2.0}, {0: 4.0}]
+    assert unassigned.tolist() == [2.0, 0.0]
+
+def _site(**changes):
+    return dict({
+        'site_lat': 31.9, 'site_lon': -102.3, 'volume_cy': 500.0, 'tph_level': 1000, 'chloride_level': 2000,
+        'needs_backfill': False, 'landfill_has_backfill': False, 'extra_backfill_minutes': 0,
+        'num_trucks': 3, 'equipment_capacity_per_day': 300, 'advanced_params': None
+    }, **changes)
+
+def test_portfolio_overflow_is_reported_unassigned():
+    # Every landfill takes 5 CY/day: 5 x 10 days x 14 landfills = 700 CY for 1,000 CY of soil
+    capacities = {record['id']: 5 for record in DB['landfills']}
+    result = assign_portfolio([_site(), _site(site_lon=-103.5)], DB, horizon_days=10, capacities=capacities,
+                              options=('dig_haul',))
+    assert result['unassigned_cy'] == pytest.approx(1000 - 5 * 10 * len(DB['landfills']))
+    assert all(f['assigned_cy'] == pytest.approx(f['capacity_cy']) for f in result['facilities'])
+    assert sum(site['unassigned_cy'] for site in result['sites']) == pytest.approx(result['unassigned_cy'])
+
+def test_unqualified_landfills_cost_infinity():
+    # No landfill accepts this TPH level: all of it is unassigned with only landfills to choose from
+    dirty = _site(tph_level=10 ** 7)
+    landfills_only = assign_portfolio([dirty, _site()], DB, options=('dig_haul',))
+    assert landfills_only['sites'][0]['allocations'] == []
+    assert landfills_only['sites'][0]['unassigned_cy'] == pytest.approx(500)
+    assert landfills_only['sites'][1]['unassigned_cy'] == 0
+    assert landfills_only['unconstrained_cost'] == pytest.approx(landfills_only['sites'][1]['cost'])
+    
+    # CF facilities take any soil
+    both = assign_portfolio([dirty], DB)
+    assert both['unassigned_cy'] == 0
+    assert {a['option'] for a in both['sites'][0]['allocations']} == {'surface'}
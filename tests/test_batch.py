@@ -0,0 +1,63 @@
+"""
+Batch mode: row parsing and per-row errors.
+"""
+
+import csv
+import io
+
+import pytest
+
+from clean_futures.batch import analysis_from_row, run_batch
+
+ROW = {'site_id': 'S1', 'site_lat': '32.1', 'site_lon': '-102.4', 'volume_cy': '900',
+       'tph_level': '1500', 'chloride_level': '2000'}
+
+def _run(rows):
+    """run_batch over rows; returns the output rows by site_id and the error count"""
+    source = io.StringIO()
+    writer = csv.DictWriter(source, fieldnames=sorted({key for row in rows for key in row}))
+    writer.writeheader()
+    writer.writerows(rows)
+    source.seek(0)
+    output = io.StringIO()
+    _, errors = run_batch(source, output)
+    output.seek(0)
+    return {row['site_id']: row for row in csv.DictReader(output)}, errors
+
+def test_defaults_follow_the_questionnaire():
+    analysis = analysis_from_row(ROW)
+    assert analysis['num_trucks'] == 3
+    assert analysis['equipment_capacity_per_day'] == 300
+    assert analysis['extra_backfill_minutes'] == 30
+    assert analysis_from_row(dict(ROW, landfill_has_backfill='yes'))['extra_backfill_minutes'] == 0
+
+@pytest.mark.parametrize('field, value, message', [
+    ('volume_cy', '-5', 'volume_cy must be greater than zero'),
+    ('volume_cy', '0', 'volume_cy must be greater than zero'),
+    ('volume_cy', 'nan', 'volume_cy must be greater than zero'),
+    ('num_trucks', '0', 'num_trucks must be greater than zero'),
+    ('equipment_capacity_per_day', '-300', 'equipment_capacity_per_day must be greater than zero'),
+    ('extra_backfill_minutes', '-600', 'extra_backfill_minutes must not be negative')
+])
+def test_out_of_range_values_are_rejected(field, value, message):
+    with pytest.raises(ValueError, match=message):
+        analysis_from_row(dict(ROW, **{field: value}))
+
+def test_zero_area_volume_is_rejected():
+    row = {key: value for key, value in ROW.items() if key != 'volume_cy'}
+    with pytest.raises(ValueError, match='volume_cy must be greater than zero'):
+        analysis_from_row(dict(row, surface_area_sqft='0', depth_ft='2'))
+
+def test_bad_rows_get_an_error_and_the_rest_are_scored():
+    rows, errors = _run([
+        ROW,
+        dict(ROW, site_id='S2', volume_cy='-5'),
+        dict(ROW, site_id='S3', num_trucks='0'),
+        dict(ROW, site_id='S4', site_lat='')
+    ])
+    assert errors == 3
+    assert rows['S1']['error'] == '' and float(rows['S1']['dig_haul_total_cost']) > 0
+    assert rows['S2']['error'] == 'line 3: volume_cy must be greater than zero'
+    assert rows['S2']['dig_haul_total_cost'] == ''
+    assert rows['S3']['error'] == 'line 4: num_trucks must be greater than zero'
+    assert rows['S4']['error'] == 'line 5: Missing required numeric value'
@@ -0,0 +1,99 @@
+"""
+Top-k candidates: lower-bound pruning must return what full costing of every facility returns.
+"""
+
+import numpy as np
+import pytest
+
+from clean_futures.calculators import calculate_dig_and_haul, calculate_surface_facility
+from clean_futures.candidates import BACKFILL_PICKUP_MINUTES, _cheapest, top_k_options
+from clean_futures.facilities import default_facilities_database, freeze_facilities_database
+from clean_futures.geo import find_nearest_qualified_landfill, haversine_distance
+
+SEED = 20240620
+
+N_SITES = 60
+
+DB = freeze_facilities_database(default_facilities_database())
+
+ADVANCED_PARAMS = {'truck_capacity_cy': 14, 'num_trucks': 5, 'truck_hourly_rate': 110, 'disposal_cost_cy': 30,
+                   'backfill_cost_cy': 12, 'work_hours_per_day': 12, 'surface_processing_cost_cy': 22}
+
+def _random_site(rng, advanced_params):
+    has_backfill = bool(rng.random() < 0.5)
+    return {
+        'site_lat': float(rng.uniform(30.6, 34.4)), 'site_lon': float(rng.uniform(-104.6, -100.4)),
+        'volume_cy': float(rng.uniform(20, 20000)), 'tph_level': int(rng.choice([0, 800, 4000, 6000])),
+        'chloride_level': int(rng.choice([0, 3000, 9000])), 'needs_backfill': bool(rng.random() < 0.7),
+        'landfill_has_backfill': has_backfill, 'extra_backfill_minutes': 0 if has_backfill else 45,
+        'num_trucks': int(rng.integers(1, 8)), 'equipment_capacity_per_day': 300,
+        'advanced_params': advanced_params
+    }
+
+def _all_landfills(analysis):
+    """Every qualified landfill costed as the candidates table describes it"""
+    lat, lon = analysis['site_lat'], analysis['site_lon']
+    chosen = find_nearest_qualified_landfill(lat, lon, analysis['tph_level'], analysis['chloride_level'],
+                                             analysis['needs_backfill'], DB)
+    results = []
+    for landfill in DB['landfills']:
+        if (landfill['tph_max_mgkg'] < analysis['tph_level'] or
+                landfill['chloride_max_mgkg'] < analysis['chloride_level']):
+            continue
+        if landfill is chosen['landfill']:
+            route, has_backfill, minutes = chosen, analysis['landfill_has_backfill'], analysis['extra_backfill_minutes']
+        else:
+            route = {'landfill': landfill,
+                     'distance_miles': haversine_distance(lat, lon, landfill['latitude'], landfill['longitude'])}
+            has_backfill = landfill['backfill_available']
+            minutes = (BACKFILL_PICKUP_MINUTES if analysis['landfill_has_backfill']
+                       else analysis['extra_backfill_minutes'])
+        results.append(calculate_dig_and_haul(
+            analysis['volume_cy'], lat, lon, analysis['needs_backfill'], analysis['tph_level'],
+            analysis['chloride_level'], DB, num_trucks=analysis['num_trucks'],
+            equipment_capacity_per_day=analysis['equipment_capacity_per_day'],
+            landfill_has_backfill=has_backfill, extra_backfill_minutes=minutes,
+            advanced_params=analysis['advanced_params'], nearest_landfill=route
+        ))
+    return results
+
+def _all_cf_facilities(analysis):
+    lat, lon = analysis['site_lat'], analysis['site_lon']
+    return [calculate_surface_facility(
+        analysis['volume_cy'], lat, lon, analysis['needs_backfill'], analysis['tph_level'],
+        analysis['chloride_level'], DB, num_trucks=analysis['num_trucks'],
+        equipment_capacity_per_day=analysis['equipment_capacity_per_day'],
+        advanced_params=analysis['advanced_params'],
+        nearest_facility={'facility': facility,
+                          'distance_miles': haversine_distance(lat, lon, facility['latitude'], facility['longitude'])}
+    ) for facility in DB['clean_futures_facilities']]
+
+def _summary(results, k):
+    ranked = sorted(results, key=lambda result: (result['total_cost'], result['distance_miles']))[:k]
+    return [(result['total_cost'], result['distance_miles']) for result in ranked]
+
+@pytest.mark.parametrize('advanced_params', [None, ADVANCED_PARAMS], ids=['simple', 'advanced'])
+@pytest.mark.parametrize('k', [1, 3, 20])
+def test_top_k_matches_full_costing(advanced_params, k):
+    rng = np.random.default_rng([SEED, k, advanced_params is None])
+    for _ in range(N_SITES):
+        analysis = _random_site(rng, advanced_params)
+        options = top_k_options(analysis, DB, k)
+        for opt_type, everything in (('dig_haul', _all_landfills(analysis)), ('surface', _all_cf_facilities(analysis))):
+            assert len(options[opt_type]) == min(k, len(everything))
+            expected = _summary(everything, k)
+            for (cost, miles), result in zip(expected, options[opt_type]):
+                assert result['total_cost'] == pytest.approx(cost, rel=1e-12)
+                assert result['distance_miles'] == pytest.approx(miles, rel=1e-12)
+
+def test_equal_cost_candidate_is_not_pruned():
+    # The second candidate's bound equals the first one's cost, and it is closer
+    results = {0: {'total_cost': 100.0, 'distance_miles': 5.0}, 1: {'total_cost': 100.0, 'distance_miles': 2.0}}
+    best = _cheapest(np.array([100.0, 100.0]), np.array([0, 1]), results.__getitem__, 1)
+    assert best == [results[1]]
+
+def test_no_qualified_landfill_gives_no_candidates():
+    analysis = _random_site(np.random.default_rng(SEED), None)
+    options = top_k_options(dict(analysis, tph_level=10 ** 7), DB)
+    assert options['dig_haul'] == []
+    assert len(options['surface']) == min(3, len(DB['clean_futures_facilities']))
@@ -0,0 +1,108 @@
+"""
+Facility table and distance engine: the typed columns against the facility records they replace.
+"""
+
+import numpy as np
+import pytest
+
+from clean_futures.distance_matrix import (facility_coordinate_arrays, facility_distance_matrix,
+                                           facility_distance_pairs, iter_facility_distance_matrix,
+                                           nearest_facilities_batch, qualified_landfill_mask)
+from clean_futures.facilities import (FACILITY_ARRAY_DTYPES, FACILITY_ARRAY_FIELDS, FACILITY_ARRAY_PREFIXES,
+                                      default_facilities_database, freeze_facilities_database)
+from clean_futures.geo import find_nearest_cf_facility, find_nearest_qualified_landfill, haversine_distance
+from clean_futures.portfolio import attach_facility_arrays, publish_facility_arrays
+
+SEED = 20240625
+
+N_SITES = 500
+
+def _varied_db():
+    """Default facilities with a mix of acceptance limits and backfill flags"""
+    db = default_facilities_database()
+    landfills = [dict(lf, tph_max_mgkg=(2000, 5000, 10000)[i % 3], chloride_max_mgkg=(5000, 20000)[i % 2],
+                      backfill_available=i % 4 == 0)
+                 for i, lf in enumerate(db['landfills'])]
+    return freeze_facilities_database(dict(db, landfills=landfills))
+
+DB = _varied_db()
+
+@pytest.fixture(scope='module')
+def sites():
+    rng = np.random.default_rng(SEED)
+    return {
+        'lats': rng.uniform(29.5, 35.5, N_SITES), 'lons': rng.uniform(-106.0, -99.0, N_SITES),
+        'tph': rng.choice([0, 1500, 2000, 4000, 8000, 20000], N_SITES),
+        'chloride': rng.choice([0, 5000, 10000, 30000], N_SITES)
+    }
+
+def test_columns_hold_the_record_fields():
+    coords = facility_coordinate_arrays(DB)
+    for name, (kind, field) in FACILITY_ARRAY_FIELDS.items():
+        column = coords[name]
+        assert column.dtype == np.dtype(FACILITY_ARRAY_DTYPES.get(name, float))
+        assert column.tolist() == [record[field] for record in DB[kind]]
+        assert not column.flags.writeable
+    for kind, prefix in FACILITY_ARRAY_PREFIXES.items():
+        lats = np.array([record['latitude'] for record in DB[kind]])
+        np.testing.assert_array_equal(coords[f'{prefix}_lat_rad'], np.radians(lats))
+        np.testing.assert_array_equal(coords[f'{prefix}_cos_lat'], np.cos(np.radians(lats)))
+    assert facility_coordinate_arrays(DB) is coords
+
+@pytest.mark.parametrize('kind', list(FACILITY_ARRAY_PREFIXES))
+def test_distances_match_the_scalar_haversine(sites, kind):
+    coords = facility_coordinate_arrays(DB)
+    records = DB[kind]
+    lats, lons = sites['lats'][:50], sites['lons'][:50]
+    expected = np.array([[haversine_distance(lat, lon, r['latitude'], r['longitude']) for r in records]
+                         for lat, lon in zip(lats.tolist(), lons.tolist())])
+    matrix = facility_distance_matrix(lats, lons, coords, kind)
+    np.testing.assert_allclose(matrix, expected, rtol=1e-12, atol=1e-9)
+    
+    blocks = np.vstack([block for _, _, block in iter_facility_distance_matrix(lats, lons, coords, kind,
+                                                                              chunk_size=7)])
+    np.testing.assert_array_equal(blocks, matrix)
+    
+    positions = np.arange(50) % len(records)
+    np.testing.assert_allclose(facility_distance_pairs(lats, lons, coords, kind, positions),
+                               expected[np.arange(50), positions], rtol=1e-12, atol=1e-9)
+    subset = [len(records) - 1, 0]
+    np.testing.assert_allclose(facility_distance_matrix(lats, lons, coords, kind, subset), expected[:, subset],
+                               rtol=1e-12, atol=1e-9)
+
+def test_qualification_matches_the_records(sites):
+    mask = qualified_landfill_mask(sites['tph'], sites['chloride'], facility_coordinate_arrays(DB))
+    for row, tph, chloride in zip(mask, sites['tph'].tolist(), sites['chloride'].tolist()):
+        assert row.tolist() == [(tph <= 0 or tph <= lf['tph_max_mgkg']) and
+                                (chloride <= 0 or chloride <= lf['chloride_max_mgkg']) for lf in DB['landfills']]
+
+def test_batch_nearest_matches_single_site_lookups(sites):
+    nearest = nearest_facilities_batch(sites['lats'], sites['lons'], sites['tph'], sites['chloride'], DB,
+                                       chunk_size=64)
+    for i, (lat, lon, tph, chloride) in enumerate(zip(sites['lats'].tolist(), sites['lons'].tolist(),
+                                                      sites['tph'].tolist(), sites['chloride'].tolist())):
+        landfill = find_nearest_qualified_landfill(lat, lon, tph, chloride, True, DB)
+        if landfill is None:
+            assert nearest['landfill_index'][i] == -1 and np.isnan(nearest['landfill_distance'][i])
+        else:
+            assert nearest['landfill_distance'][i] == pytest.approx(landfill['distance_miles'], rel=1e-12)
+            assert DB['landfills'][nearest['landfill_index'][i]]['tph_max_mgkg'] >= tph
+        facility = find_nearest_cf_facility(lat, lon, DB)
+        assert nearest['cf_distance'][i] == pytest.approx(facility['distance_miles'], rel=1e-12)
+
+def test_shared_memory_copy_keeps_values_and_dtypes():
+    coords = facility_coordinate_arrays(DB)
+    shm, layout = publish_facility_arrays(DB)
+    try:
+        attached, arrays = attach_facility_arrays(shm.name, layout)
+        try:
+            assert arrays.keys() == coords.keys()
+            for name, column in coords.items():
+                assert arrays[name].dtype == column.dtype and not arrays[name].flags.writeable
+                np.testing.assert_array_equal(arrays[name], column)
+        finally:
+            del arrays
+            attached.close()
+    finally:
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,99 @@
+"""
+Excel reports: workbooks read back to the same values as the CSV output and the analysis.
+"""
+
+import csv
+import io
+
+import openpyxl
+import pytest
+
+from clean_futures.batch import BATCH_OUTPUT_COLUMNS, BATCH_SIMULATION_COLUMNS, run_batch
+from clean_futures.excel_report import write_site_report
+from clean_futures.facilities import default_facilities_database, freeze_facilities_database
+from clean_futures.geo import get_regulatory_thresholds
+from clean_futures.recommendation import analyze_site
+
+DB = freeze_facilities_database(default_facilities_database())
+
+BATCH_INPUT = """site_id,site_lat,site_lon,volume_cy,tph_level,chloride_level,needs_backfill,num_trucks
+S1,32.1,-102.4,900,1500,2000,yes,3
+S2,31.2,-103.9,12000,6000,9000,no,8
+bad,,-102.0,50,0,0,,
+S4,33.5,-101.1,35.5,0,0,yes,1
+"""
+
+def _assert_same_cell(value, text):
+    """A workbook cell against the CSV text for the same value"""
+    if value is None:
+        assert text == ''
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        # openpyxl stores 16 significant digits, and whole floats read back as ints
+        assert value == pytest.approx(float(text), rel=1e-15, abs=0)
+    else:
+        assert str(value) == text
+
+@pytest.mark.parametrize('simulate', [False, True], ids=['plain', 'simulated'])
+def test_batch_workbook_matches_csv_output(simulate):
+    text = io.StringIO()
+    counts = run_batch(io.StringIO(BATCH_INPUT), text, db=DB, simulate=simulate)
+    text.seek(0)
+    expected = list(csv.reader(text))
+    
+    binary = io.BytesIO()
+    assert run_batch(io.StringIO(BATCH_INPUT), binary, db=DB, simulate=simulate, excel=True) == counts
+    binary.seek(0)
+    workbook = openpyxl.load_workbook(binary)
+    assert workbook.sheetnames == ['Summary', 'Sites', 'Regulatory Thresholds']
+    
+    rows = list(workbook['Sites'].iter_rows(values_only=True))
+    assert list(rows[0]) == expected[0] == BATCH_OUTPUT_COLUMNS + (BATCH_SIMULATION_COLUMNS if simulate else [])
+    assert len(rows) == len(expected)
+    for row, text_row in zip(rows[1:], expected[1:]):
+        assert len(row) == len(text_row)
+        for value, text in zip(row, text_row):
+            _assert_same_cell(value, text)
+    
+    summary = dict(workbook['Summary'].iter_rows(values_only=True))
+    assert (summary['Sites Processed'], summary['Sites With Errors']) == counts == (4, 1)
+    assert summary['Truck Cycle Simulation'] == ('Yes' if simulate else 'No')
+    
+    thresholds = list(workbook['Regulatory Thresholds'].iter_rows(values_only=True))
+    assert [row[0] for row in thresholds[1:]] == ['Texas', 'New Mexico', 'New Mexico', 'New Mexico']
+
+def test_site_report_matches_the_analysis():
+    analysis = {
+        'site_lat': 32.1, 'site_lon': -102.4, 'volume_cy': 900.0, 'tph_level': 1500, 'chloride_level': 2000,
+        'soil_permeability': 'medium', 'groundwater_depth': None, 'needs_backfill': True,
+        'landfill_has_backfill': False, 'extra_backfill_minutes': 30, 'num_trucks': 3,
+        'equipment_capacity_per_day': 300, 'advanced_params': {'truck_hourly_rate': 95},
+        'priorities': {'cost': 'high', 'speed': 'medium', 'esg': 'low'}
+    }
+    results = analyze_site(analysis, DB)
+    thresholds = get_regulatory_thresholds('Texas')
+    output = io.BytesIO()
+    write_site_report(output, analysis, results, 'Texas', 'Ector', 'Sandy loam', thresholds)
+    output.seek(0)
+    workbook = openpyxl.load_workbook(output)
+    
+    inputs = dict(workbook['Inputs'].iter_rows(min_row=2, values_only=True))
+    assert inputs['County'] == 'Ector'
+    assert inputs['Volume (CY)'] == analysis['volume_cy']
+    assert inputs['Groundwater Depth'] is None
+    assert inputs['Cost Priority'] == 'high'
+    assert inputs['Advanced: truck_hourly_rate'] == 95
+    
+    header, *rows = workbook['Options'].iter_rows(values_only=True)
+    by_option = {row[0]: dict(zip(header, row)) for row in rows}
+    for opt_type in ('dig_haul', 'onsite', 'surface'):
+        option = results[opt_type]
+        row = by_option[option['option_name']]
+        assert row['Total Cost ($)'] == option['total_cost']
+        assert row['Project Days'] == option['project_days']
+        assert row['Recommended'] == (opt_type == results['recommended'])
+        assert row['Score'] == results['scores'][opt_type]
+    
+    bottleneck = {row[0]: row[1] for row in workbook['Bottleneck'].iter_rows(min_row=2, values_only=True)}
+    assert bottleneck == {results[opt_type]['option_name']: results[opt_type]['bottleneck']
+                          for opt_type in ('dig_haul', 'surface')}
+    assert len(list(workbook['Regulatory Thresholds'].iter_rows(min_row=2))) == len(thresholds)
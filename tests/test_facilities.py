@@ -0,0 +1,128 @@
+"""
+Facilities snapshot: sharing, hot reload, derived-structure carry-over and build locking.
+"""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from clean_futures import facilities
+from clean_futures.distance_matrix import facility_coordinate_arrays
+from clean_futures.facilities import default_facilities_database, get_derived, get_facilities_database
+from clean_futures.geo import get_acceptance_index, get_spatial_index
+
+@pytest.fixture
+def facilities_file(tmp_path, monkeypatch):
+    """A facilities file at CLEAN_FUTURES_FACILITIES_DB and a fresh process-wide store"""
+    path = tmp_path / 'facilities.json'
+    monkeypatch.setenv('CLEAN_FUTURES_FACILITIES_DB', str(path))
+    monkeypatch.setattr(facilities, '_STORE', {'current': (None, None), 'reload_lock': threading.Lock()})
+    _write(path, default_facilities_database())
+    return path
+
+def _write(path, db):
+    """Write db and move the mtime forward, so every write counts as a change"""
+    previous = os.stat(path).st_mtime_ns if path.exists() else 0
+    path.write_text(json.dumps(db), encoding='utf-8')
+    mtime = max(os.stat(path).st_mtime_ns, previous + 1_000_000_000)
+    os.utime(path, ns=(mtime, mtime))
+
+def _edited(change):
+    db = default_facilities_database()
+    change(db)
+    return db
+
+def test_snapshot_is_shared_and_read_only(facilities_file):
+    snapshot = get_facilities_database()
+    assert get_facilities_database() is snapshot
+    with pytest.raises(TypeError):
+        snapshot['landfills'][0]['disposal_cost_cy'] = 1
+    with pytest.raises(TypeError):
+        snapshot['landfills'] = ()
+
+def test_file_change_reloads_and_carries_over_unaffected_structures(facilities_file):
+    old = get_facilities_database()
+    spatial = get_spatial_index(old, 'landfills')
+    acceptance = get_acceptance_index(old)
+    arrays = facility_coordinate_arrays(old)
+    get_spatial_index(old, 'clean_futures_facilities')
+    
+    # A rate change: indexes keep their shape but point at the new records; the arrays hold rates
+    _write(facilities_file, _edited(lambda db: db['landfills'][0].update(disposal_cost_cy=99)))
+    new = get_facilities_database()
+    assert new is not old
+    assert new['landfills'][0]['disposal_cost_cy'] == 99
+    assert old['landfills'][0]['disposal_cost_cy'] != 99
+    assert new['_derived'][('spatial_index', 'landfills')]['root'] is spatial['root']
+    assert get_spatial_index(new, 'landfills')['facilities'] is new['landfills']
+    assert get_acceptance_index(new)['landfills'] is new['landfills']
+    assert get_acceptance_index(new) is not acceptance
+    assert 'coordinate_arrays' not in new['_derived']
+    assert facility_coordinate_arrays(new)['landfill_disposal_cost'][0] == 99
+    assert arrays['landfill_disposal_cost'][0] != 99
+    # Untouched CF facilities keep their index outright
+    assert (new['_derived'][('spatial_index', 'clean_futures_facilities')]['root'] is
+            old['_derived'][('spatial_index', 'clean_futures_facilities')]['root'])
+
+def test_moving_a_facility_rebuilds_its_indexes(facilities_file):
+    old = get_facilities_database()
+    get_spatial_index(old, 'landfills')
+    get_acceptance_index(old)
+    _write(facilities_file, _edited(lambda db: db['landfills'][0].update(latitude=33.3)))
+    new = get_facilities_database()
+    assert ('spatial_index', 'landfills') not in new['_derived']
+    assert 'acceptance_index' not in new['_derived']
+    assert get_spatial_index(new, 'landfills')['root'] is not None
+
+def test_touched_file_carries_everything_over(facilities_file):
+    old = get_facilities_database()
+    arrays = facility_coordinate_arrays(old)
+    memo = get_derived(old, 'memo', dict)
+    _write(facilities_file, default_facilities_database())
+    new = get_facilities_database()
+    assert new is not old
+    assert facility_coordinate_arrays(new) is arrays
+    assert get_derived(new, 'memo', dict) is memo
+
+def test_bad_file_keeps_the_previous_snapshot(facilities_file, caplog):
+    snapshot = get_facilities_database()
+    _write(facilities_file, _edited(lambda db: db['landfills'][0].pop('backfill_cost_cy')))
+    assert get_facilities_database() is snapshot
+    assert 'missing backfill_cost_cy' in caplog.text
+    facilities_file.write_text('{not json', encoding='utf-8')
+    os.utime(facilities_file, ns=(time.time_ns() + 5_000_000_000,) * 2)
+    assert get_facilities_database() is snapshot
+
+def test_plain_dicts_are_not_modified():
+    db = default_facilities_database()
+    arrays = facility_coordinate_arrays(db)
+    assert '_derived' not in db
+    assert facility_coordinate_arrays(db) is arrays
+    # Another dict, even with equal contents, has its own structures
+    assert facility_coordinate_arrays(default_facilities_database()) is not arrays
+
+def test_concurrent_first_use_builds_once_and_other_keys_do_not_wait():
+    db = default_facilities_database()
+    started, release = threading.Event(), threading.Event()
+    builds = []
+    
+    def slow_build():
+        builds.append(1)
+        started.set()
+        release.wait(5)
+        return 'slow'
+    
+    threads = [threading.Thread(target=get_derived, args=(db, 'slow', slow_build)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    # The slow build holds only its own key's lock
+    assert get_derived(db, 'fast', lambda: 'fast') == 'fast'
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(builds) == 1
+    assert get_derived(db, 'slow', slow_build) == 'slow'
@@ -0,0 +1,123 @@
+"""
+Nearest-facility raster: lookups must agree with a brute-force haversine scan.
+"""
+
+import itertools
+import os
+import stat
+
+import numpy as np
+import pytest
+
+from clean_futures import facility_raster
+from clean_futures.counties import COUNTY_RASTER_LAT_RANGE, COUNTY_RASTER_LON_RANGE
+from clean_futures.facilities import default_facilities_database, freeze_facilities_database
+from clean_futures.facility_raster import (get_facility_raster, raster_nearest_batch, raster_nearest_cf_facility,
+                                          raster_nearest_landfill)
+from clean_futures.geo import find_nearest_cf_facility, find_nearest_qualified_landfill, haversine_distance
+
+SEED = 20240618
+
+# Random points checked per pair of contamination levels
+N_POINTS = 2000
+
+# Limits cycled over the default landfills so that several acceptance classes exist
+TPH_LIMITS = (2000, 5000, 10000)
+CHLORIDE_LIMITS = (5000, 10000, 20000, 40000)
+
+# Levels tried: absent (0), on and between the limits, and above all of them
+TPH_LEVELS = (0, 1500, 2000, 3000, 5000, 10000, 25000)
+CHLORIDE_LEVELS = (0, 5000, 7500, 20000, 40000, 50000)
+
+def _varied_db():
+    db = default_facilities_database()
+    landfills = [dict(lf, tph_max_mgkg=TPH_LIMITS[i % len(TPH_LIMITS)],
+                      chloride_max_mgkg=CHLORIDE_LIMITS[i % len(CHLORIDE_LIMITS)])
+                 for i, lf in enumerate(db['landfills'])]
+    return freeze_facilities_database(dict(db, landfills=landfills))
+
+DB = _varied_db()
+
+@pytest.fixture(scope='module')
+def points():
+    """Random points over the raster box and a margin around it"""
+    rng = np.random.default_rng(SEED)
+    lats = rng.uniform(COUNTY_RASTER_LAT_RANGE[0] - 0.5, COUNTY_RASTER_LAT_RANGE[1] + 0.5, N_POINTS)
+    lons = rng.uniform(COUNTY_RASTER_LON_RANGE[0] - 0.5, COUNTY_RASTER_LON_RANGE[1] + 0.5, N_POINTS)
+    return lats, lons
+
+def _brute_force(records, lat, lon, accepts=lambda record: True):
+    """(distance, position) of the nearest accepting record, first listed on ties; None if none accept"""
+    candidates = [(haversine_distance(lat, lon, r['latitude'], r['longitude']), position)
+                  for position, r in enumerate(records) if accepts(r)]
+    return min(candidates) if candidates else None
+
+def _assert_same_facility(position, distance, expected, records, lat, lon):
+    assert distance == pytest.approx(expected[0], abs=1e-9), (lat, lon)
+    if position != expected[1]:
+        # Only an exact tie may resolve differently
+        assert haversine_distance(lat, lon, records[position]['latitude'],
+                                  records[position]['longitude']) == expected[0], (lat, lon)
+
+def test_the_varied_database_has_several_classes():
+    raster = get_facility_raster(DB)
+    assert len(set(raster['class_layers'].values())) >= 6
+
+@pytest.mark.parametrize('tph_level, chloride_level', list(itertools.product(TPH_LEVELS, CHLORIDE_LEVELS)))
+def test_landfills_match_brute_force(points, tph_level, chloride_level):
+    raster = get_facility_raster(DB)
+    landfills = DB['landfills']
+    lats, lons = points
+    positions, distances = raster_nearest_batch(raster, DB, lats, lons, [tph_level] * N_POINTS,
+                                                [chloride_level] * N_POINTS)
+    
+    def accepts(record):
+        return record['tph_max_mgkg'] >= tph_level and record['chloride_max_mgkg'] >= chloride_level
+    
+    resolved = 0
+    for lat, lon, position, distance in zip(lats.tolist(), lons.tolist(), positions.tolist(), distances.tolist()):
+        expected = _brute_force(landfills, lat, lon, accepts)
+        inside = (COUNTY_RASTER_LAT_RANGE[0] <= lat <= COUNTY_RASTER_LAT_RANGE[1] and
+                  COUNTY_RASTER_LON_RANGE[0] <= lon <= COUNTY_RASTER_LON_RANGE[1])
+        scalar = raster_nearest_landfill(raster, DB, lat, lon, tph_level, chloride_level)
+        assert scalar[0] == position
+        if position >= 0:
+            assert inside and expected is not None
+            _assert_same_facility(position, distance, expected, landfills, lat, lon)
+            resolved += 1
+    
+        # The full lookup (raster, then spatial index) always gives the brute-force answer
+        nearest = find_nearest_qualified_landfill(lat, lon, tph_level, chloride_level, True, DB)
+        if expected is None:
+            assert nearest is None
+        else:
+            _assert_same_facility(landfills.index(nearest['landfill']), nearest['distance_miles'], expected,
+                                  landfills, lat, lon)
+    if any(accepts(lf) for lf in landfills):
+        # Most in-box points resolve from the raster alone
+        assert resolved > N_POINTS * 0.5
+
+def test_cf_facilities_match_brute_force(points):
+    raster = get_facility_raster(DB)
+    facilities = DB['clean_futures_facilities']
+    lats, lons = points
+    positions, distances = raster_nearest_batch(raster, DB, lats, lons)
+    for lat, lon, position, distance in zip(lats.tolist(), lons.tolist(), positions.tolist(), distances.tolist()):
+        expected = _brute_force(facilities, lat, lon)
+        assert raster_nearest_cf_facility(raster, DB, lat, lon)[0] == position
+        if position >= 0:
+            _assert_same_facility(position, distance, expected, facilities, lat, lon)
+        nearest = find_nearest_cf_facility(lat, lon, DB)
+        _assert_same_facility(facilities.index(nearest['facility']), nearest['distance_miles'], expected,
+                              facilities, lat, lon)
+
+def test_cached_raster_is_shared_and_reloaded():
+    db = default_facilities_database()
+    built = get_facility_raster(db)
+    [cache] = [name for name in os.listdir(facility_raster.DATA_DIR)
+               if name.startswith(facility_raster.FACILITY_RASTER_PREFIX)]
+    assert stat.S_IMODE(os.stat(facility_raster.DATA_DIR / cache).st_mode) == 0o644
+    
+    reloaded = get_facility_raster(default_facilities_database())
+    assert isinstance(reloaded['grid'].base, np.memmap)
+    np.testing.assert_array_equal(reloaded['grid'], built['grid'])
@@ -0,0 +1,77 @@
+"""
+Fleet optimizer: the pick meets the deadline and is the cheapest configuration that does.
+"""
+
+import itertools
+
+import pytest
+
+from clean_futures.calculators import calculate_dig_and_haul
+from clean_futures.facilities import default_facilities_database, freeze_facilities_database
+from clean_futures.fleet import FLEET_EXCAVATOR_CLASSES, FLEET_LOADER_CLASSES, optimize_fleet
+
+DB = freeze_facilities_database(default_facilities_database())
+
+ADVANCED_PARAMS = {'truck_capacity_cy': 16, 'truck_hourly_rate': 95, 'work_hours_per_day': 10,
+                   'disposal_cost_cy': 28, 'backfill_cost_cy': 11, 'surface_processing_cost_cy': 24}
+
+SITE = {
+    'site_lat': 31.9, 'site_lon': -102.3, 'volume_cy': 6000.0, 'tph_level': 1000, 'chloride_level': 2000,
+    'soil_permeability': 'medium', 'groundwater_depth': None, 'needs_backfill': True,
+    'landfill_has_backfill': False, 'extra_backfill_minutes': 30, 'num_trucks': 3,
+    'equipment_capacity_per_day': 300, 'advanced_params': ADVANCED_PARAMS,
+    'priorities': {'cost': 'medium', 'speed': 'medium', 'esg': 'medium'}
+}
+
+# A small sweep, so that every configuration can also be costed one at a time
+SWEEP = {'max_trucks': 6, 'max_excavators': 2, 'max_loaders': 2}
+
+def _dig_haul_configurations():
+    """(project_days, total_cost) of every swept configuration from the scalar calculator"""
+    results = []
+    for trucks, excavators, excavator, loaders, loader in itertools.product(
+            range(1, SWEEP['max_trucks'] + 1), range(1, SWEEP['max_excavators'] + 1), FLEET_EXCAVATOR_CLASSES,
+            range(1, SWEEP['max_loaders'] + 1), FLEET_LOADER_CLASSES):
+        # The scalar calculator charges one machine of each kind, so the rates carry the counts
+        params = dict(ADVANCED_PARAMS, num_trucks=trucks, num_excavators=excavators, num_loaders=loaders,
+                      excavator_capacity_cy_hr=excavator[0], excavator_rate=excavator[1] * excavators,
+                      loader_capacity_cy_hr=loader[0], loader_rate=loader[1] * loaders)
+        result = calculate_dig_and_haul(SITE['volume_cy'], SITE['site_lat'], SITE['site_lon'], True,
+                                        SITE['tph_level'], SITE['chloride_level'], DB,
+                                        extra_backfill_minutes=SITE['extra_backfill_minutes'],
+                                        advanced_params=params)
+        results.append((result['project_days'], result['total_cost']))
+    return results
+
+@pytest.mark.parametrize('deadline_days', [None, 10, 15, 20, 25, 50, 100])
+def test_best_is_the_cheapest_configuration_meeting_the_deadline(deadline_days):
+    fleet = optimize_fleet(SITE, deadline_days, db=DB, **SWEEP)
+    feasible = [cost for days, cost in _dig_haul_configurations() if deadline_days is None or days <= deadline_days]
+    best = fleet['dig_haul']['best']
+    if not feasible:
+        assert best is None
+        assert fleet['dig_haul']['fastest_days'] > deadline_days
+        return
+    assert deadline_days is None or best['project_days'] <= deadline_days
+    assert best['total_cost'] == pytest.approx(min(feasible))
+
+@pytest.mark.parametrize('deadline_days', [1, 4, 5, 10, 30])
+def test_every_pick_meets_the_deadline(deadline_days):
+    fleet = optimize_fleet(SITE, deadline_days, db=DB)
+    for opt_type in ('dig_haul', 'surface'):
+        option = fleet[opt_type]
+        best = option['best']
+        # The cheapest configuration within the deadline always lies on the cost-versus-days curve
+        on_time = [point['total_cost'] for point in option['curve'] if point['project_days'] <= deadline_days]
+        if best is None:
+            assert option['fastest_days'] > deadline_days and not on_time
+        else:
+            assert best['project_days'] <= deadline_days
+            assert best['total_cost'] == pytest.approx(min(on_time))
+
+def test_curve_trades_days_for_cost():
+    curve = optimize_fleet(SITE, db=DB)['surface']['curve']
+    days = [point['project_days'] for point in curve]
+    costs = [point['total_cost'] for point in curve]
+    assert days == sorted(set(days))
+    assert costs == sorted(costs, reverse=True) and len(set(costs)) == len(costs)
@@ -0,0 +1,60 @@
+"""
+Monte Carlo: a fixed seed reproduces the run, and each input keeps its own random stream.
+"""
+
+import pytest
+
+from clean_futures.facilities import default_facilities_database, freeze_facilities_database
+from clean_futures.montecarlo import DEFAULT_MONTE_CARLO_DISTRIBUTIONS, MONTE_CARLO_METRICS, monte_carlo_site
+
+DB = freeze_facilities_database(default_facilities_database())
+
+DRAWS = 2000
+
+SITE = {
+    'site_lat': 31.9, 'site_lon': -102.3, 'volume_cy': 1500.0, 'tph_level': 1000, 'chloride_level': 2000,
+    'soil_permeability': 'medium', 'groundwater_depth': None, 'needs_backfill': True,
+    'landfill_has_backfill': False, 'extra_backfill_minutes': 30, 'num_trucks': 3,
+    'equipment_capacity_per_day': 300, 'advanced_params': None,
+    'priorities': {'cost': 'medium', 'speed': 'medium', 'esg': 'medium'}
+}
+
+VOLUME = {'dist': 'triangular', 'low': 0.8, 'mode': 1.0, 'high': 1.5, 'relative': True}
+
+def test_fixed_seed_reproduces_the_run():
+    first = monte_carlo_site(SITE, draws=DRAWS, seed=7, db=DB)
+    again = monte_carlo_site(SITE, draws=DRAWS, seed=7, db=DB)
+    assert again['options'] == first['options']
+    assert again['recommendation_probability'] == first['recommendation_probability']
+    assert monte_carlo_site(SITE, draws=DRAWS, seed=8, db=DB)['options'] != first['options']
+
+def test_returned_seed_reproduces_an_unseeded_run():
+    first = monte_carlo_site(SITE, draws=DRAWS, db=DB)
+    again = monte_carlo_site(SITE, draws=DRAWS, seed=first['seed'], db=DB)
+    assert again['options'] == first['options']
+
+def test_adding_an_input_keeps_the_other_draws():
+    # On-site remediation uses the volume draws but not the trucking inputs
+    volume_only = monte_carlo_site(SITE, {'volume_cy': VOLUME}, draws=DRAWS, seed=11, db=DB)
+    trucking = {name: DEFAULT_MONTE_CARLO_DISTRIBUTIONS[name]
+                for name in ('avg_speed_mph', 'loading_time_hours', 'truck_hourly_rate')}
+    more = monte_carlo_site(SITE, dict(trucking, volume_cy=VOLUME), draws=DRAWS, seed=11, db=DB)
+    assert more['options']['onsite']['total_cost'] == volume_only['options']['onsite']['total_cost']
+    assert more['options']['dig_haul']['total_cost'] != volume_only['options']['dig_haul']['total_cost']
+
+def test_no_uncertainty_gives_the_point_values():
+    result = monte_carlo_site(SITE, {}, draws=50, seed=1, db=DB)
+    for opt_type in ('dig_haul', 'onsite', 'surface'):
+        for metric in MONTE_CARLO_METRICS:
+            expected = result['baseline'][opt_type][metric]
+            for value in result['options'][opt_type][metric].values():
+                assert value == pytest.approx(expected)
+    assert result['recommendation_probability'][result['baseline']['recommended']] == 1.0
+
+def test_recommendation_shares_sum_to_one():
+    result = monte_carlo_site(SITE, draws=DRAWS, seed=3, db=DB)
+    assert sum(result['recommendation_probability'].values()) == pytest.approx(1.0)
+
+def test_unknown_inputs_are_rejected():
+    with pytest.raises(ValueError, match='Unknown Monte Carlo inputs: fuel_price'):
+        monte_carlo_site(SITE, {'fuel_price': 4.0}, db=DB)
@@ -0,0 +1,102 @@
+"""
+Parquet output: the dataset holds the CSV output's values under the declared schema.
+"""
+
+import csv
+import io
+import os
+from urllib.parse import unquote
+
+import pytest
+
+from clean_futures import parquet_output
+from clean_futures.batch import BATCH_OUTPUT_COLUMNS, BATCH_SIMULATION_COLUMNS, run_batch
+from clean_futures.facilities import default_facilities_database, freeze_facilities_database
+from clean_futures.parquet_output import PARQUET_PARTITION_COLUMNS, batch_parquet_schema, write_batch_parquet
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+DB = freeze_facilities_database(default_facilities_database())
+
+# Sites over several Texas and New Mexico counties, one the landfills cannot
+# take, one outside both states and one that does not parse
+BATCH_INPUT = """site_id,site_lat,site_lon,volume_cy,tph_level,chloride_level,needs_backfill,num_trucks
+S1,32.1,-102.4,900,1500,2000,yes,3
+S2,31.2,-103.9,12000,6000,9000,no,8
+S3,32.1,-102.41,450,800,300,yes,2
+S4,32.7,-103.6,2000,2500,1000,yes,4
+S5,31.9,-102.3,300,10000000,0,no,3
+S6,32.4,-104.1,75,0,0,yes,1
+S7,35.0,-90.0,100,0,0,yes,1
+bad,,-102.0,50,0,0,,
+S9,31.5,-102.0,7800,100,100,no,6
+"""
+
+def _read_dataset(output_dir):
+    """Every row of the dataset by site_id, with the partition values from the directory names"""
+    rows = {}
+    file_schemas = []
+    for directory, _, files in os.walk(output_dir):
+        for name in sorted(files):
+            path = os.path.join(directory, name)
+            partition = {}
+            for part in os.path.relpath(directory, output_dir).split(os.sep):
+                key, value = part.split('=', 1)
+                partition[key] = None if value == '__HIVE_DEFAULT_PARTITION__' else unquote(value)
+            table = pq.read_table(path)
+            file_schemas.append(table.schema)
+            for row in table.to_pylist():
+                rows[row['site_id']] = dict(row, **partition)
+    return rows, file_schemas
+
+def _csv_rows(text, simulate):
+    output = io.StringIO()
+    run_batch(io.StringIO(text), output, db=DB, simulate=simulate)
+    output.seek(0)
+    return {row['site_id']: row for row in csv.DictReader(output)}
+
+def _assert_matches_csv(rows, text, simulate):
+    expected = _csv_rows(text, simulate)
+    assert rows.keys() == expected.keys()
+    columns = BATCH_OUTPUT_COLUMNS + (BATCH_SIMULATION_COLUMNS if simulate else [])
+    for site_id, row in rows.items():
+        for column in columns:
+            value = row[column]
+            assert ('' if value is None else str(value)) == expected[site_id][column], (site_id, column)
+
+@pytest.mark.parametrize('simulate', [False, True], ids=['plain', 'simulated'])
+def test_dataset_matches_csv_output(tmp_path, simulate):
+    output_dir = tmp_path / 'dataset'
+    assert write_batch_parquet(io.StringIO(BATCH_INPUT), str(output_dir), db=DB, simulate=simulate) == (9, 1)
+    rows, file_schemas = _read_dataset(output_dir)
+    _assert_matches_csv(rows, BATCH_INPUT, simulate)
+    
+    # Partition columns live only in the directory names
+    schema = batch_parquet_schema()
+    for file_schema in file_schemas:
+        assert file_schema.names == [name for name in schema.names if name not in PARQUET_PARTITION_COLUMNS]
+        assert all(file_schema.field(name).type == schema.field(name).type for name in file_schema.names)
+        assert file_schema.metadata == schema.metadata
+    assert len({row['county'] for row in rows.values()}) >= 4
+    assert rows['bad']['state'] is None and rows['bad']['error']
+    assert rows['S5']['dig_haul_total_cost'] is None and rows['S5']['surface_total_cost'] is not None
+
+def test_small_row_groups_and_few_open_files_keep_every_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(parquet_output, 'PARQUET_ROW_GROUP_ROWS', 2)
+    monkeypatch.setattr(parquet_output, 'PARQUET_MAX_BUFFERED_ROWS', 3)
+    monkeypatch.setattr(parquet_output, 'PARQUET_BUFFER_PIECES', 1)
+    monkeypatch.setattr(parquet_output, 'PARQUET_MAX_OPEN_FILES', 2)
+    # Every site again under a new id, so partitions come back after their files were closed
+    header, *lines = BATCH_INPUT.splitlines()
+    text = '\n'.join([header] + lines + [line.replace(',', 'b,', 1) for line in lines]) + '\n'
+    output_dir = tmp_path / 'dataset'
+    write_batch_parquet(io.StringIO(text), str(output_dir), db=DB, chunk_size=2)
+    rows, file_schemas = _read_dataset(output_dir)
+    _assert_matches_csv(rows, text, False)
+    # Partitions that were closed and reopened continue in a new part file
+    assert len(file_schemas) > len({(row['state'], row['county']) for row in rows.values()})
+
+def test_output_directory_must_be_empty(tmp_path):
+    (tmp_path / 'old.parquet').write_bytes(b'')
+    with pytest.raises(ValueError, match='output directory is not empty'):
+        write_batch_parquet(io.StringIO(BATCH_INPUT), str(tmp_path), db=DB)
@@ -0,0 +1,75 @@
+"""
+Results pipeline: stages are reused until something they read changes.
+"""
+
+from clean_futures.facilities import freeze_facilities_database
+from clean_futures.pipeline import pipeline_cache_stats, run_pipeline
+
+ANALYSIS = {
+    'site_lat': 32.0,
+    'site_lon': -102.07,
+    'volume_cy': 800.0,
+    'tph_level': 1200.0,
+    'chloride_level': 900.0,
+    'soil_permeability': 'medium',
+    'groundwater_depth': '>100 ft',
+    'needs_backfill': True,
+    'landfill_has_backfill': False,
+    'extra_backfill_minutes': 30,
+    'num_trucks': 3,
+    'equipment_capacity_per_day': 300,
+    'advanced_params': None,
+    'priorities': {'cost': 'high', 'speed': 'medium', 'esg': 'low'}
+}
+
+# Stages that route over the road network, and the stages built from them
+ROAD_STAGES = {'nearest_landfill', 'nearest_facility', 'dig_haul', 'surface', 'candidates', 'scoring'}
+
+def _statuses(trace):
+    return {entry['stage']: entry['status'] for entry in trace}
+
+def test_unchanged_inputs_reuse_every_stage(road_db):
+    db = freeze_facilities_database(road_db)
+    first, _ = run_pipeline(ANALYSIS, db)
+    second, trace = run_pipeline(ANALYSIS, db)
+    assert set(_statuses(trace).values()) == {'reused'}
+    assert second['dig_haul'] is first['dig_haul']
+
+def test_priority_change_reruns_only_scoring(road_db):
+    db = freeze_facilities_database(road_db)
+    run_pipeline(ANALYSIS, db)
+    _, trace = run_pipeline(dict(ANALYSIS, priorities={'cost': 'low', 'speed': 'high', 'esg': 'high'}), db)
+    statuses = _statuses(trace)
+    assert statuses.pop('scoring') == 'computed'
+    assert set(statuses.values()) == {'reused'}
+
+def test_road_network_changes_recompute_lookup_stages(road_db, install_roads):
+    db = freeze_facilities_database(road_db)
+    straight, _ = run_pipeline(ANALYSIS, db)
+    assert 'drive_hours' not in straight['nearest_landfill']
+    
+    install_roads()
+    routed, trace = run_pipeline(ANALYSIS, db)
+    statuses = _statuses(trace)
+    assert {name for name, status in statuses.items() if status == 'computed'} == ROAD_STAGES
+    assert routed['nearest_landfill']['drive_hours'] > 0
+    assert routed['dig_haul']['total_cost'] != straight['dig_haul']['total_cost']
+    
+    # Same graph file: everything is reused
+    _, trace = run_pipeline(ANALYSIS, db)
+    assert set(_statuses(trace).values()) == {'reused'}
+    
+    # Edited graph file: the lookups run again
+    install_roads(scale_hours=2.0)
+    slower, trace = run_pipeline(ANALYSIS, db)
+    assert {name for name, status in _statuses(trace).items() if status == 'computed'} == ROAD_STAGES
+    assert slower['nearest_landfill']['drive_hours'] > routed['nearest_landfill']['drive_hours']
+
+def test_cache_stats_count_stage_hits_and_misses(road_db):
+    db = freeze_facilities_database(road_db)
+    _, trace = run_pipeline(ANALYSIS, db)
+    run_pipeline(ANALYSIS, db)
+    stats = pipeline_cache_stats(db)
+    assert stats['misses'] == len(trace)
+    assert stats['hits'] == len(trace)
+    assert stats['size'] == len(trace)
@@ -0,0 +1,68 @@
+"""
+Portfolio evaluation: a process pool must give exactly what the serial run gives.
+"""
+
+import csv
+import io
+
+import numpy as np
+import pytest
+
+from clean_futures.batch import run_batch
+from clean_futures.facilities import default_facilities_database, freeze_facilities_database
+from clean_futures.portfolio import evaluate_portfolio
+
+SEED = 20240611
+
+N_SITES = 60
+
+def _random_sites(rng, lat_range=(30.6, 34.4), lon_range=(-104.6, -100.4)):
+    return [{
+        'site_lat': float(rng.uniform(*lat_range)), 'site_lon': float(rng.uniform(*lon_range)),
+        'volume_cy': float(rng.uniform(20, 20000)), 'tph_level': int(rng.choice([0, 800, 4000, 6000])),
+        'chloride_level': int(rng.choice([0, 3000, 9000])), 'soil_permeability': 'medium',
+        'groundwater_depth': None, 'needs_backfill': bool(rng.random() < 0.7), 'landfill_has_backfill': False,
+        'extra_backfill_minutes': 30, 'num_trucks': int(rng.integers(1, 8)), 'equipment_capacity_per_day': 300,
+        'advanced_params': None, 'priorities': {'cost': 'medium', 'speed': 'medium', 'esg': 'medium'}
+    } for _ in range(N_SITES)]
+
+def test_pool_matches_serial_run():
+    db = freeze_facilities_database(default_facilities_database())
+    sites = _random_sites(np.random.default_rng(SEED))
+    # An unlocatable site keeps its place and its error
+    sites[7] = dict(sites[7], site_lat=float('nan'))
+    serial = list(evaluate_portfolio(sites, db, workers=1, chunk_size=7))
+    pooled = list(evaluate_portfolio(sites, db, workers=2, chunk_size=7))
+    assert pooled == serial
+    assert serial[7]['error'] and not serial[0]['error']
+
+def test_pool_matches_serial_run_on_roads(install_roads, road_db):
+    install_roads()
+    sites = _random_sites(np.random.default_rng([SEED, 1]), (31.95, 32.05), (-102.2, -101.95))
+    # On node 1: 3 road miles to the landfill, against under 3 in a straight line
+    sites[0] = dict(sites[0], site_lat=32.0, site_lon=-102.05)
+    serial = list(evaluate_portfolio(sites, road_db, workers=1, chunk_size=9))
+    pooled = list(evaluate_portfolio(sites, road_db, workers=2, chunk_size=9))
+    assert pooled == serial
+    assert serial[0]['results']['dig_haul']['distance_miles'] == pytest.approx(3.0)
+
+@pytest.mark.parametrize('simulate', [False, True], ids=['plain', 'simulated'])
+def test_batch_output_is_identical_with_workers(simulate):
+    rng = np.random.default_rng([SEED, 2])
+    source = io.StringIO()
+    writer = csv.DictWriter(source, fieldnames=['site_id', 'site_lat', 'site_lon', 'volume_cy', 'tph_level',
+                                                'chloride_level', 'num_trucks'])
+    writer.writeheader()
+    for i, site in enumerate(_random_sites(rng)):
+        writer.writerow({'site_id': f"S{i}", 'site_lat': site['site_lat'], 'site_lon': site['site_lon'],
+                         'volume_cy': site['volume_cy'], 'tph_level': site['tph_level'],
+                         'chloride_level': site['chloride_level'], 'num_trucks': site['num_trucks']})
+    writer.writerow({'site_id': 'bad', 'site_lat': '', 'site_lon': '-102', 'volume_cy': '5'})
+    
+    outputs = []
+    for workers in (1, 2):
+        output = io.StringIO()
+        counts = run_batch(io.StringIO(source.getvalue()), output, chunk_size=8, workers=workers, simulate=simulate)
+        outputs.append((counts, output.getvalue()))
+    assert outputs[0] == outputs[1]
+    assert outputs[0][0] == (N_SITES + 1, 1)
@@ -0,0 +1,96 @@
+"""
+Result records: the calculators' slotted records behave like the dicts they replaced.
+"""
+
+import dataclasses
+import json
+import pickle
+
+import pytest
+
+from clean_futures.facilities import default_facilities_database, freeze_facilities_database
+from clean_futures.recommendation import analyze_site
+from clean_futures.records import DigHaulResult, OnsiteResult, SiteResults, SurfaceResult
+
+DB = freeze_facilities_database(default_facilities_database())
+
+SITE = {
+    'site_lat': 32.1, 'site_lon': -102.4, 'volume_cy': 900.0, 'tph_level': 1500, 'chloride_level': 2000,
+    'soil_permeability': 'medium', 'groundwater_depth': None, 'needs_backfill': True,
+    'landfill_has_backfill': False, 'extra_backfill_minutes': 30, 'num_trucks': 3,
+    'equipment_capacity_per_day': 300, 'advanced_params': None,
+    'priorities': {'cost': 'medium', 'speed': 'medium', 'esg': 'medium'}
+}
+
+# Keys of the dicts the calculators returned before, in their order
+DICT_KEYS = {
+    DigHaulResult: (
+        'option_name', 'total_cost', 'cost_per_cy', 'project_days', 'landfill_name', 'distance_miles',
+        'avg_speed_mph', 'co2_tons', 'equipment_cost', 'trucking_cost', 'disposal_cost', 'backfill_cost',
+        'includes_backfill', 'backfill_available_at_landfill', 'bottleneck', 'truck_capacity_per_day',
+        'equipment_capacity_per_day', 'actual_daily_capacity', 'num_trucks', 'num_trips', 'trip_time_hours',
+        'base_trip_time_hours', 'extra_backfill_minutes', 'extra_backfill_co2_tons'
+    ),
+    OnsiteResult: (
+        'option_name', 'total_cost', 'cost_per_cy', 'project_days', 'processing_cost', 'mobilization_cost',
+        'amendment_cost', 'co2_tons', 'includes_backfill', 'soil_returned_clean', 'permeability_factor',
+        'rate_per_cy'
+    ),
+    SurfaceResult: (
+        'option_name', 'total_cost', 'cost_per_cy', 'project_days', 'facility_name', 'distance_miles',
+        'avg_speed_mph', 'trucking_cost', 'processing_cost', 'equipment_cost', 'co2_tons', 'includes_backfill',
+        'soil_returned_clean', 'bottleneck', 'truck_capacity_per_day', 'equipment_capacity_per_day',
+        'actual_daily_capacity', 'num_trucks', 'num_trips', 'trip_time_hours'
+    ),
+    SiteResults: ('dig_haul', 'onsite', 'surface', 'recommended', 'scores')
+}
+
+@pytest.fixture(scope='module')
+def results():
+    return analyze_site(SITE, DB)
+
+def _records(results):
+    return [results] + [results[opt_type] for opt_type in ('dig_haul', 'onsite', 'surface')]
+
+def test_records_have_the_old_keys_in_order(results):
+    for record in _records(results):
+        assert tuple(record) == DICT_KEYS[type(record)]
+        assert tuple(dict(record)) == tuple(record.keys()) == DICT_KEYS[type(record)]
+        assert len(record) == len(DICT_KEYS[type(record)])
+
+def test_records_read_like_dicts(results):
+    dig_haul = results['dig_haul']
+    plain = dict(dig_haul)
+    assert dig_haul == plain and plain == dig_haul
+    assert dig_haul['total_cost'] == dig_haul.total_cost == plain['total_cost']
+    assert dig_haul.get('bottleneck') == plain['bottleneck']
+    assert dig_haul.get('facility_name') is None and dig_haul.get('facility_name', 'n/a') == 'n/a'
+    assert 'bottleneck' in dig_haul and 'facility_name' not in results['onsite']
+    assert list(dig_haul.items()) == list(plain.items())
+    with pytest.raises(KeyError):
+        dig_haul['facility_name']
+    # Unhashable, like the dicts
+    with pytest.raises(TypeError):
+        hash(dig_haul)
+
+def test_records_serialize_like_dicts(results):
+    def to_dict(value):
+        return {key: to_dict(item) for key, item in value.items()} if hasattr(value, 'items') else value
+    
+    assert json.dumps(results, default=dict) == json.dumps(to_dict(results))
+    assert pickle.loads(pickle.dumps(results)) == results
+    assert json.loads(json.dumps(results, default=dict))['dig_haul']['total_cost'] == results['dig_haul']['total_cost']
+
+def test_records_are_read_only(results):
+    with pytest.raises(TypeError):
+        results['dig_haul']['total_cost'] = 0
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        results['dig_haul'].total_cost = 0
+    changed = dataclasses.replace(results['dig_haul'], total_cost=1.0)
+    assert changed['total_cost'] == 1.0 and dict(results['dig_haul'], total_cost=1.0) == changed
+
+def test_missing_options_are_none(results):
+    dirty = analyze_site(dict(SITE, tph_level=10 ** 7), DB)
+    assert dirty['dig_haul'] is None and 'dig_haul' in dirty
+    assert json.loads(json.dumps(dirty, default=dict))['dig_haul'] is None
+    assert dirty['recommended'] in ('onsite', 'surface')
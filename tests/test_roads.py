@@ -0,0 +1,107 @@
+"""
+Road network routing on the four-node fixture graph (see conftest.py).
+"""
+
+import logging
+import os
+import stat
+
+import numpy as np
+import pytest
+
+from clean_futures.batch import analyze_sites
+from clean_futures.distance_matrix import haversine_distance_pairs
+from clean_futures.facilities import freeze_facilities_database
+from clean_futures.geo import STRAIGHT_LINE_SPEED_MPH, find_nearest_cf_facility, find_nearest_qualified_landfill
+from clean_futures.pipeline import pipeline_results, run_pipeline
+from clean_futures.roads import (ROAD_ACCESS_SPEED_MPH, build_facility_trees, facility_road_trees,
+                                 get_road_network, road_routes, snap_to_network)
+
+# Fastest drive hours and its road miles from each node to the landfill
+# (node 0) and the CF facility (node 3), worked out by hand:
+#   to node 0: 1 -> 0; 2 -> 1 -> 0 (0.1 h beats 2 -> 0 at 0.2 and 2 -> 3 -> 0 at 0.11); 3 -> 0 one way
+#   to node 3: 2 -> 3; 1 -> 2 -> 3; 0 -> 1 -> 2 -> 3 (0.2 h beats 0 -> 2 -> 3 at 0.3)
+EXPECTED_HOURS = [[0.0, 0.2], [0.05, 0.15], [0.1, 0.1], [0.01, 0.0]]
+EXPECTED_MILES = [[0.0, 9.0], [3.0, 6.0], [6.0, 3.0], [1.0, 0.0]]
+
+SITE = {
+    'site_lat': 32.0, 'site_lon': -102.07, 'volume_cy': 800.0, 'tph_level': 1200, 'chloride_level': 900,
+    'soil_permeability': 'medium', 'groundwater_depth': None, 'needs_backfill': True,
+    'landfill_has_backfill': False, 'extra_backfill_minutes': 30, 'num_trucks': 3,
+    'equipment_capacity_per_day': 300, 'advanced_params': None,
+    'priorities': {'cost': 'medium', 'speed': 'medium', 'esg': 'medium'}
+}
+
+@pytest.fixture
+def network(install_roads):
+    install_roads()
+    return get_road_network()
+
+def test_no_graph_file_means_no_network():
+    assert get_road_network() is None
+
+def test_trees_match_hand_computed_dijkstra(network, road_db):
+    trees = build_facility_trees(network, road_db)
+    assert trees.shape == (2, 4, 2) and trees.dtype == np.float32
+    np.testing.assert_allclose(trees[0], EXPECTED_HOURS, rtol=1e-6, atol=1e-7)
+    np.testing.assert_allclose(trees[1], EXPECTED_MILES, rtol=1e-6, atol=1e-7)
+
+def test_routes_add_the_access_leg(network, road_db):
+    nodes, access = snap_to_network([SITE['site_lat']], [SITE['site_lon']], network)
+    assert nodes.tolist() == [1]
+    assert access[0] == pytest.approx(haversine_distance_pairs(32.0, -102.07, 32.0, -102.05))
+    
+    miles, hours = road_routes([SITE['site_lat']], [SITE['site_lon']], 'landfills', road_db, network)
+    assert miles[0, 0] == pytest.approx(3.0 + access[0], rel=1e-6)
+    assert hours[0, 0] == pytest.approx(0.05 + access[0] / ROAD_ACCESS_SPEED_MPH, rel=1e-6)
+    miles, hours = road_routes([SITE['site_lat']], [SITE['site_lon']], 'clean_futures_facilities', road_db, network)
+    assert miles[0, 0] == pytest.approx(6.0 + access[0], rel=1e-6)
+    assert hours[0, 0] == pytest.approx(0.15 + access[0] / ROAD_ACCESS_SPEED_MPH, rel=1e-6)
+
+def test_sites_off_the_network_use_straight_lines(network, road_db):
+    # About 35 miles north of every node
+    miles, hours = road_routes([32.5], [-102.07], 'landfills', road_db, network)
+    straight = haversine_distance_pairs(32.5, -102.07, 32.0, -102.0)
+    assert miles[0, 0] == pytest.approx(straight)
+    assert hours[0, 0] == pytest.approx(straight / STRAIGHT_LINE_SPEED_MPH)
+
+def test_nearest_lookups_report_drive_time(network, road_db):
+    landfill = find_nearest_qualified_landfill(32.0, -102.05, 1200, 900, True, road_db)
+    assert landfill['landfill'] is road_db['landfills'][0]
+    assert landfill['distance_miles'] == pytest.approx(3.0)
+    assert landfill['drive_hours'] == pytest.approx(0.05)
+    facility = find_nearest_cf_facility(32.0, -102.05, road_db)
+    assert facility['distance_miles'] == pytest.approx(6.0)
+    assert facility['drive_hours'] == pytest.approx(0.15)
+    # No landfill accepts this much TPH
+    assert find_nearest_qualified_landfill(32.0, -102.05, 10 ** 7, 900, True, road_db) is None
+
+def test_batch_lookups_match_single_site(network, road_db):
+    db = freeze_facilities_database(road_db)
+    sites = [dict(SITE, site_lon=lon) for lon in (-102.0, -102.03, -102.07, -102.12, -102.3)]
+    for site, scored in zip(sites, analyze_sites(sites, db)):
+        expected = pipeline_results(run_pipeline(site, db)[0])
+        for opt_type in ('dig_haul', 'onsite', 'surface'):
+            assert scored['results'][opt_type]['total_cost'] == pytest.approx(expected[opt_type]['total_cost'])
+            assert scored['results'][opt_type]['project_days'] == expected[opt_type]['project_days']
+
+def test_cached_trees_reload(network, road_db):
+    built = facility_road_trees(dict(road_db), network)
+    [cache] = [path for path in os.listdir(os.path.dirname(network['path'])) if '.trees-' in path]
+    cache = os.path.join(os.path.dirname(network['path']), cache)
+    assert stat.S_IMODE(os.stat(cache).st_mode) == 0o644
+    
+    # A new db (a later snapshot with the same facilities) maps the file instead of rebuilding
+    reloaded = facility_road_trees(dict(road_db), network)
+    assert isinstance(reloaded, np.memmap)
+    np.testing.assert_array_equal(reloaded, built)
+
+def test_mismatched_cached_trees_are_rebuilt(network, road_db, caplog):
+    facility_road_trees(dict(road_db), network)
+    [cache] = [path for path in os.listdir(os.path.dirname(network['path'])) if '.trees-' in path]
+    np.save(os.path.join(os.path.dirname(network['path']), cache), np.zeros((2, 3, 2), dtype=np.float32))
+    
+    with caplog.at_level(logging.WARNING, logger='clean_futures.roads'):
+        trees = facility_road_trees(dict(road_db), network)
+    assert 'do not match' in caplog.text
+    np.testing.assert_allclose(trees[0], EXPECTED_HOURS, rtol=1e-6, atol=1e-7)
@@ -0,0 +1,75 @@
+"""
+Scoring service: request validation and HTTP handling over a live socket.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from clean_futures.service import analysis_from_request, serve
+
+REQUEST = {'site_lat': 32.1, 'site_lon': -102.4, 'volume_cy': 900, 'tph_level': 1500, 'chloride_level': 2000}
+
+@pytest.mark.parametrize('change, message', [
+    ({'volume_cy': 0}, 'Field volume_cy must be greater than zero'),
+    ({'num_trucks': -1}, 'Field num_trucks must be greater than zero'),
+    ({'extra_backfill_minutes': -600}, 'Field extra_backfill_minutes must not be negative'),
+    ({'advanced_params': {'num_trucks': 0}}, 'Field advanced_params.num_trucks must be greater than zero'),
+    ({'advanced_params': {'excavator_capacity_cy_hr': 0}},
+     'Field advanced_params.excavator_capacity_cy_hr must be greater than zero'),
+    ({'advanced_params': {'disposal_cost_cy': -1}}, 'Field advanced_params.disposal_cost_cy must not be negative'),
+    ({'advanced_params': {'work_hours_per_day': 'ten'}},
+     'Field advanced_params.work_hours_per_day must be a finite number')
+])
+def test_out_of_range_fields_are_rejected(change, message):
+    with pytest.raises(ValueError, match=message):
+        analysis_from_request(dict(REQUEST, **change))
+
+def test_zero_costs_are_accepted():
+    analysis = analysis_from_request(dict(REQUEST, extra_backfill_minutes=0,
+                                          advanced_params={'backfill_cost_cy': 0, 'mobilization_cost': 0}))
+    assert analysis['advanced_params'] == {'backfill_cost_cy': 0, 'mobilization_cost': 0}
+
+async def _exchange(port, request):
+    """Send raw request bytes; returns (status, JSON body) of the response"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(request)
+    await writer.drain()
+    status_line = await reader.readline()
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers['content-length']))
+    writer.close()
+    return int(status_line.split()[1]), json.loads(body)
+
+def _post(payload, extra_headers=b''):
+    body = json.dumps(payload).encode('utf-8')
+    return (b"POST /score HTTP/1.1\r\nConnection: close\r\n" + extra_headers +
+            f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+
+def test_live_service_responses():
+    async def run():
+        bound = asyncio.get_running_loop().create_future()
+        server = asyncio.create_task(serve(port=0, ready=lambda address: bound.set_result(address[1])))
+        port = await bound
+        try:
+            return [
+                await _exchange(port, _post(REQUEST)),
+                await _exchange(port, _post(dict(REQUEST, extra_backfill_minutes=-600))),
+                await _exchange(port, _post(dict(REQUEST, advanced_params={'num_trucks': 0}))),
+                # Header line longer than the stream limit
+                await _exchange(port, _post(REQUEST, b"X-Padding: " + b"a" * 100_000 + b"\r\n")),
+                await _exchange(port, b"GET /" + b"a" * 100_000 + b" HTTP/1.1\r\n\r\n")
+            ]
+        finally:
+            server.cancel()
+    
+    scored, minutes, trucks, header, request_line = asyncio.run(run())
+    assert scored[0] == 200 and scored[1]['onsite']['total_cost'] > 0
+    assert minutes == (400, {'error': 'Field extra_backfill_minutes must not be negative'})
+    assert trucks == (400, {'error': 'Field advanced_params.num_trucks must be greater than zero'})
+    assert header[0] == 431
+    assert request_line[0] == 414
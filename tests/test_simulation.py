@@ -0,0 +1,68 @@
+"""
+Truck-cycle simulation: never faster than the analytic capacity bound allows.
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from clean_futures.calculators import calculate_dig_and_haul, calculate_surface_facility
+from clean_futures.facilities import default_facilities_database, freeze_facilities_database
+from clean_futures.simulation import SIMULATION_DUMP_HOURS, simulate_option, simulate_truck_cycles
+
+SEED = 20240615
+
+DB = freeze_facilities_database(default_facilities_database())
+
+SHIFT_RULES = ('load', 'deliver', 'return')
+
+@pytest.mark.parametrize('shift_rule', SHIFT_RULES)
+@pytest.mark.parametrize('case', range(40))
+def test_loads_and_loader_time_add_up(case, shift_rule):
+    rng = np.random.default_rng([SEED, case])
+    num_loads, trucks = int(rng.integers(1, 400)), int(rng.integers(1, 12))
+    loader_rate, work_hours = float(rng.uniform(20, 120)), float(rng.choice([8, 10, 12]))
+    sim = simulate_truck_cycles(num_loads, float(rng.uniform(1, 80)), trucks, loader_rate,
+                                work_hours_per_day=work_hours, shift_rule=shift_rule)
+    assert sum(sim['loads_per_day']) == sum(sim['truck_loads']) == num_loads
+    
+    # Every load starts and finishes on the loader inside a shift
+    service = max(0.25, 18 / loader_rate)
+    assert sim['loader_busy_hours'] == pytest.approx(num_loads * service)
+    assert sim['project_days'] >= math.ceil(num_loads * service / work_hours - 1e-9)
+    assert max(sim['loads_per_day']) <= work_hours / service + 1e-9
+
+def _random_analysis(rng):
+    return {
+        'site_lat': float(rng.uniform(30.6, 34.4)), 'site_lon': float(rng.uniform(-104.6, -100.4)),
+        'volume_cy': float(rng.uniform(50, 8000)), 'tph_level': 0, 'chloride_level': 0,
+        'needs_backfill': bool(rng.random() < 0.7), 'landfill_has_backfill': bool(rng.random() < 0.5),
+        'extra_backfill_minutes': int(rng.choice([0, 30, 60])), 'num_trucks': int(rng.integers(1, 10)),
+        'equipment_capacity_per_day': int(rng.choice([200, 300, 500])), 'advanced_params': None
+    }
+
+@pytest.mark.parametrize('case', range(60))
+def test_whole_cycles_in_the_shift_are_no_faster_than_the_analytic_estimate(case):
+    # With the 'return' rule each truck fits whole cycles (no shorter than the
+    # analytic trip time) into a shift and the loader fills at most the
+    # equipment capacity per day, so the analytic days are a lower bound
+    rng = np.random.default_rng([SEED, 1, case])
+    analysis = _random_analysis(rng)
+    lat, lon = analysis['site_lat'], analysis['site_lon']
+    options = {
+        'dig_haul': calculate_dig_and_haul(
+            analysis['volume_cy'], lat, lon, analysis['needs_backfill'], 0, 0, DB,
+            num_trucks=analysis['num_trucks'], equipment_capacity_per_day=analysis['equipment_capacity_per_day'],
+            landfill_has_backfill=analysis['landfill_has_backfill'],
+            extra_backfill_minutes=analysis['extra_backfill_minutes']),
+        'surface': calculate_surface_facility(
+            analysis['volume_cy'], lat, lon, analysis['needs_backfill'], 0, 0, DB,
+            num_trucks=analysis['num_trucks'], equipment_capacity_per_day=analysis['equipment_capacity_per_day'])
+    }
+    for opt_type, option in options.items():
+        # Cycles longer than a shift may start any time, which the bound does not cover
+        if option['trip_time_hours'] + SIMULATION_DUMP_HOURS > 10:
+            continue
+        sim = simulate_option(analysis, opt_type, option, shift_rule='return')
+        assert sim['project_days'] >= sim['analytic_project_days'], (opt_type, analysis)
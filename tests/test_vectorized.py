@@ -0,0 +1,209 @@
+"""
+Parity tests: the vectorized calculators and recommendation against the scalar ones.
+
+Every case is costed twice, once through calculate_* with the facility
+passed in (no lookups) and once as a row of one vectorized call with the
+inputs resolve_calculator_inputs gives, and every key of the vectorized
+result must match the scalar record.
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from clean_futures.calculators import (calculate_dig_and_haul, calculate_onsite_remediation,
+                                       calculate_surface_facility)
+from clean_futures.facilities import default_facilities_database, freeze_facilities_database
+from clean_futures.recommendation import generate_recommendation
+from clean_futures.vectorized import (calculate_dig_and_haul_vectorized, calculate_onsite_remediation_vectorized,
+                                      calculate_surface_facility_vectorized, generate_recommendation_vectorized,
+                                      resolve_calculator_inputs)
+
+SEED = 20240611
+
+# Random cases per test
+N_CASES = 300
+
+DB = freeze_facilities_database(default_facilities_database())
+
+PRIORITY_LEVELS = ('low', 'medium', 'high')
+
+# Advanced Mode parameters and the range each is drawn from (ints where the bounds are ints)
+ADVANCED_RANGES = {
+    'truck_capacity_cy': (10, 24),
+    'num_trucks': (1, 12),
+    'truck_hourly_rate': (60.0, 140.0),
+    'excavator_rate': (90.0, 250.0),
+    'loader_rate': (80.0, 200.0),
+    'work_hours_per_day': (6, 14),
+    'disposal_cost_cy': (8.0, 60.0),
+    'backfill_cost_cy': (0.0, 25.0),
+    'excavator_capacity_cy_hr': (15.0, 120.0),
+    'loader_capacity_cy_hr': (15.0, 120.0),
+    'num_excavators': (1, 4),
+    'num_loaders': (1, 4),
+    'onsite_processing_cost_cy': (15.0, 45.0),
+    'surface_processing_cost_cy': (15.0, 45.0),
+    'mobilization_cost': (0.0, 50000.0),
+    'amendment_cost': (0.0, 30000.0)
+}
+
+def _draw(rng, low, high):
+    if isinstance(low, int):
+        return int(rng.integers(low, high + 1))
+    return float(rng.uniform(low, high))
+
+def _random_case(rng):
+    """A random analysis with the landfill, CF facility and distances it is costed against"""
+    needs_backfill = bool(rng.random() < 0.7)
+    advanced_params = None
+    if rng.random() < 0.5:
+        keys = [key for key in ADVANCED_RANGES if rng.random() < 0.6]
+        advanced_params = {key: _draw(rng, *ADVANCED_RANGES[key]) for key in keys}
+    analysis = {
+        'site_lat': float(rng.uniform(30.5, 34.5)),
+        'site_lon': float(rng.uniform(-104.8, -100.2)),
+        'volume_cy': float(rng.choice([rng.uniform(1, 50), rng.uniform(50, 5000), rng.uniform(5000, 250000)])),
+        'tph_level': float(rng.choice([0, rng.uniform(0, 3000), rng.uniform(3000, 30000)])),
+        'chloride_level': float(rng.choice([0, rng.uniform(0, 7000), rng.uniform(7000, 40000)])),
+        'soil_permeability': str(rng.choice(PRIORITY_LEVELS)),
+        'needs_backfill': needs_backfill,
+        # Both flags are drawn independently: the calculators must ignore
+        # them when no backfill is needed or the landfill has it
+        'landfill_has_backfill': bool(rng.random() < 0.5),
+        'extra_backfill_minutes': int(rng.choice([0, 15, 30, 45, 90, 120])),
+        'num_trucks': int(rng.integers(1, 13)),
+        'equipment_capacity_per_day': int(rng.choice([150, 300, 450, 600, 1000])),
+        'advanced_params': advanced_params
+    }
+    landfill = DB['landfills'][int(rng.integers(len(DB['landfills'])))]
+    facility = DB['clean_futures_facilities'][int(rng.integers(len(DB['clean_futures_facilities'])))]
+    distances = rng.choice([rng.uniform(0, 1), rng.uniform(1, 60), rng.uniform(60, 250)], size=2)
+    return analysis, landfill, facility, float(distances[0]), float(distances[1])
+
+@pytest.fixture(scope='module')
+def cases():
+    rng = np.random.default_rng(SEED)
+    return [_random_case(rng) for _ in range(N_CASES)]
+
+def _scalar_options(analysis, landfill, facility, landfill_miles, facility_miles):
+    """The three scalar option records for one case"""
+    dig_haul = calculate_dig_and_haul(
+        analysis['volume_cy'], analysis['site_lat'], analysis['site_lon'], analysis['needs_backfill'],
+        analysis['tph_level'], analysis['chloride_level'], DB,
+        num_trucks=analysis['num_trucks'],
+        equipment_capacity_per_day=analysis['equipment_capacity_per_day'],
+        landfill_has_backfill=analysis['landfill_has_backfill'],
+        extra_backfill_minutes=analysis['extra_backfill_minutes'],
+        advanced_params=analysis['advanced_params'],
+        nearest_landfill={'landfill': landfill, 'distance_miles': landfill_miles}
+    )
+    onsite = calculate_onsite_remediation(
+        analysis['volume_cy'], analysis['site_lat'], analysis['site_lon'], analysis['soil_permeability'],
+        analysis['tph_level'], analysis['chloride_level'], analysis['advanced_params']
+    )
+    surface = calculate_surface_facility(
+        analysis['volume_cy'], analysis['site_lat'], analysis['site_lon'], analysis['needs_backfill'],
+        analysis['tph_level'], analysis['chloride_level'], DB,
+        num_trucks=analysis['num_trucks'],
+        equipment_capacity_per_day=analysis['equipment_capacity_per_day'],
+        advanced_params=analysis['advanced_params'],
+        nearest_facility={'facility': facility, 'distance_miles': facility_miles}
+    )
+    return {'dig_haul': dig_haul, 'onsite': onsite, 'surface': surface}
+
+def _columns(rows):
+    """Stack per-case keyword dictionaries into one dictionary of arrays"""
+    return {key: np.array([row[key] for row in rows]) for key in rows[0]}
+
+def _vectorized_options(cases):
+    """The three vectorized option results, one row per case, from single calls"""
+    inputs = [resolve_calculator_inputs(analysis, landfill, facility)
+              for analysis, landfill, facility, _, _ in cases]
+    analyses = _columns([case[0] for case in cases])
+    landfill_miles = np.array([case[3] for case in cases])
+    facility_miles = np.array([case[4] for case in cases])
+    return {
+        'dig_haul': calculate_dig_and_haul_vectorized(
+            analyses['volume_cy'], landfill_miles, analyses['needs_backfill'],
+            landfill_has_backfill=analyses['landfill_has_backfill'],
+            extra_backfill_minutes=analyses['extra_backfill_minutes'],
+            **_columns([params['dig_haul'] for params in inputs])
+        ),
+        'onsite': calculate_onsite_remediation_vectorized(
+            analyses['volume_cy'], analyses['soil_permeability'], analyses['tph_level'],
+            analyses['chloride_level'], **_columns([params['onsite'] for params in inputs])
+        ),
+        'surface': calculate_surface_facility_vectorized(
+            analyses['volume_cy'], facility_miles, **_columns([params['surface'] for params in inputs])
+        )
+    }
+
+def _row(option, i):
+    return {key: values[i] if np.ndim(values) else values for key, values in option.items()}
+
+def _assert_matches(vectorized, scalar, context):
+    """Every key of a vectorized result row equals the scalar record's value"""
+    assert scalar is not None, context
+    for key, value in vectorized.items():
+        expected = scalar[key]
+        if isinstance(expected, (str, bool)) or isinstance(value, (str, np.str_)):
+            assert value == expected, (context, key, value, expected)
+        else:
+            np.testing.assert_allclose(value, expected, rtol=1e-12, atol=1e-9, err_msg=f"{context}: {key}")
+
+def test_calculators_match_scalar(cases):
+    vectorized = _vectorized_options(cases)
+    for i, case in enumerate(cases):
+        scalar = _scalar_options(*case)
+        for opt_type in ('dig_haul', 'onsite', 'surface'):
+            _assert_matches(_row(vectorized[opt_type], i), scalar[opt_type], (i, opt_type, case[0]))
+
+def test_single_case_calls_match_scalar(cases):
+    # Scalar inputs give 0-d arrays; they must agree with the batched rows
+    for i, case in enumerate(cases[:50]):
+        vectorized = _vectorized_options([case])
+        scalar = _scalar_options(*case)
+        for opt_type in ('dig_haul', 'onsite', 'surface'):
+            _assert_matches(_row(vectorized[opt_type], 0), scalar[opt_type], (i, opt_type, case[0]))
+
+def test_backfill_flags(cases):
+    # Extra pickup time applies only when backfill is needed and not at the landfill
+    vectorized = _vectorized_options(cases)['dig_haul']
+    for i, (analysis, *_) in enumerate(cases):
+        detour = analysis['needs_backfill'] and not analysis['landfill_has_backfill']
+        extra_hours = vectorized['trip_time_hours'][i] - vectorized['base_trip_time_hours'][i]
+        assert extra_hours == pytest.approx(analysis['extra_backfill_minutes'] / 60.0 if detour else 0.0)
+        if not analysis['needs_backfill']:
+            assert vectorized['backfill_cost'][i] == 0
+
+@pytest.mark.parametrize('cost, speed, esg', list(itertools.product(PRIORITY_LEVELS, repeat=3)))
+def test_recommendation_matches_scalar(cases, cost, speed, esg):
+    priorities = {'cost': cost, 'speed': speed, 'esg': esg}
+    vectorized = _vectorized_options(cases)
+    scalar = [_scalar_options(*case) for case in cases]
+    
+    # No landfill, no surface facility, neither, and all three options
+    for missing in ((), ('dig_haul',), ('surface',), ('dig_haul', 'surface')):
+        options = {opt_type: None if opt_type in missing else vectorized[opt_type]
+                   for opt_type in ('dig_haul', 'onsite', 'surface')}
+        names, scores = generate_recommendation_vectorized(options['dig_haul'], options['onsite'],
+                                                           options['surface'], priorities)
+        for i, records in enumerate(scalar):
+            expected_name, expected_scores = generate_recommendation(
+                *(None if opt_type in missing else records[opt_type] for opt_type in ('dig_haul', 'onsite', 'surface')),
+                priorities
+            )
+            assert names[i] == expected_name, (i, missing, priorities)
+            assert set(scores) == set(expected_scores)
+            for opt_type, expected in expected_scores.items():
+                np.testing.assert_allclose(np.broadcast_to(scores[opt_type], names.shape)[i], expected,
+                                           rtol=1e-12, atol=1e-12)
+
+def test_missing_facilities_resolve_to_none(cases):
+    analysis = cases[0][0]
+    params = resolve_calculator_inputs(dict(analysis, advanced_params=None), None, None)
+    assert params['dig_haul']['disposal_cost_cy'] is None
+    assert params['surface']['processing_cost_cy'] is None
+    assert generate_recommendation_vectorized(None, None, None, {'cost': 'high'}) is None